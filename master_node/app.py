@@ -1,8 +1,16 @@
+# the PDF extractor's worker processes are spawned and run this file again as __mp_main__, so nothing
+# happens here unless it is the server being started
+if __name__ == '__main__':
+    from app import app
+    from app import blockchain_code, jobs, routesv2, uploads
 
-from app import app
+    # background work runs in the server only, not in whatever else imports the app: another process
+    # starting the job queue would requeue the server's running jobs and run them a second time
+    jobs.job_queue.start()
+    uploads.upload_sessions.start()
+    routesv2.compress_existing_data()
+    blockchain_code.start_chain_sync()
 
+    app.run(port=5500, host='0.0.0.0')
 
-app.run(port=5500, host='0.0.0.0')
-
-# app.run(port=5500, debug=True ,host='0.0.0.0')
-
+    # app.run(port=5500, debug=True ,host='0.0.0.0')
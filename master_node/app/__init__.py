@@ -48,4 +48,5 @@ app.config['CONTRACT_FOLDER']   = os.path.join(os.path.dirname(__file__), CONTRA
 # from app import routes
 from app import data_fetch
 from app import routesv2
-from app import chat_routes
\ No newline at end of file
+from app import chat_routes
+from app import metrics_routes
\ No newline at end of file
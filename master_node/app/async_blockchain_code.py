@@ -0,0 +1,280 @@
+import asyncio
+import time
+from functools import wraps
+from types import SimpleNamespace
+
+from app import app
+from app.blockchain_code import (
+    w3, BATCH_SIZE, MAX_RETRIES, MULTICALL3_ADDRESS, MULTICALL_ENABLED, RPC_MAX_IN_FLIGHT,
+    RPC_RETRY_DEADLINE, retry_delay,
+    contracts, chain_cache, call_metrics, load_contract_json, reverse_index, reverse_index_window,
+    collection_detail_calls, nft_calls, format_collections, format_collection_details, format_nft_results,
+    format_access_levels, compose_nft_with_access, format_collection,
+)
+from app.module.async_chain import EventLoopThread, AsyncMulticall, make_async_web3, open_pooled_session
+from app.module.pagination import page_after
+
+# asyncio implementation of the blockchain_code read API. The call builders and formatters are shared with
+# blockchain_code (the sync contracts are only used to encode calldata), the I/O goes through AsyncWeb3 on a
+# single event loop with one pooled aiohttp session instead of a thread per outstanding call. Requests go
+# through the sync provider's EndpointPool and HedgePolicy, so both backends pick, fail over, trip breakers
+# and hedge alike.
+
+ASYNC_RPC_MAX_CONNECTIONS = int(app.config['ASYNC_RPC_MAX_CONNECTIONS'])
+RPC_TIMEOUT = 30
+
+event_loop = EventLoopThread()
+
+async_w3 = make_async_web3(w3.provider.endpoints, w3.provider.hedge, timeout=RPC_TIMEOUT, headers={'Content-Type': 'application/json'})
+event_loop.run(open_pooled_session(async_w3, max_connections=ASYNC_RPC_MAX_CONNECTIONS))
+
+async_multicall = AsyncMulticall(async_w3, MULTICALL3_ADDRESS, load_contract_json('Multicall3')['abi'],
+                                 batch_size=BATCH_SIZE, max_concurrency=RPC_MAX_IN_FLIGHT, enabled=MULTICALL_ENABLED,
+                                 metrics=call_metrics)
+
+
+# Retry decorator, same contract as blockchain_code.with_retry: None once attempts or the deadline budget run out
+def with_retry(max_retries=MAX_RETRIES, deadline_seconds=RPC_RETRY_DEADLINE):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            deadline = time.monotonic() + deadline_seconds
+            for attempt in range(max_retries):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    delay = retry_delay(attempt, deadline) if attempt < max_retries - 1 else None
+                    if delay is None:
+                        print(f"Error in {func.__name__} after {attempt + 1} attempt(s): {str(e)}")
+                        call_metrics.record_retry(func.__name__, gave_up=True)
+                        return None
+                    print(f"Retrying {func.__name__} in {delay:.2f}s (attempt {attempt + 1}): {str(e)}")
+                    call_metrics.record_retry(func.__name__)
+                    await asyncio.sleep(delay)
+            return None
+        return wrapper
+    return decorator
+
+
+
+############################################################################################################
+######################## Collection Contract Functions ####################################################
+############################################################################################################
+
+@with_retry()
+async def getAllCollections():
+    window = await asyncio.to_thread(reverse_index_window)
+    total_collections = await async_multicall.call(contracts['collection'].functions.getAllCollections(), gas=2000000)
+
+    collections = format_collections(total_collections)
+    if window is not None:
+        reverse_index.replace_collections(collections, window[0])
+    return collections
+
+
+async def getAllCollections_by_address(address):
+    # same reverse index as the thread backend, a full listing brings it up to date first
+    window = await asyncio.to_thread(reverse_index_window)
+    collections = reverse_index.collections_of(address, window[1]) if window is not None else None
+    if collections is not None:
+        return collections
+
+    all_collections = await getAllCollections()
+    if all_collections is None:
+        return None
+    collections = reverse_index.collections_of(address)
+    if collections is None:
+        collections = [collection for collection in all_collections if collection['owner'] == address]
+    return collections
+
+
+@with_retry()
+async def get_collection_details_by_id(collection_id):
+    results = await async_multicall.aggregate(collection_detail_calls(collection_id), require_success=True)
+
+    return format_collection_details(collection_id, *[result.value for result in results])
+
+
+############################################################################################################
+########################      NFT Contract Functions    ####################################################
+############################################################################################################
+
+@with_retry()
+async def nft_information_batch(collection_nft_ids, with_metadata=True):
+    collection_nft_ids = list(collection_nft_ids)
+    per_nft = 2 if with_metadata else 1
+    calls = [call for collection_id, nft_id in collection_nft_ids for call in nft_calls(collection_id, nft_id)[:per_nft]]
+
+    window = await asyncio.to_thread(reverse_index_window)
+    results = await async_multicall.aggregate(calls, batch_size=BATCH_SIZE * per_nft)
+
+    nfts = [
+        format_nft_results(nft_id, collection_id, results[per_nft * i], results[per_nft * i + 1] if with_metadata else None)
+        for i, (collection_id, nft_id) in enumerate(collection_nft_ids)
+    ]
+    if with_metadata and window is not None:
+        reverse_index.update_nfts([nft for nft in nfts if nft], window[0])
+    return nfts
+
+
+async def all_nft_information(nft_id, collection_id):
+    nfts = await nft_information_batch([(collection_id, nft_id)])
+    return nfts[0] if nfts else None
+
+
+@with_retry()
+async def all_nft_of_a_collection(collection_id):
+    nft_ids = await async_multicall.call(contracts['nft'].functions.getCollectionNFTs(collection_id))
+
+    nfts = list(filter(None, await nft_information_batch([(collection_id, nft_id) for nft_id in nft_ids]) or []))
+
+    return sorted(nfts, key=lambda x: x['id'])
+
+
+@with_retry()
+async def all_access_levels_of_a_collection_nft(collection_id, nft_id):
+    window = await asyncio.to_thread(reverse_index_window)
+    users_access = await async_multicall.call(contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id))
+
+    access_levels = format_access_levels(users_access)
+    if window is not None:
+        reverse_index.set_nft_access(collection_id, nft_id, access_levels, window[0])
+    return access_levels
+
+
+@with_retry()
+async def all_nfts_own_or_have_access_by_user(user_address):
+    window = await asyncio.to_thread(reverse_index_window)
+    user_access_entries = await user_access_entries_of(user_address, window)
+
+    nfts = await nfts_with_access(user_access_entries, window)
+
+    return sorted(nfts, key=lambda x: x["collectionId"]*10**7+x['id'])
+
+
+async def user_access_entries_of(user_address, window):
+    if window is not None:
+        entries = reverse_index.access_of(user_address, window[1])
+        if entries is not None:
+            return entries
+
+    entries = await async_multicall.call(contracts['access'].functions.getAllAccessForUser(user_address))
+    if window is not None:
+        reverse_index.set_user_access(user_address, entries, window[0])
+    return entries
+
+
+async def nfts_with_access(user_access_entries, window, with_metadata=True):
+    keys = [(collection_id, nft_id) for collection_id, nft_id, _ in user_access_entries]
+    known, missing = reverse_index.nfts(keys, window[1]) if window is not None else ({}, keys)
+
+    if missing:
+        fetched = await nft_information_batch(missing, with_metadata=with_metadata) or []
+        known.update((key, nft) for key, nft in zip(missing, fetched) if nft)
+
+    return [
+        dict(known[(collection_id, nft_id)], accessLevel=access_level)
+        for collection_id, nft_id, access_level in user_access_entries
+        if (collection_id, nft_id) in known
+    ]
+
+
+############################################################################################################################
+################################################## Paged Listings ##########################################################
+############################################################################################################################
+
+@with_retry()
+async def collections_page(limit, after_id=None):
+    total_collections = await async_multicall.call(contracts['collection'].functions.getTotalCollections())
+    collection_ids, next_after = page_after(range(1, total_collections + 1), after_id, limit)
+
+    results = await async_multicall.aggregate(
+        [contracts['collection'].functions.getCollectionMetadata(collection_id) for collection_id in collection_ids]
+    )
+
+    collections = [
+        format_collection(result.value, collection_id)
+        for collection_id, result in zip(collection_ids, results)
+        if result.success
+    ]
+    return collections, next_after
+
+
+@with_retry()
+async def nfts_of_a_collection_page(collection_id, limit, after_id=None, with_metadata=True):
+    nft_ids = sorted(await async_multicall.call(contracts['nft'].functions.getCollectionNFTs(collection_id)))
+    page_ids, next_after = page_after(nft_ids, after_id, limit)
+
+    nfts = await nft_information_batch([(collection_id, nft_id) for nft_id in page_ids], with_metadata=with_metadata) or []
+
+    return [nft for nft in nfts if nft], next_after
+
+
+@with_retry()
+async def nfts_of_user_page(user_address, limit, after=None, with_metadata=True):
+    window = await asyncio.to_thread(reverse_index_window)
+    access_levels = {
+        (collection_id, nft_id): access_level
+        for collection_id, nft_id, access_level in await user_access_entries_of(user_address, window)
+    }
+    page_keys, next_after = page_after(sorted(access_levels), after, limit)
+
+    page_entries = [(collection_id, nft_id, access_levels[(collection_id, nft_id)]) for collection_id, nft_id in page_keys]
+    return await nfts_with_access(page_entries, window, with_metadata=with_metadata), next_after
+
+
+############################################################################################################################
+################################################## Compound Functions ######################################################
+############################################################################################################################
+
+@with_retry()
+async def nft_of_a_collection_with_access(collection_id, nft_id):
+    calls = (
+        nft_calls(collection_id, nft_id)
+        + collection_detail_calls(collection_id)
+        + [contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id)]
+    )
+    window = await asyncio.to_thread(reverse_index_window)
+    results = await async_multicall.aggregate(calls)
+
+    if not all(result.success for result in results[2:]):
+        return None
+
+    nft_information = format_nft_results(nft_id, collection_id, results[0], results[1])
+    collection_info = format_collection_details(collection_id, *[result.value for result in results[2:6]])
+    access_levels   = format_access_levels(results[6].value)
+
+    if window is not None:
+        if nft_information:
+            reverse_index.update_nfts([nft_information], window[0])
+        reverse_index.set_nft_access(collection_id, nft_id, access_levels, window[0])
+
+    return compose_nft_with_access(nft_information, collection_info, access_levels)
+
+
+############################################################################################################################
+################################################## Sync Bridge #############################################################
+############################################################################################################################
+
+
+def bridged(coroutine_function):
+    # blocking wrapper for Flask views, the coroutine runs on the shared event loop
+    @wraps(coroutine_function)
+    def wrapper(*args, **kwargs):
+        return event_loop.run(coroutine_function(*args, **kwargs), timeout=RPC_TIMEOUT + RPC_RETRY_DEADLINE)
+    return wrapper
+
+
+# drop-in for the blockchain_code read functions the data_fetch routes use, cached the same way
+sync_reads = SimpleNamespace(
+    getAllCollections                       = chain_cache.cached(bridged(getAllCollections)),
+    getAllCollections_by_address            = chain_cache.cached(bridged(getAllCollections_by_address)),
+    get_collection_details_by_id            = chain_cache.cached(bridged(get_collection_details_by_id)),
+    all_nft_of_a_collection                 = chain_cache.cached(bridged(all_nft_of_a_collection)),
+    all_access_levels_of_a_collection_nft   = bridged(all_access_levels_of_a_collection_nft),
+    all_nfts_own_or_have_access_by_user     = chain_cache.cached(bridged(all_nfts_own_or_have_access_by_user)),
+    nft_of_a_collection_with_access         = chain_cache.cached(bridged(nft_of_a_collection_with_access)),
+    collections_page                        = chain_cache.cached(bridged(collections_page)),
+    nfts_of_a_collection_page               = chain_cache.cached(bridged(nfts_of_a_collection_page)),
+    nfts_of_user_page                       = chain_cache.cached(bridged(nfts_of_user_page)),
+)
@@ -2,19 +2,55 @@ import json
 from web3 import Web3
 import os 
 from app import app
-import concurrent.futures
 from web3 import Web3
 # from web3.middleware.geth_poa import geth_poa_middleware
-from functools import lru_cache
+from functools import lru_cache, wraps
+import random
 import time
 
+from app.module.multicall import Multicall
+from app.module.batch_provider import BatchingHTTPProvider
+from app.module.call_metrics import CallMetrics
+from app.module.chain_cache import BlockAwareCache
+from app.module.chain_indexer import ChainIndexer
+from app.module.rpc_executor import RPCExecutor, request_type
+from app.module.pagination import page_after
+from app.module.reverse_index import ReverseIndex
+from app.module.snapshot_builder import SnapshotBuilder
+
 # Global constants
 FILE_STORAGE_ENDPOINT = app.config['filestorage_endpoint']
 CONTRACT_FOLDER = app.config['CONTRACT_FOLDER']
-MAX_WORKERS = 20
+MAX_WORKERS = int(app.config['RPC_MAX_WORKERS'])
+RPC_MAX_IN_FLIGHT = int(app.config['RPC_MAX_IN_FLIGHT'])
 MAX_RETRIES = 3
-BATCH_SIZE = 50
+BATCH_SIZE = int(app.config['MULTICALL_BATCH_SIZE'])  # NFTs (or collections) packed per aggregate3 call
 BASE_NODE_RPC_ENDPOINT = app.config['BASE_NODE_RPC_ENDPOINT']
+BASE_NODE_RPC_ENDPOINTS = [uri.strip() for uri in app.config['BASE_NODE_RPC_ENDPOINTS'].split(',') if uri.strip()]
+RPC_BREAKER_FAILURES = int(app.config['RPC_BREAKER_FAILURES'])
+RPC_BREAKER_COOLDOWN = float(app.config['RPC_BREAKER_COOLDOWN_SECONDS'])
+RPC_RETRY_DEADLINE = float(app.config['RPC_RETRY_DEADLINE_SECONDS'])
+RPC_RETRY_BASE_DELAY = int(app.config['RPC_RETRY_BASE_DELAY_MS']) / 1000
+RPC_HEDGING_ENABLED = int(app.config['RPC_HEDGING_ENABLED']) == 1
+RPC_HEDGE_PERCENTILE = float(app.config['RPC_HEDGE_PERCENTILE'])
+RPC_HEDGE_MIN_DELAY = int(app.config['RPC_HEDGE_MIN_DELAY_MS']) / 1000
+RPC_HEDGE_BUDGET = float(app.config['RPC_HEDGE_BUDGET'])
+MULTICALL3_ADDRESS = app.config['MULTICALL3_ADDRESS']
+MULTICALL_ENABLED = int(app.config['MULTICALL_ENABLED']) == 1
+RPC_BATCH_ENABLED = int(app.config['RPC_BATCH_ENABLED']) == 1
+RPC_BATCH_WINDOW = int(app.config['RPC_BATCH_WINDOW_MS']) / 1000
+RPC_BATCH_MAX_SIZE = int(app.config['RPC_BATCH_MAX_SIZE'])
+CHAIN_CACHE_ENABLED = int(app.config['CHAIN_CACHE_ENABLED']) == 1
+CHAIN_CACHE_MAX_STALE_BLOCKS = int(app.config['CHAIN_CACHE_MAX_STALE_BLOCKS'])
+CHAIN_CACHE_BLOCK_POLL_SECONDS = float(app.config['CHAIN_CACHE_BLOCK_POLL_SECONDS'])
+CHAIN_CACHE_MAX_ENTRIES = int(app.config['CHAIN_CACHE_MAX_ENTRIES'])
+CHAIN_CACHE_SWR_BLOCKS = int(app.config['CHAIN_CACHE_SWR_BLOCKS'])
+INDEXER_ENABLED = int(app.config['INDEXER_ENABLED']) == 1
+INDEXER_DB_PATH = app.config['INDEXER_DB_PATH'] or os.path.join(app.config['UPLOAD_FOLDER'], 'index', 'chain_index.db')
+INDEXER_START_BLOCK = int(app.config['INDEXER_START_BLOCK']) if app.config['INDEXER_START_BLOCK'] else None
+SNAPSHOT_ENABLED = int(app.config['SNAPSHOT_ENABLED']) == 1
+SNAPSHOT_DIR = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
+CHAIN_READ_BACKEND = app.config['CHAIN_READ_BACKEND']  # "thread" (rpc_executor) or "async" (AsyncWeb3 on one event loop)
 # Optimized Web3 connection
 # w3 = Web3(Web3.HTTPProvider("https://base-sepolia-rpc.publicnode.com",
 #     request_kwargs={
@@ -26,14 +62,29 @@ BASE_NODE_RPC_ENDPOINT = app.config['BASE_NODE_RPC_ENDPOINT']
 #     }
 # ))
 
-w3 = Web3(Web3.HTTPProvider(BASE_NODE_RPC_ENDPOINT,
+# eth_calls issued within RPC_BATCH_WINDOW from any thread leave as one JSON-RPC batch POST,
+# sent to the fastest healthy endpoint of BASE_NODE_RPC_ENDPOINT + BASE_NODE_RPC_ENDPOINTS
+w3 = Web3(BatchingHTTPProvider(BASE_NODE_RPC_ENDPOINT,
     request_kwargs={
         'timeout': 30,
         'headers': {
             'Content-Type': 'application/json',
             'keep-alive': 'timeout=10, max=1000'
         }
-    }
+    },
+    batch_window=RPC_BATCH_WINDOW,
+    max_batch_size=RPC_BATCH_MAX_SIZE,
+    enabled=RPC_BATCH_ENABLED,
+    max_in_flight=RPC_MAX_IN_FLIGHT,
+    fallback_endpoints=BASE_NODE_RPC_ENDPOINTS,
+    breaker_failures=RPC_BREAKER_FAILURES,
+    breaker_cooldown=RPC_BREAKER_COOLDOWN,
+    # slow reads are duplicated to the next endpoint after RPC_HEDGE_PERCENTILE of recent latency, within RPC_HEDGE_BUDGET
+    hedging=RPC_HEDGING_ENABLED,
+    hedge_percentile=RPC_HEDGE_PERCENTILE,
+    hedge_min_delay=RPC_HEDGE_MIN_DELAY,
+    hedge_budget=RPC_HEDGE_BUDGET,
+    hedge_workers=MAX_WORKERS + RPC_MAX_IN_FLIGHT,
 ))
 
 
@@ -69,18 +120,67 @@ def initialize_contracts():
 # Global contracts instance
 contracts = initialize_contracts()
 
-# Retry decorator
-def with_retry(max_retries=MAX_RETRIES):
+# One long-lived, bounded pool shared by all chain reads, with fair queuing between request types
+rpc_executor = RPCExecutor(max_workers=MAX_WORKERS)
+
+# calls / latency / bytes per contract function, plus per-request totals for the Server-Timing header
+call_metrics = CallMetrics()
+call_metrics.name_contracts(contracts)
+
+# Multicall3 read layer, falls back to one eth_call per contract call when disabled (e.g. local dev chains)
+multicall = Multicall(w3, MULTICALL3_ADDRESS, load_contract_json('Multicall3')['abi'],
+                      batch_size=BATCH_SIZE, enabled=MULTICALL_ENABLED, executor=rpc_executor, metrics=call_metrics)
+
+# Read cache keyed by function, arguments and block number, shared by the listing endpoints.
+# Up to CHAIN_CACHE_SWR_BLOCKS past the staleness limit an entry is still served while it reloads on the executor.
+chain_cache = BlockAwareCache(lambda: w3.eth.block_number,
+                              max_staleness_blocks=CHAIN_CACHE_MAX_STALE_BLOCKS,
+                              block_poll_interval=CHAIN_CACHE_BLOCK_POLL_SECONDS,
+                              max_entries=CHAIN_CACHE_MAX_ENTRIES,
+                              enabled=CHAIN_CACHE_ENABLED,
+                              stale_while_revalidate_blocks=CHAIN_CACHE_SWR_BLOCKS,
+                              submit_refresh=lambda refresh: rpc_executor.submit_as("refresh", refresh))
+
+# owner -> collections and user -> access entries, fed by the reads below, for address-scoped lookups
+reverse_index = ReverseIndex()
+
+
+def reverse_index_window():
+    """(block fresh reads are tagged with, oldest block the reverse index may answer from), None while the head is unknown."""
+    block_number = chain_cache.current_block()
+    if block_number is None:
+        return None
+    return block_number, block_number - CHAIN_CACHE_MAX_STALE_BLOCKS
+
+DEFAULT_NFT_METADATA = [f"{FILE_STORAGE_ENDPOINT}/image/default.jpg", "None", "None", "", "", "Metadata not available"]
+
+def retry_delay(attempt, deadline):
+    # full-jitter exponential backoff, None when the next attempt would not fit in the deadline budget
+    delay = random.uniform(0, RPC_RETRY_BASE_DELAY * 2 ** attempt)
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+# Retry decorator: endpoint failover happens in the provider, this only covers what is left
+# within RPC_RETRY_DEADLINE seconds. Returns None once attempts or the budget run out.
+def with_retry(max_retries=MAX_RETRIES, deadline_seconds=RPC_RETRY_DEADLINE):
     def decorator(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
+            deadline = time.monotonic() + deadline_seconds
             for attempt in range(max_retries):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    if attempt == max_retries - 1:
-                        print(f"Error in {func.__name__}: {str(e)}")
+                    delay = retry_delay(attempt, deadline) if attempt < max_retries - 1 else None
+                    if delay is None:
+                        print(f"Error in {func.__name__} after {attempt + 1} attempt(s): {str(e)}")
+                        call_metrics.record_retry(func.__name__, gave_up=True)
                         return None
-                    time.sleep(2 ** attempt)  # Exponential backoff
+                    print(f"Retrying {func.__name__} in {delay:.2f}s (attempt {attempt + 1}): {str(e)}")
+                    call_metrics.record_retry(func.__name__)
+                    time.sleep(delay)
             return None
         return wrapper
     return decorator
@@ -91,54 +191,67 @@ def with_retry(max_retries=MAX_RETRIES):
 ######################## Collection Contract Functions ####################################################
 ############################################################################################################
 
+@chain_cache.cached
+@request_type("listing")
 @with_retry()
 def getAllCollections():
-    total_collections = contracts['collection'].functions.getAllCollections().call({'gas': 2000000})
-    
-    def process_collection(collection_data, index):
-        return {
-            "id": index,
-            "name": collection_data[0],
-            "contextWindow": collection_data[1],
-            "model": collection_data[2],
-            "image": collection_data[3],
-            "description": collection_data[4],
-            "creator": collection_data[5],
-            "date": collection_data[6],
-            "owner": collection_data[7],
-            "collectionaddress": f"#{index}",
-        }
+    window = reverse_index_window()
+    total_collections = multicall.call(contracts['collection'].functions.getAllCollections(), gas=2000000)
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        all_collections = list(executor.map(
-            lambda x: process_collection(x[1], x[0] + 1),
-            enumerate(total_collections)
-        ))
-    
-    return all_collections
+    # pure formatting, no RPC involved, so no thread pool
+    collections = format_collections(total_collections)
+    if window is not None:
+        reverse_index.replace_collections(collections, window[0])
+    return collections
+
+
+def format_collection(collection_data, index):
+    return {
+        "id": index,
+        "name": collection_data[0],
+        "contextWindow": collection_data[1],
+        "model": collection_data[2],
+        "image": collection_data[3],
+        "description": collection_data[4],
+        "creator": collection_data[5],
+        "date": collection_data[6],
+        "owner": collection_data[7],
+        "collectionaddress": f"#{index}",
+    }
+
+
+def format_collections(total_collections):
+    return [format_collection(collection_data, index + 1) for index, collection_data in enumerate(total_collections)]
 
 
 def getAllCollections_by_address(address):
     try:
+        # O(owned collections) from the reverse index, a (cached) full listing brings the index up to date first
+        window = reverse_index_window()
+        collections = reverse_index.collections_of(address, window[1]) if window is not None else None
+        if collections is not None:
+            return collections
+        
         all_collections = getAllCollections()
-        return [collection for collection in all_collections if collection['owner'] == address]
+        collections = reverse_index.collections_of(address)
+        if collections is None:
+            collections = [collection for collection in all_collections if collection['owner'] == address]
+        return collections
     except Exception as e:
         print(f"Error getting collections for address {address}: {str(e)}")
         return None
 
 
-@with_retry()
-def get_collection_details_by_id(collection_id):
-    def fetch_collection_data():
-        return (
-            contracts['collection'].functions.getCollectionMetadata(collection_id).call(),
-            contracts['collection'].functions.getCollectionNFTCount(collection_id).call(),
-            contracts['collection'].functions.getCollectionOwner(collection_id).call(),
-            contracts['collection'].functions.getCollectionUniqueHolders(collection_id).call()
-        )
-    
-    metadata, nft_count, owner, unique_holders = fetch_collection_data()
-    
+def collection_detail_calls(collection_id):
+    return [
+        contracts['collection'].functions.getCollectionMetadata(collection_id),
+        contracts['collection'].functions.getCollectionNFTCount(collection_id),
+        contracts['collection'].functions.getCollectionOwner(collection_id),
+        contracts['collection'].functions.getCollectionUniqueHolders(collection_id),
+    ]
+
+
+def format_collection_details(collection_id, metadata, nft_count, owner, unique_holders):
     return {
         "id": collection_id,
         "name": metadata[0],
@@ -155,24 +268,29 @@ def get_collection_details_by_id(collection_id):
         "model": metadata[2],
         "noOfServers": 5
     }
+
+
+@chain_cache.cached
+@request_type("detail")
+@with_retry()
+def get_collection_details_by_id(collection_id):
+    # all four reads go out as a single aggregate3 eth_call
+    results = multicall.aggregate(collection_detail_calls(collection_id), require_success=True)
+    
+    return format_collection_details(collection_id, *[result.value for result in results])
 ############################################################################################################
 ########################      NFT Contract Functions    ####################################################
 ############################################################################################################
 
 
+def nft_calls(collection_id, nft_id):
+    return [
+        contracts['nft'].functions.getNFTInfo(collection_id, nft_id),
+        contracts['metadata'].functions.getMetadata(collection_id, nft_id),
+    ]
 
-@with_retry()
-def all_nft_information(nft_id, collection_id):
-    def fetch_nft_data():
-        nft_info = contracts['nft'].functions.getNFTInfo(collection_id, nft_id).call()
-        try:
-            metadata = contracts['metadata'].functions.getMetadata(collection_id, nft_id).call()
-        except Exception:
-            metadata = [f"{FILE_STORAGE_ENDPOINT}/image/default.jpg", "None", "None", "", "", "Metadata not available"]
-        return nft_info, metadata
-    
-    nft_info, metadata = fetch_nft_data()
-    
+
+def format_nft(nft_id, collection_id, nft_info, metadata):
     return {
         "id": nft_id,
         "collectionId": collection_id,
@@ -189,57 +307,200 @@ def all_nft_information(nft_id, collection_id):
         "description": metadata[5]
     }
 
+
+# format_nft keys that come from getMetadata, a listing that projects none of them skips those calls
+NFT_METADATA_FIELDS = {"image", "baseModel", "data", "rag", "fineTuneData", "description"}
+
+
+def needs_nft_metadata(fields):
+    return fields is None or bool(NFT_METADATA_FIELDS.intersection(fields))
+
+
+def format_nft_results(nft_id, collection_id, info_result, metadata_result):
+    # getNFTInfo must succeed, getMetadata reverts for NFTs without metadata (or was not read) and gets the default
+    if not info_result.success:
+        return None
+    metadata = metadata_result.value if metadata_result is not None and metadata_result.success else DEFAULT_NFT_METADATA
+    return format_nft(nft_id, collection_id, info_result.value, metadata)
+
+
+@with_retry()
+def nft_information_batch(collection_nft_ids, with_metadata=True):
+    """Fetch getNFTInfo (+ getMetadata) for many (collection_id, nft_id) pairs, BATCH_SIZE NFTs per round trip.
+    Returns one entry per pair, None where getNFTInfo failed."""
+    collection_nft_ids = list(collection_nft_ids)
+    per_nft = 2 if with_metadata else 1
+    calls = [call for collection_id, nft_id in collection_nft_ids for call in nft_calls(collection_id, nft_id)[:per_nft]]
+    
+    window = reverse_index_window()
+    results = multicall.aggregate(calls, batch_size=BATCH_SIZE * per_nft)
+    
+    nfts = [
+        format_nft_results(nft_id, collection_id, results[per_nft * i], results[per_nft * i + 1] if with_metadata else None)
+        for i, (collection_id, nft_id) in enumerate(collection_nft_ids)
+    ]
+    # records without their metadata would hand the default metadata to later full reads
+    if with_metadata and window is not None:
+        reverse_index.update_nfts([nft for nft in nfts if nft], window[0])
+    return nfts
+
+
+def all_nft_information(nft_id, collection_id):
+    nfts = nft_information_batch([(collection_id, nft_id)])
+    return nfts[0] if nfts else None
+
+@chain_cache.cached
+@request_type("listing")
 @with_retry()
 def all_nft_of_a_collection(collection_id):
-    nft_ids = contracts['nft'].functions.getCollectionNFTs(collection_id).call()
+    nft_ids = multicall.call(contracts['nft'].functions.getCollectionNFTs(collection_id))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        nfts = list(filter(None, executor.map(
-            lambda nft_id: all_nft_information(nft_id, collection_id),
-            nft_ids
-        )))
+    nfts = list(filter(None, nft_information_batch([(collection_id, nft_id) for nft_id in nft_ids]) or []))
     
     return sorted(nfts, key=lambda x: x['id'])
 
 @with_retry()
 def all_access_levels_of_a_collection_nft(collection_id, nft_id):
-    users_access = contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id).call()
+    window = reverse_index_window()
+    users_access = multicall.call(contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id))
     
+    access_levels = format_access_levels(users_access)
+    if window is not None:
+        reverse_index.set_nft_access(collection_id, nft_id, access_levels, window[0])
+    return access_levels
+
+
+def format_access_levels(users_access):
     return [{"user": access[0], "accessLevel": access[1]} for access in users_access]
 
+@chain_cache.cached
+@request_type("listing")
 @with_retry()
 def all_nfts_own_or_have_access_by_user(user_address):
-    user_access_entries = contracts['access'].functions.getAllAccessForUser(user_address).call()
-    
-    def fetch_nft_with_access(entry):
-        collection_id, nft_id, access_level = entry
-        nft_info = all_nft_information(nft_id, collection_id)
-        if nft_info:
-            nft_info['accessLevel'] = access_level
-            return nft_info
-        return None
+    window = reverse_index_window()
+    user_access_entries = user_access_entries_of(user_address, window)
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        nfts = list(filter(None, executor.map(fetch_nft_with_access, user_access_entries)))
+    nfts = nfts_with_access(user_access_entries, window)
     
     return sorted(nfts, key=lambda x: x["collectionId"]*10**7+x['id'])
 
 
+def user_access_entries_of(user_address, window):
+    # (collection_id, nft_id, access_level) of everything the user holds, from the reverse index while it is in the window
+    if window is not None:
+        entries = reverse_index.access_of(user_address, window[1])
+        if entries is not None:
+            return entries
+    
+    entries = multicall.call(contracts['access'].functions.getAllAccessForUser(user_address))
+    if window is not None:
+        reverse_index.set_user_access(user_address, entries, window[0])
+    return entries
+
+
+def nfts_with_access(user_access_entries, window, with_metadata=True):
+    # NFT records the reverse index already holds are reused, only the rest are read from chain
+    keys = [(collection_id, nft_id) for collection_id, nft_id, _ in user_access_entries]
+    known, missing = reverse_index.nfts(keys, window[1]) if window is not None else ({}, keys)
+    
+    if missing:
+        fetched = nft_information_batch(missing, with_metadata=with_metadata) or []
+        known.update((key, nft) for key, nft in zip(missing, fetched) if nft)
+    
+    return [
+        dict(known[(collection_id, nft_id)], accessLevel=access_level)
+        for collection_id, nft_id, access_level in user_access_entries
+        if (collection_id, nft_id) in known
+    ]
+
+
+############################################################################################################################
+################################################## Paged Listings ##########################################################
+############################################################################################################################
+
+# Keyset pages for the listing routes: only the ids of the requested page are read from chain.
+# Each returns (items, next_after), next_after being the sort key to pass back for the next page or None.
+
+@chain_cache.cached
+@request_type("listing")
+@with_retry()
+def collections_page(limit, after_id=None):
+    total_collections = multicall.call(contracts['collection'].functions.getTotalCollections())
+    collection_ids, next_after = page_after(range(1, total_collections + 1), after_id, limit)
+    
+    results = multicall.aggregate(
+        [contracts['collection'].functions.getCollectionMetadata(collection_id) for collection_id in collection_ids]
+    )
+    
+    collections = [
+        format_collection(result.value, collection_id)
+        for collection_id, result in zip(collection_ids, results)
+        if result.success
+    ]
+    return collections, next_after
+
+
+@chain_cache.cached
+@request_type("listing")
+@with_retry()
+def nfts_of_a_collection_page(collection_id, limit, after_id=None, with_metadata=True):
+    nft_ids = sorted(multicall.call(contracts['nft'].functions.getCollectionNFTs(collection_id)))
+    page_ids, next_after = page_after(nft_ids, after_id, limit)
+    
+    nfts = nft_information_batch([(collection_id, nft_id) for nft_id in page_ids], with_metadata=with_metadata) or []
+    
+    return [nft for nft in nfts if nft], next_after
+
+
+@chain_cache.cached
+@request_type("listing")
+@with_retry()
+def nfts_of_user_page(user_address, limit, after=None, with_metadata=True):
+    window = reverse_index_window()
+    access_levels = {
+        (collection_id, nft_id): access_level
+        for collection_id, nft_id, access_level in user_access_entries_of(user_address, window)
+    }
+    page_keys, next_after = page_after(sorted(access_levels), after, limit)
+    
+    page_entries = [(collection_id, nft_id, access_levels[(collection_id, nft_id)]) for collection_id, nft_id in page_keys]
+    return nfts_with_access(page_entries, window, with_metadata=with_metadata), next_after
+
+
 ############################################################################################################################
 ################################################## Compound Functions ######################################################
 ############################################################################################################################
 
 
+@chain_cache.cached
+@request_type("detail")
+@with_retry()
 def nft_of_a_collection_with_access(collection_id, nft_id):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        future_nft = executor.submit(all_nft_information, nft_id, collection_id)
-        future_collection = executor.submit(get_collection_details_by_id, collection_id)
-        future_access = executor.submit(all_access_levels_of_a_collection_nft, collection_id, nft_id)
-        
-        nft_information = future_nft.result()
-        collection_info = future_collection.result()
-        access_levels = future_access.result()
+    # NFT, collection and access reads packed into one aggregate3 round trip
+    calls = (
+        nft_calls(collection_id, nft_id)
+        + collection_detail_calls(collection_id)
+        + [contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id)]
+    )
+    window = reverse_index_window()
+    results = multicall.aggregate(calls)
+    
+    if not all(result.success for result in results[2:]):
+        return None
+    
+    nft_information = format_nft_results(nft_id, collection_id, results[0], results[1])
+    collection_info = format_collection_details(collection_id, *[result.value for result in results[2:6]])
+    access_levels   = format_access_levels(results[6].value)
+    
+    if window is not None:
+        if nft_information:
+            reverse_index.update_nfts([nft_information], window[0])
+        reverse_index.set_nft_access(collection_id, nft_id, access_levels, window[0])
     
+    return compose_nft_with_access(nft_information, collection_info, access_levels)
+
+
+def compose_nft_with_access(nft_information, collection_info, access_levels):
     if not all([nft_information, collection_info, access_levels]):
         return None
         
@@ -282,19 +543,195 @@ def nft_of_a_collection_with_access(collection_id, nft_id):
     
     return nft_information
 
+
+############################################################################################################################
+################################################## Crawl Planner ###########################################################
+############################################################################################################################
+
+
+def catalog_collections(collection_ids, block_identifier=None):
+    """Details and NFT ids of each collection. Returns {collection_id: (details, nft_ids)}, collections that fail to read are left out."""
+    calls = [
+        call
+        for collection_id in collection_ids
+        for call in collection_detail_calls(collection_id) + [contracts['nft'].functions.getCollectionNFTs(collection_id)]
+    ]
+    results = multicall.aggregate(calls, block_identifier=block_identifier)
+    
+    catalog = {}
+    for i, collection_id in enumerate(collection_ids):
+        collection_results = results[5 * i:5 * i + 5]
+        if not all(result.success for result in collection_results):
+            continue
+        details = format_collection_details(collection_id, *[result.value for result in collection_results[:4]])
+        catalog[collection_id] = (details, list(collection_results[4].value))
+    return catalog
+
+
+def catalog_nfts(collection_nft_ids, block_identifier=None):
+    """
+    getNFTInfo/getMetadata and getAllUsersAccessForNFT of every NFT, submitted together on the bounded executor.
+    Returns {(collection_id, nft_id): (nft_information, access_levels)} for the NFTs whose access list read back,
+    feeding the reverse index on the way.
+    """
+    collection_nft_ids = list(collection_nft_ids)
+    window = reverse_index_window()
+    block_number = block_identifier if isinstance(block_identifier, int) else (window[0] if window is not None else None)
+    
+    info_calls = [call for collection_id, nft_id in collection_nft_ids for call in nft_calls(collection_id, nft_id)]
+    access_calls = [
+        contracts['access'].functions.getAllUsersAccessForNFT(collection_id, nft_id)
+        for collection_id, nft_id in collection_nft_ids
+    ]
+    
+    if multicall.executor is not None:
+        info_futures = multicall.submit(info_calls, batch_size=BATCH_SIZE * 2, block_identifier=block_identifier)
+        access_futures = multicall.submit(access_calls, block_identifier=block_identifier)
+        info_results, access_results = multicall.gather(info_futures), multicall.gather(access_futures)
+    else:
+        info_results = multicall.aggregate(info_calls, batch_size=BATCH_SIZE * 2, block_identifier=block_identifier)
+        access_results = multicall.aggregate(access_calls, block_identifier=block_identifier)
+    
+    nfts = {}
+    for i, (collection_id, nft_id) in enumerate(collection_nft_ids):
+        if not access_results[i].success:
+            continue
+        nft_information = format_nft_results(nft_id, collection_id, info_results[2 * i], info_results[2 * i + 1])
+        access_levels = format_access_levels(access_results[i].value)
+        if block_number is not None:
+            if nft_information:
+                reverse_index.update_nfts([nft_information], block_number)
+            reverse_index.set_nft_access(collection_id, nft_id, access_levels, block_number)
+        nfts[(collection_id, nft_id)] = (nft_information, access_levels)
+    return nfts
+
+
+def rpc_http_requests():
+    # every POST the provider has sent, failovers and hedges included, across all endpoints
+    return sum(endpoint["requests"] for endpoint in w3.provider.endpoints.stats())
+
+
+@request_type("crawl")
+def crawl_catalog():
+    """
+    Full catalog crawl in three planned waves on the shared rpc_executor (queued as "crawl"):
+      1. collection details + NFT ids of every collection (once per collection)
+      2. getNFTInfo/getMetadata and getAllUsersAccessForNFT of every NFT, submitted together
+      3. compose in memory, reusing each collection's details for all of its NFTs
+    Returns the composed NFTs, the collection details and the RPC counts / wall time of the crawl.
+
+    The counts are measured, by difference of the call metrics and the endpoint pool's request counters
+    around the crawl and its retries: rpc_calls is the eth_calls made (aggregate3 chunks, or single calls
+    without Multicall3), http_requests the POSTs that carried them. Reads made by anything else at the
+    same time are counted too.
+    """
+    started = time.monotonic()
+    calls_before, http_before = call_metrics.totals(), rpc_http_requests()
+    crawl = _crawl_catalog()
+    if crawl is None:
+        return None
+    calls_after = call_metrics.totals()
+    
+    crawl["stats"].update(
+        rpc_calls=calls_after["round_trips"] - calls_before["round_trips"],
+        http_requests=rpc_http_requests() - http_before,
+        retries=calls_after["retries"] - calls_before["retries"],
+        wall_seconds=round(time.monotonic() - started, 3),
+    )
+    print(f"Catalog crawl: {crawl['stats']}")
+    return crawl
+
+
 @with_retry()
-def all_nfts():
-    total_collections = contracts['collection'].functions.getAllCollections().call()
-    all_nfts_list = []
+def _crawl_catalog():
+    total_collections = multicall.call(contracts['collection'].functions.getTotalCollections())
+    collection_ids = list(range(1, total_collections + 1))
+    
+    # wave 1: 4 detail calls + getCollectionNFTs per collection
+    catalog = catalog_collections(collection_ids)
+    collection_nft_ids = [(collection_id, nft_id) for collection_id, (_, nft_ids) in catalog.items() for nft_id in nft_ids]
     
-    def process_collection(collection_id):
-        nfts = all_nft_of_a_collection(collection_id)
-        if not nfts:
-            return []
-        return [nft_of_a_collection_with_access(collection_id, nft['id']) for nft in nfts]
+    # wave 2: NFT and access lookups interleaved on the same bounded executor
+    nft_reads = catalog_nfts(collection_nft_ids)
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        for nfts in executor.map(process_collection, range(1, len(total_collections) + 1)):
-            all_nfts_list.extend(filter(None, nfts))
+    # wave 3: compose
+    nfts = []
+    for collection_id, nft_id in collection_nft_ids:
+        if (collection_id, nft_id) not in nft_reads:
+            continue
+        nft_information, access_levels = nft_reads[(collection_id, nft_id)]
+        nft = compose_nft_with_access(nft_information, catalog[collection_id][0], access_levels)
+        if nft:
+            nfts.append(nft)
     
-    return all_nfts_list
\ No newline at end of file
+    stats = {
+        "collections": len(catalog),
+        "nfts": len(nfts),
+        "contract_calls": 1 + 5 * len(collection_ids) + 3 * len(collection_nft_ids),
+        "max_workers": MAX_WORKERS,
+    }
+    
+    return {"nfts": nfts, "collections": [details for details, _ in catalog.values()], "stats": stats}
+
+
+def all_nfts():
+    crawl = crawl_catalog()
+    if crawl is None:
+        return None
+    return crawl["nfts"]
+
+
+############################################################################################################################
+################################################## Chain Index #############################################################
+############################################################################################################################
+
+# local SQLite index fed from contract events, the data_fetch routes read from it once it has caught up.
+# Only created here: start_chain_sync() starts it from the server's entry point, so importing the app
+# (tooling, benchmarks) does not bootstrap chain state from the RPC
+chain_index = None
+
+if INDEXER_ENABLED:
+    chain_index = ChainIndexer(
+        w3, contracts, multicall, INDEXER_DB_PATH, DEFAULT_NFT_METADATA,
+        start_block=INDEXER_START_BLOCK,
+        confirmations=int(app.config['INDEXER_CONFIRMATIONS']),
+        chunk_size=int(app.config['INDEXER_CHUNK_SIZE']),
+        poll_interval=float(app.config['INDEXER_POLL_SECONDS']),
+        max_lag_blocks=int(app.config['INDEXER_MAX_LAG_BLOCKS']),
+        worker_context=lambda: request_type("indexer"),
+    )
+
+
+def chain_index_ready():
+    return chain_index is not None and chain_index.is_ready()
+
+
+############################################################################################################################
+################################################## Snapshots ###############################################################
+############################################################################################################################
+
+# all_nft.json / all_popular_collections.json under uploads/temp, rebuilt incrementally in the background
+# once start_chain_sync() has started it, like the chain index
+snapshot_builder = None
+
+if SNAPSHOT_ENABLED:
+    snapshot_builder = SnapshotBuilder(
+        w3, contracts, multicall, catalog_collections, catalog_nfts, compose_nft_with_access, SNAPSHOT_DIR,
+        confirmations=int(app.config['INDEXER_CONFIRMATIONS']),
+        chunk_size=int(app.config['INDEXER_CHUNK_SIZE']),
+        interval=float(app.config['SNAPSHOT_INTERVAL_SECONDS']),
+        popular_limit=int(app.config['SNAPSHOT_POPULAR_LIMIT']),
+        worker_context=lambda: request_type("crawl"),
+    )
+
+
+############################################################################################################################
+################################################## Background Sync #########################################################
+############################################################################################################################
+
+def start_chain_sync():
+    # called by the server entry point (app.py), never at import
+    if chain_index is not None:
+        chain_index.start()
+    if snapshot_builder is not None:
+        snapshot_builder.start()
@@ -28,7 +28,68 @@ def init_config():
         "FILESTORAGE_ENDPOINT"  : "http://localhost:6010",
         "LOCAL_ENV"             : "1",
         "local_data_endpoint"   : "http://localhost:5500",   
-        "BASE_NODE_RPC_ENDPOINT": "https://base-sepolia-rpc.publicnode.com"
+        "BASE_NODE_RPC_ENDPOINT": "https://base-sepolia-rpc.publicnode.com",
+        "BASE_NODE_RPC_ENDPOINTS"       : "",   # comma-separated fallbacks tried after BASE_NODE_RPC_ENDPOINT
+        "RPC_BREAKER_FAILURES"          : "5",  # consecutive failures that open an endpoint's circuit breaker
+        "RPC_BREAKER_COOLDOWN_SECONDS"  : "30",
+        "RPC_RETRY_DEADLINE_SECONDS"    : "10", # total time budget for with_retry attempts + backoff
+        "RPC_RETRY_BASE_DELAY_MS"       : "250",
+        "RPC_HEDGING_ENABLED"           : "0",  # duplicate slow reads to a second endpoint (needs BASE_NODE_RPC_ENDPOINTS)
+        "RPC_HEDGE_PERCENTILE"          : "95", # hedge after this percentile of recent latency
+        "RPC_HEDGE_MIN_DELAY_MS"        : "50",
+        "RPC_HEDGE_BUDGET"              : "0.1",# max hedges as a fraction of hedgeable requests
+        "MULTICALL3_ADDRESS"    : "0xcA11bde05977b3631167028862bE2a173976CA11",
+        "MULTICALL_ENABLED"     : "1",
+        "MULTICALL_BATCH_SIZE"  : "50",
+        "RPC_BATCH_ENABLED"     : "1",
+        "RPC_BATCH_WINDOW_MS"   : "5",
+        "RPC_BATCH_MAX_SIZE"    : "50",
+        "CHAIN_CACHE_ENABLED"   : "1",
+        "CHAIN_CACHE_MAX_STALE_BLOCKS"  : "2",
+        "CHAIN_CACHE_BLOCK_POLL_SECONDS": "1",
+        "CHAIN_CACHE_MAX_ENTRIES"       : "1024",
+        "CHAIN_CACHE_SWR_BLOCKS"        : "15", # blocks past the staleness limit served while refreshing in the background
+        "HTTP_CACHE_MAX_AGE_SECONDS"    : "2",
+        "HTTP_STALE_WHILE_REVALIDATE_SECONDS": "30",
+        "RPC_MAX_WORKERS"       : "20",
+        "RPC_MAX_IN_FLIGHT"     : "16",     # concurrent HTTP requests per RPC endpoint
+        "INDEXER_ENABLED"       : "1",
+        "INDEXER_DB_PATH"       : "",       # defaults to uploads/index/chain_index.db
+        "INDEXER_START_BLOCK"   : "",       # empty: bootstrap from a state snapshot instead of replaying history
+        "INDEXER_CONFIRMATIONS" : "3",
+        "INDEXER_CHUNK_SIZE"    : "2000",
+        "INDEXER_POLL_SECONDS"  : "2",
+        "INDEXER_MAX_LAG_BLOCKS": "10",
+        "CHAIN_READ_BACKEND"    : "thread", # "thread" or "async"
+        "ASYNC_RPC_MAX_CONNECTIONS"     : "32",
+        "SNAPSHOT_ENABLED"              : "1",
+        "SNAPSHOT_INTERVAL_SECONDS"     : "60",
+        "SNAPSHOT_POPULAR_LIMIT"        : "20", # collections kept in all_popular_collections.json
+        "PDF_EXTRACT_WORKERS"           : "0",  # worker processes, 0: one per CPU
+        "PDF_PAGES_PER_TASK"            : "8",
+        "PDF_MAX_PAGES"                 : "2000",
+        "PDF_MAX_FILE_MB"               : "100",
+        "PDF_MAX_TEXT_MB"               : "50",
+        "JOB_WORKERS"                   : "4",
+        "JOB_DB_PATH"                   : "",   # defaults to uploads/jobs/jobs.db
+        "JOB_MAX_QUEUED"                : "100",
+        "JOB_WAIT_SECONDS"              : "25", # how long a request waits for its job before answering 202
+        "JOB_RETENTION_HOURS"           : "24",
+        "DATA_FETCH_CACHE_ENTRIES"      : "64", # remote NFT data documents kept for revalidation
+        "DATA_FETCH_CACHE_MB"           : "64",
+        "DATA_FETCH_TIMEOUT_SECONDS"    : "30",
+        "TEXT_UNICODE_FORM"             : "nfkc", # keep | nfkc | ascii_fold | ascii (old behaviour: non-ASCII -> space)
+        "TEXT_STRIP_CONTROL"            : "1",
+        "TEXT_COLLAPSE_WHITESPACE"      : "1",
+        "DATA_COMPRESSED"               : "1",  # keep .data files as .gz/.br only
+        "UPLOAD_MAX_MB"                 : "200", # chunked uploads through /uploads, PDFs are held to PDF_MAX_FILE_MB
+        "UPLOAD_CHUNK_MAX_MB"           : "8",
+        "UPLOAD_IDLE_HOURS"             : "24",
+        "INGEST_WORKERS"                : "4",  # files of one /ingest request extracted at once
+        "INGEST_MAX_FILES"              : "50",
+        "INGEST_CHUNK_CHARS"            : "1000",
+        "INGEST_CHUNK_OVERLAP_CHARS"    : "200",
+        "EMBED_ON_UPLOAD"               : "1",  # embed uploaded data right away, a request can say ?embed=0
     }
 
     # Get configuration from environment variables with fallback to defaults
@@ -43,6 +104,67 @@ def init_config():
         "LOCAL_ENV"             : os.getenv("LOCAL_ENV", default_config["LOCAL_ENV"]),
         "local_data_endpoint"   : os.getenv("LOCAL_DATA_ENDPOINT", default_config["local_data_endpoint"]),
         "BASE_NODE_RPC_ENDPOINT": os.getenv("BASE_NODE_RPC_ENDPOINT", default_config["BASE_NODE_RPC_ENDPOINT"]),
+        "BASE_NODE_RPC_ENDPOINTS"       : os.getenv("BASE_NODE_RPC_ENDPOINTS", default_config["BASE_NODE_RPC_ENDPOINTS"]),
+        "RPC_BREAKER_FAILURES"          : os.getenv("RPC_BREAKER_FAILURES", default_config["RPC_BREAKER_FAILURES"]),
+        "RPC_BREAKER_COOLDOWN_SECONDS"  : os.getenv("RPC_BREAKER_COOLDOWN_SECONDS", default_config["RPC_BREAKER_COOLDOWN_SECONDS"]),
+        "RPC_RETRY_DEADLINE_SECONDS"    : os.getenv("RPC_RETRY_DEADLINE_SECONDS", default_config["RPC_RETRY_DEADLINE_SECONDS"]),
+        "RPC_RETRY_BASE_DELAY_MS"       : os.getenv("RPC_RETRY_BASE_DELAY_MS", default_config["RPC_RETRY_BASE_DELAY_MS"]),
+        "RPC_HEDGING_ENABLED"           : os.getenv("RPC_HEDGING_ENABLED", default_config["RPC_HEDGING_ENABLED"]),
+        "RPC_HEDGE_PERCENTILE"          : os.getenv("RPC_HEDGE_PERCENTILE", default_config["RPC_HEDGE_PERCENTILE"]),
+        "RPC_HEDGE_MIN_DELAY_MS"        : os.getenv("RPC_HEDGE_MIN_DELAY_MS", default_config["RPC_HEDGE_MIN_DELAY_MS"]),
+        "RPC_HEDGE_BUDGET"              : os.getenv("RPC_HEDGE_BUDGET", default_config["RPC_HEDGE_BUDGET"]),
+        "MULTICALL3_ADDRESS"    : os.getenv("MULTICALL3_ADDRESS", default_config["MULTICALL3_ADDRESS"]),
+        "MULTICALL_ENABLED"     : os.getenv("MULTICALL_ENABLED", default_config["MULTICALL_ENABLED"]),
+        "MULTICALL_BATCH_SIZE"  : os.getenv("MULTICALL_BATCH_SIZE", default_config["MULTICALL_BATCH_SIZE"]),
+        "RPC_BATCH_ENABLED"     : os.getenv("RPC_BATCH_ENABLED", default_config["RPC_BATCH_ENABLED"]),
+        "RPC_BATCH_WINDOW_MS"   : os.getenv("RPC_BATCH_WINDOW_MS", default_config["RPC_BATCH_WINDOW_MS"]),
+        "RPC_BATCH_MAX_SIZE"    : os.getenv("RPC_BATCH_MAX_SIZE", default_config["RPC_BATCH_MAX_SIZE"]),
+        "CHAIN_CACHE_ENABLED"   : os.getenv("CHAIN_CACHE_ENABLED", default_config["CHAIN_CACHE_ENABLED"]),
+        "CHAIN_CACHE_MAX_STALE_BLOCKS"  : os.getenv("CHAIN_CACHE_MAX_STALE_BLOCKS", default_config["CHAIN_CACHE_MAX_STALE_BLOCKS"]),
+        "CHAIN_CACHE_BLOCK_POLL_SECONDS": os.getenv("CHAIN_CACHE_BLOCK_POLL_SECONDS", default_config["CHAIN_CACHE_BLOCK_POLL_SECONDS"]),
+        "CHAIN_CACHE_MAX_ENTRIES"       : os.getenv("CHAIN_CACHE_MAX_ENTRIES", default_config["CHAIN_CACHE_MAX_ENTRIES"]),
+        "CHAIN_CACHE_SWR_BLOCKS"        : os.getenv("CHAIN_CACHE_SWR_BLOCKS", default_config["CHAIN_CACHE_SWR_BLOCKS"]),
+        "HTTP_CACHE_MAX_AGE_SECONDS"    : os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", default_config["HTTP_CACHE_MAX_AGE_SECONDS"]),
+        "HTTP_STALE_WHILE_REVALIDATE_SECONDS": os.getenv("HTTP_STALE_WHILE_REVALIDATE_SECONDS", default_config["HTTP_STALE_WHILE_REVALIDATE_SECONDS"]),
+        "RPC_MAX_WORKERS"       : os.getenv("RPC_MAX_WORKERS", default_config["RPC_MAX_WORKERS"]),
+        "RPC_MAX_IN_FLIGHT"     : os.getenv("RPC_MAX_IN_FLIGHT", default_config["RPC_MAX_IN_FLIGHT"]),
+        "INDEXER_ENABLED"       : os.getenv("INDEXER_ENABLED", default_config["INDEXER_ENABLED"]),
+        "INDEXER_DB_PATH"       : os.getenv("INDEXER_DB_PATH", default_config["INDEXER_DB_PATH"]),
+        "INDEXER_START_BLOCK"   : os.getenv("INDEXER_START_BLOCK", default_config["INDEXER_START_BLOCK"]),
+        "INDEXER_CONFIRMATIONS" : os.getenv("INDEXER_CONFIRMATIONS", default_config["INDEXER_CONFIRMATIONS"]),
+        "INDEXER_CHUNK_SIZE"    : os.getenv("INDEXER_CHUNK_SIZE", default_config["INDEXER_CHUNK_SIZE"]),
+        "INDEXER_POLL_SECONDS"  : os.getenv("INDEXER_POLL_SECONDS", default_config["INDEXER_POLL_SECONDS"]),
+        "INDEXER_MAX_LAG_BLOCKS": os.getenv("INDEXER_MAX_LAG_BLOCKS", default_config["INDEXER_MAX_LAG_BLOCKS"]),
+        "CHAIN_READ_BACKEND"    : os.getenv("CHAIN_READ_BACKEND", default_config["CHAIN_READ_BACKEND"]),
+        "ASYNC_RPC_MAX_CONNECTIONS"     : os.getenv("ASYNC_RPC_MAX_CONNECTIONS", default_config["ASYNC_RPC_MAX_CONNECTIONS"]),
+        "SNAPSHOT_ENABLED"              : os.getenv("SNAPSHOT_ENABLED", default_config["SNAPSHOT_ENABLED"]),
+        "SNAPSHOT_INTERVAL_SECONDS"     : os.getenv("SNAPSHOT_INTERVAL_SECONDS", default_config["SNAPSHOT_INTERVAL_SECONDS"]),
+        "SNAPSHOT_POPULAR_LIMIT"        : os.getenv("SNAPSHOT_POPULAR_LIMIT", default_config["SNAPSHOT_POPULAR_LIMIT"]),
+        "PDF_EXTRACT_WORKERS"           : os.getenv("PDF_EXTRACT_WORKERS", default_config["PDF_EXTRACT_WORKERS"]),
+        "PDF_PAGES_PER_TASK"            : os.getenv("PDF_PAGES_PER_TASK", default_config["PDF_PAGES_PER_TASK"]),
+        "PDF_MAX_PAGES"                 : os.getenv("PDF_MAX_PAGES", default_config["PDF_MAX_PAGES"]),
+        "PDF_MAX_FILE_MB"               : os.getenv("PDF_MAX_FILE_MB", default_config["PDF_MAX_FILE_MB"]),
+        "PDF_MAX_TEXT_MB"               : os.getenv("PDF_MAX_TEXT_MB", default_config["PDF_MAX_TEXT_MB"]),
+        "JOB_WORKERS"                   : os.getenv("JOB_WORKERS", default_config["JOB_WORKERS"]),
+        "JOB_DB_PATH"                   : os.getenv("JOB_DB_PATH", default_config["JOB_DB_PATH"]),
+        "JOB_MAX_QUEUED"                : os.getenv("JOB_MAX_QUEUED", default_config["JOB_MAX_QUEUED"]),
+        "JOB_WAIT_SECONDS"              : os.getenv("JOB_WAIT_SECONDS", default_config["JOB_WAIT_SECONDS"]),
+        "JOB_RETENTION_HOURS"           : os.getenv("JOB_RETENTION_HOURS", default_config["JOB_RETENTION_HOURS"]),
+        "DATA_FETCH_CACHE_ENTRIES"      : os.getenv("DATA_FETCH_CACHE_ENTRIES", default_config["DATA_FETCH_CACHE_ENTRIES"]),
+        "DATA_FETCH_CACHE_MB"           : os.getenv("DATA_FETCH_CACHE_MB", default_config["DATA_FETCH_CACHE_MB"]),
+        "DATA_FETCH_TIMEOUT_SECONDS"    : os.getenv("DATA_FETCH_TIMEOUT_SECONDS", default_config["DATA_FETCH_TIMEOUT_SECONDS"]),
+        "TEXT_UNICODE_FORM"             : os.getenv("TEXT_UNICODE_FORM", default_config["TEXT_UNICODE_FORM"]),
+        "TEXT_STRIP_CONTROL"            : os.getenv("TEXT_STRIP_CONTROL", default_config["TEXT_STRIP_CONTROL"]),
+        "TEXT_COLLAPSE_WHITESPACE"      : os.getenv("TEXT_COLLAPSE_WHITESPACE", default_config["TEXT_COLLAPSE_WHITESPACE"]),
+        "DATA_COMPRESSED"               : os.getenv("DATA_COMPRESSED", default_config["DATA_COMPRESSED"]),
+        "UPLOAD_MAX_MB"                 : os.getenv("UPLOAD_MAX_MB", default_config["UPLOAD_MAX_MB"]),
+        "UPLOAD_CHUNK_MAX_MB"           : os.getenv("UPLOAD_CHUNK_MAX_MB", default_config["UPLOAD_CHUNK_MAX_MB"]),
+        "UPLOAD_IDLE_HOURS"             : os.getenv("UPLOAD_IDLE_HOURS", default_config["UPLOAD_IDLE_HOURS"]),
+        "INGEST_WORKERS"                : os.getenv("INGEST_WORKERS", default_config["INGEST_WORKERS"]),
+        "INGEST_MAX_FILES"              : os.getenv("INGEST_MAX_FILES", default_config["INGEST_MAX_FILES"]),
+        "INGEST_CHUNK_CHARS"            : os.getenv("INGEST_CHUNK_CHARS", default_config["INGEST_CHUNK_CHARS"]),
+        "INGEST_CHUNK_OVERLAP_CHARS"    : os.getenv("INGEST_CHUNK_OVERLAP_CHARS", default_config["INGEST_CHUNK_OVERLAP_CHARS"]),
+        "EMBED_ON_UPLOAD"               : os.getenv("EMBED_ON_UPLOAD", default_config["EMBED_ON_UPLOAD"]),
     }
     
     return config
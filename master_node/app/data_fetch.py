@@ -4,8 +4,21 @@ from app import app
 from flask import request, jsonify, send_from_directory
 
 from app import blockchain_code
+from app.module.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_rows, project
+from app.module.blob_store import BlobStore, IMMUTABLE_MAX_AGE, is_content_addressed
+from app.module.image_variants import ImageVariants, parse_variant_name
+from app.module.job_queue import JobQueueFull, JobError
+from app.jobs import job_queue
+from app.uploads import register_upload
 
-from werkzeug.utils import secure_filename
+if blockchain_code.CHAIN_READ_BACKEND == "async":
+    from app import async_blockchain_code
+    chain_reads = async_blockchain_code.sync_reads
+else:
+    chain_reads = blockchain_code
+
+
+from functools import wraps
 
 from web3 import Web3
 
@@ -13,6 +26,8 @@ import random
 
 import string
 
+import hashlib
+
 import json
 
 import os
@@ -23,13 +38,123 @@ UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
 
 FILE_STORAGE_ENDPOINT = app.config['filestorage_endpoint']
 
+HTTP_CACHE_MAX_AGE = int(app.config['HTTP_CACHE_MAX_AGE_SECONDS'])
+HTTP_STALE_WHILE_REVALIDATE = int(app.config['HTTP_STALE_WHILE_REVALIDATE_SECONDS'])
+
 # UPLOAD_FOLDER = 'image'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# uploaded images are stored once under the hash of their bytes, with resized variants made in the background
+image_store = BlobStore(os.path.join(UPLOAD_FOLDER, "images"))
+image_variants = ImageVariants(image_store.root)
+
+
+def image_variants_job(payload, progress):
+    try:
+        return image_variants.build(payload['name'], progress)
+    except ValueError as e:
+        raise JobError(str(e), 415)
+
+
+job_queue.register("image_variants", image_variants_job)
+
+
+def schedule_image_variants(filename):
+    if not image_variants.can_process(filename) or not image_variants.missing(filename):
+        return
+    try:
+        job_queue.submit("image_variants", {'name': filename}, dedupe_key=f"image_variants:{filename}")
+    except JobQueueFull as e:
+        # the upload still stands, variant URLs fall back to the original until a later request schedules them
+        print(f"Image variants for {filename} not queued: {str(e)}")
 # app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 def generate_random_string(length=10):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def page_args(composite_key=False):
+    """
+    limit / cursor / fields query parameters of the listing routes. Returns (limit, after, fields):
+    limit is None when neither limit nor cursor is given (legacy full list), fields is None for all fields.
+    Raises ValueError on bad input.
+    """
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+    
+    limit, cursor = request.args.get('limit'), request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None, fields
+    
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    
+    after = decode_cursor(cursor)
+    if after is not None:
+        valid = (isinstance(after, tuple) and len(after) == 2 and all(isinstance(part, int) for part in after)) \
+            if composite_key else isinstance(after, int)
+        if not valid:
+            raise ValueError('Invalid cursor')
+    
+    return limit, after, fields
+
+
+def listing_response(items, fields):
+    if items is None:
+        return jsonify({'error': 'Failed to read from chain'}), 502
+    return jsonify([project(item, fields) for item in items]), 200
+
+
+def page_response(page, fields):
+    # page is (items, next_after) from a *_page read, None if the chain read failed
+    if page is None:
+        return jsonify({'error': 'Failed to read from chain'}), 502
+    items, next_after = page
+    return jsonify({'items': [project(item, fields) for item in items], 'nextCursor': encode_cursor(next_after)}), 200
+
+
+def conditional_get(view):
+    """
+    Strong ETag from a hash of the JSON body (unless the view set one), 304 for a matching If-None-Match and
+    Cache-Control with stale-while-revalidate, so browsers and nginx can absorb polling. Errors pass through as they are.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        if response.get_etag()[0] is None:
+            response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32])
+        response.headers['Cache-Control'] = f'public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate={HTTP_STALE_WHILE_REVALIDATE}'
+        return response.make_conditional(request)
+    return wrapper
+
+
+def snapshot_response(name, missing_error):
+    # latest snapshot from the builder's memory, the file on disk until the first build
+    snapshot = blockchain_code.snapshot_builder.snapshot(name) if blockchain_code.snapshot_builder else None
+    if snapshot is not None:
+        body, etag = snapshot
+    else:
+        path = os.path.join(UPLOAD_FOLDER, "temp", name)
+        if not os.path.exists(path):
+            return jsonify({'error': missing_error}), 404
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/upload', methods=['POST'])
 def upload_image():
     if 'image' not in request.files:
@@ -42,12 +167,9 @@ def upload_image():
     if file:
         # Get the file extension
         _, ext = os.path.splitext(file.filename)
-        # Generate a random filename
-        random_filename = f"{generate_random_string()}{ext}"
-        # Secure the filename
-        filename = secure_filename(random_filename)
-        # Save the file
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'],"images" ,filename))
+        # hashed while it streams to disk, the name is the content hash
+        filename, _ = image_store.put_stream(file.stream, ext)
+        schedule_image_variants(filename)
         return filename, 200
     
 @app.route('/upload_image_url', methods=['POST'])
@@ -63,13 +185,22 @@ def upload_image_url():
     if file:
         # Get the file extension
         _, ext = os.path.splitext(file.filename)
-        # Generate a random filename
-        random_filename = f"{generate_random_string()}{ext}"
-        # Secure the filename
-        filename = secure_filename(random_filename)
-        # Save the file
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'],"images" ,filename))
+        # hashed while it streams to disk, the name is the content hash
+        filename, _ = image_store.put_stream(file.stream, ext)
+        schedule_image_variants(filename)
         return f"{FILE_STORAGE_ENDPOINT}/image/{filename}", 200
+
+
+def complete_image_upload(session, path, sha256):
+    # a chunked upload through /uploads, answered like /upload_image_url
+    # the upload was hashed as it completed, so the file is renamed into the store, not copied
+    _, ext = os.path.splitext(session['filename'])
+    filename, _ = image_store.adopt_file(path, sha256, ext)
+    schedule_image_variants(filename)
+    return f"{FILE_STORAGE_ENDPOINT}/image/{filename}", 200
+
+
+register_upload("image", complete_image_upload, image_variants.can_process)
     
     
 
@@ -77,9 +208,23 @@ def upload_image_url():
 def get_image(filename):
     
     path_to_file = os.path.join(app.config['UPLOAD_FOLDER'],"images")
+    variant = parse_variant_name(filename)
+    if variant and not os.path.exists(os.path.join(path_to_file, filename)):
+        # <sha256>_<size>.<format> not built yet: the original for now, and make sure it is on its way
+        source = image_variants.source_for(variant[0])
+        if source:
+            schedule_image_variants(source)
+            response = send_from_directory(path_to_file, source)
+            response.cache_control.no_cache = True
+            return response
+    
     if not os.path.exists(os.path.join(path_to_file, filename)):
         return send_from_directory(path_to_file, 'default.jpg')
     print("filename, UPLOAD_FOLDER", filename, UPLOAD_FOLDER)
+    if is_content_addressed(filename) or variant:
+        response = send_from_directory(path_to_file, filename, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
     return send_from_directory(path_to_file, filename)
 
 
@@ -89,6 +234,7 @@ def get_image(filename):
 ############################################################################################################
 
 @app.route('/get_all_collections', methods=['GET'])
+@conditional_get
 def get_all_collections():
     
     # curl -X GET http://localhost:5500/get_all_collections
@@ -102,28 +248,38 @@ def get_all_collections():
     #     collections = json.load(f)
     
     
-    return blockchain_code.getAllCollections()
+    # curl -X GET "http://localhost:5500/get_all_collections?limit=20&fields=id,name,image"
+    
+    try:
+        limit, after, fields = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if limit is None:
+        if blockchain_code.chain_index_ready():
+            return listing_response(blockchain_code.chain_index.collections(), fields)
+        return listing_response(chain_reads.getAllCollections(), fields)
+    
+    if blockchain_code.chain_index_ready():
+        rows = blockchain_code.chain_index.collections(after_id=after, limit=limit + 1)
+        return page_response(page_rows(rows, limit, key=lambda collection: collection['id']), fields)
+    
+    return page_response(chain_reads.collections_page(limit, after), fields)
     
     
     # return jsonify(collections), 200
 
 
 @app.route('/get_popular_collections', methods=['GET'])
+@conditional_get
 def get_popular_collections():
     
     # curl -X GET http://localhost:5500/get_popular_collections
-    path = os.path.join(app.config['UPLOAD_FOLDER'], "temp", "all_popular_collections.json")
-    
-    if not os.path.exists(path):
-        return jsonify({'error': 'No collections found'}), 404
-    
-    with open(path, 'r') as f:
-        collections = json.load(f)
-        
-    return jsonify( collections), 200
+    return snapshot_response("all_popular_collections.json", 'No collections found')
 
 
 @app.route('/get_collections_by_address', methods=['GET'])
+@conditional_get
 def get_collections_by_address():
     address = request.args.get('address') 
     if not address:
@@ -134,7 +290,10 @@ def get_collections_by_address():
     except:
         return jsonify({'error': 'Invalid address'}), 400
 
-    return blockchain_code.getAllCollections_by_address(address), 200
+    if blockchain_code.chain_index_ready():
+        return blockchain_code.chain_index.collections(owner=address), 200
+
+    return chain_reads.getAllCollections_by_address(address), 200
     
     
     # collections_path = os.path.join(app.config['UPLOAD_FOLDER'], "temp", "all_collections.json")
@@ -152,6 +311,7 @@ def get_collections_by_address():
 
 
 @app.route('/get_collection_by_id', methods=['GET'])
+@conditional_get
 def get_collection_by_id():
     
     collection_id = request.args.get('collection_id')
@@ -168,7 +328,12 @@ def get_collection_by_id():
     # my_collection = [collection for collection in all_collections['collections'] if collection['id'] == int(collection_id)]
     
     
-    return blockchain_code.get_collection_details_by_id(int(collection_id))
+    if blockchain_code.chain_index_ready():
+        collection = blockchain_code.chain_index.collection_details(int(collection_id))
+        if collection is not None:
+            return collection
+    
+    return chain_reads.get_collection_details_by_id(int(collection_id))
     
         
     # return jsonify({'myCollections': my_collection}), 200
@@ -181,20 +346,15 @@ def get_collection_by_id():
 ############################################################################################################
 
 @app.route('/get_all_nfts', methods=['GET'])
+@conditional_get
 def get_all_nfts():
-    collection_path = os.path.join(UPLOAD_FOLDER, "temp", "all_nft.json")
-    if not os.path.exists(collection_path):
-        return jsonify({'error': 'Collection not found'}), 404
-    
-    with open(collection_path, 'r') as f:
-        nfts = json.load(f)
-    
-    return jsonify(nfts), 200
+    return snapshot_response("all_nft.json", 'Collection not found')
 
 
 
 
 @app.route('/get_nfts_by_address', methods=['GET'])
+@conditional_get
 def get_nfts_by_address():
     # address = request.args.get('address') 
     # if not address:
@@ -219,7 +379,23 @@ def get_nfts_by_address():
         address = Web3.to_checksum_address(str(address).lower())
     except:
         return jsonify({'error': 'Invalid address'}), 400
-    return blockchain_code.all_nfts_own_or_have_access_by_user(address), 200
+    
+    try:
+        limit, after, fields = page_args(composite_key=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if limit is None:
+        if blockchain_code.chain_index_ready():
+            return listing_response(blockchain_code.chain_index.nfts_for_user(address), fields)
+        return listing_response(chain_reads.all_nfts_own_or_have_access_by_user(address), fields)
+    
+    if blockchain_code.chain_index_ready():
+        rows = blockchain_code.chain_index.nfts_for_user(address, after=after, limit=limit + 1)
+        return page_response(page_rows(rows, limit, key=lambda nft: (nft['collectionId'], nft['id'])), fields)
+    
+    with_metadata = blockchain_code.needs_nft_metadata(fields)
+    return page_response(chain_reads.nfts_of_user_page(address, limit, after, with_metadata=with_metadata), fields)
 
 
 # @app.route('/get_nfts_by_address2', methods=['GET'])
@@ -232,15 +408,31 @@ def get_nfts_by_address():
 
 
 @app.route('/get_nfts_by_collection', methods=['GET'])
+@conditional_get
 def get_nfts_by_collection():
 
     collecton_id = request.args.get('collection_id')
     if not collecton_id:
         return jsonify({'error': 'Collection ID parameter is required'}), 400
     
-    all_nfts = blockchain_code.all_nft_of_a_collection(int(collecton_id))
+    # curl -X GET "http://localhost:5500/get_nfts_by_collection?collection_id=1&limit=20&fields=id,name,image"
+    
+    try:
+        limit, after, fields = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if limit is None:
+        if blockchain_code.chain_index_ready():
+            return listing_response(blockchain_code.chain_index.nfts_of_collection(int(collecton_id)), fields)
+        return listing_response(chain_reads.all_nft_of_a_collection(int(collecton_id)), fields)
+    
+    if blockchain_code.chain_index_ready():
+        rows = blockchain_code.chain_index.nfts_of_collection(int(collecton_id), after_id=after, limit=limit + 1)
+        return page_response(page_rows(rows, limit, key=lambda nft: nft['id']), fields)
     
-    return all_nfts, 200
+    with_metadata = blockchain_code.needs_nft_metadata(fields)
+    return page_response(chain_reads.nfts_of_a_collection_page(int(collecton_id), limit, after, with_metadata=with_metadata), fields)
 
     # collection_address = request.args.get('collection_address')
     # if not collection_address:
@@ -261,6 +453,7 @@ def get_nfts_by_collection():
 
 
 @app.route('/get_nft_by_collectionid_nft_id', methods=['GET'])
+@conditional_get
 def get_nft_data_by_collectionID_nftID():
     
     # curl -X GET http://localhost:5500/get_nft_by_collectionid_nft_id?nft_id=1&collection_id=1
@@ -271,7 +464,7 @@ def get_nft_data_by_collectionID_nftID():
     if not nft_id or not collection_id:
         return jsonify({'error': 'Both NFT ID and Collection address parameters are required'}), 400
 
-    nft = blockchain_code.nft_of_a_collection_with_access(int(collection_id), int(nft_id))
+    nft = chain_reads.nft_of_a_collection_with_access(int(collection_id), int(nft_id))
     
     return nft, 200
 
@@ -279,6 +472,7 @@ def get_nft_data_by_collectionID_nftID():
 
 
 @app.route('/get_compounded_nft_by_collectionid_nft_id', methods=['GET'])
+@conditional_get
 def get_nft_data_compounded():
     nft_id          = request.args.get('nft_id')
     collection_id   = request.args.get('collection_id')
@@ -286,7 +480,7 @@ def get_nft_data_compounded():
     if not nft_id or not collection_id:
         return jsonify({'error': 'Both NFT ID and Collection address parameters are required'}), 400
 
-    nft = blockchain_code.nft_of_a_collection_with_access(int(collection_id), int(nft_id))
+    nft = chain_reads.nft_of_a_collection_with_access(int(collection_id), int(nft_id))
     
     return nft, 200
 
@@ -0,0 +1,57 @@
+from app import app
+
+from flask import request, jsonify
+
+from app.module.job_queue import JobQueue
+
+import os
+
+
+UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
+
+# uploads wait in JOB_FOLDER for the job that processes them
+JOB_FOLDER      = os.path.join(UPLOAD_FOLDER,"jobs")
+JOB_WAIT        = float(app.config['JOB_WAIT_SECONDS'])
+
+
+############################################################################################################
+######################################### Job Queue ########################################################
+############################################################################################################
+
+# shared by the route modules, each registers the handlers for its own job kinds; workers only pick up
+# kinds that have a handler, so jobs persisted by a previous run wait until their module is imported
+job_queue = JobQueue(
+    app.config['JOB_DB_PATH'] or os.path.join(JOB_FOLDER, "jobs.db"),
+    workers             = int(app.config['JOB_WORKERS']),
+    max_queued          = int(app.config['JOB_MAX_QUEUED']),
+    retention_seconds   = float(app.config['JOB_RETENTION_HOURS']) * 3600,
+)
+# started by the server entry point (app.py), never at import: starting requeues the jobs left running,
+# which in any other process importing the app would be the live server's, and works them off again
+
+
+def job_response(job, render, status_url=None):
+    # callers get the job's own response if it finishes within JOB_WAIT_SECONDS, otherwise a 202 to poll
+    # status_url (by default /jobs/<id>); ?async=1 or "Prefer: respond-async" skips the wait
+    if request.args.get('async') != '1' and 'respond-async' not in request.headers.get('Prefer', ''):
+        job = job_queue.wait(job['id'], JOB_WAIT)
+
+    if job['status'] == 'done':
+        return render(job['result'])
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']}), job['error_status'] or 500
+
+    status_url = status_url or f"/jobs/{job['id']}"
+    return jsonify(dict(job, statusUrl=status_url)), 202, {'Location': status_url, 'Retry-After': '2'}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+
+    # curl -X GET http://localhost:5500/jobs/<job_id>
+
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job), 200
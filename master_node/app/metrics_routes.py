@@ -0,0 +1,73 @@
+from app import app
+
+from flask import g, jsonify
+
+from app import blockchain_code
+from app import data_fetch
+from app import jobs
+from app import routesv2
+from app import uploads
+from app.module.helper_functions import master_key_required
+
+if blockchain_code.CHAIN_READ_BACKEND == "async":
+    from app import async_blockchain_code
+
+
+############################################################################################################
+######################################### Request Timing ###################################################
+############################################################################################################
+
+# chain reads made while serving a request are totalled per request and reported in a Server-Timing header
+
+@app.before_request
+def begin_call_metrics():
+    g.call_metrics_token = blockchain_code.call_metrics.begin_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    server_timing = blockchain_code.call_metrics.server_timing(blockchain_code.call_metrics.request_totals())
+    if server_timing:
+        response.headers.add('Server-Timing', server_timing)
+    return response
+
+
+@app.teardown_request
+def end_call_metrics(exception=None):
+    token = g.pop('call_metrics_token', None)
+    if token is not None:
+        blockchain_code.call_metrics.end_request(token)
+
+
+############################################################################################################
+######################################### Metrics ##########################################################
+############################################################################################################
+
+@app.route('/metrics', methods=['GET'])
+@master_key_required
+def get_metrics():
+    
+    # curl -X GET http://localhost:5500/metrics -H "X-API-Key: <MASTER_API_KEY>"
+    # operators only: it shows the RPC endpoints, the queues and the storage figures
+    
+    metrics = {
+        "chain_cache"   : blockchain_code.chain_cache.stats(),
+        "reverse_index" : blockchain_code.reverse_index.stats(),
+        "rpc_batching"  : dict(blockchain_code.w3.provider.stats, **blockchain_code.w3.provider.hedge.stats),
+        "rpc_endpoints" : blockchain_code.w3.provider.endpoints.stats(),
+        "rpc_async"     : dict(async_blockchain_code.async_w3.provider.stats) if blockchain_code.CHAIN_READ_BACKEND == "async" else None,
+        "rpc_executor"  : blockchain_code.rpc_executor.stats(),
+        "contract_calls": blockchain_code.call_metrics.stats(),
+        "chain_index"   : blockchain_code.chain_index.status() if blockchain_code.chain_index else None,
+        "snapshots"     : blockchain_code.snapshot_builder.status() if blockchain_code.snapshot_builder else None,
+        "pdf_extract"   : dict(routesv2.pdf_extractor.stats(), normalizer=routesv2.text_normalizer.describe()),
+        "ingest"        : routesv2.corpus_builder.stats(),
+        "embeddings"    : routesv2.embedding_store.stats(),
+        "jobs"          : jobs.job_queue.status(),
+        "uploads"       : uploads.upload_sessions.status(),
+        "storage"       : {"images": data_fetch.image_store.stats(), "data": dict(routesv2.data_store.stats(), usage=routesv2.data_store.usage())},
+        "image_variants": data_fetch.image_variants.stats(),
+        "data_sources"  : routesv2.data_sources.stats(),
+    }
+    
+    return jsonify(metrics), 200
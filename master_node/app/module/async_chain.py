@@ -0,0 +1,272 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import aiohttp
+from web3 import AsyncWeb3, AsyncHTTPProvider, Web3
+
+from app.module.batch_provider import BatchingHTTPProvider
+from app.module.multicall import CallResult, MulticallError, decode_function_output
+
+
+############################################################################################################
+############################################ sync bridge ###################################################
+############################################################################################################
+
+
+async def _in_context(context, coro):
+    for variable, value in context.items():
+        variable.set(value)
+    return await coro
+
+
+class EventLoopThread:
+    """
+    One asyncio event loop running on a daemon thread, so synchronous code (Flask views) can run
+    coroutines on it and block for the result. All coroutines share the loop and its HTTP session.
+    """
+
+    def __init__(self, name="chain-async-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        # the caller's context variables (request type, per-request call metrics) follow the coroutine onto the loop
+        return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), self.loop)
+
+    def run(self, coro, timeout=None):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("EventLoopThread.run() called from its own loop, await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+############################################################################################################
+############################################ provider ######################################################
+############################################################################################################
+
+
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """
+    AsyncHTTPProvider that sends every POST through an EndpointPool, the same one the sync
+    BatchingHTTPProvider uses: the fastest healthy endpoint first, failing over down the list on
+    connection or HTTP errors, with each outcome recorded against the endpoint so both backends share
+    latency, error rates and circuit breakers.
+
+    Read-only requests are hedged under the same HedgePolicy as the sync provider's, so both backends
+    use one latency percentile and one hedge budget. The losing request is left to finish so its
+    endpoint's latency is still recorded.
+
+    The pool's per-endpoint in-flight semaphores are thread semaphores and are not taken here; the
+    event loop's concurrency is capped by the aiohttp connector and AsyncMulticall instead.
+    """
+
+    def __init__(self, endpoints, hedge=None, timeout=30, headers=None):
+        super().__init__(endpoints.endpoints[0].uri)
+        self.endpoints  = endpoints
+        self.hedge      = hedge
+        self._timeout   = aiohttp.ClientTimeout(total=timeout)
+        self._headers   = dict(headers or {}, **{"Content-Type": "application/json"})
+        self._session   = None
+        self._losers    = set()  # hedge races still running after the other request answered
+
+        self.stats = {"requests": 0, "http_posts": 0, "failovers": 0}
+
+    async def cache_async_session(self, session):
+        self._session = session
+        return session
+
+    async def _post(self, body, candidates=None):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        self.stats["requests"] += 1
+
+        errors = []
+        for endpoint in candidates or self.endpoints.candidates():
+            if errors:
+                self.stats["failovers"] += 1
+
+            self.stats["http_posts"] += 1
+            started = time.monotonic()
+            try:
+                async with self._session.post(endpoint.uri, data=body, headers=self._headers, timeout=self._timeout) as response:
+                    response.raise_for_status()
+                    content = await response.read()
+            except Exception as e:
+                self.endpoints.record_failure(endpoint, time.monotonic() - started)
+                errors.append(f"{endpoint.label}: {e}")
+                continue
+
+            # JSON-RPC level errors (reverts, bad params) come back in the body and still count as healthy
+            latency = time.monotonic() - started
+            self.endpoints.record_success(endpoint, latency)
+            if self.hedge is not None:
+                self.hedge.record_latency(latency)
+            return content
+
+        raise ConnectionError(f"All RPC endpoints failed: {'; '.join(errors)}")
+
+    async def _post_read(self, body):
+        """POST for read-only requests: hedged to a second endpoint when the first one is slow."""
+        if self.hedge is None or not self.hedge.enabled:
+            return await self._post(body)
+
+        candidates = self.endpoints.candidates()
+        delay = self.hedge.delay()
+        if delay is None or len(candidates) < 2:
+            return await self._post(body, candidates)
+
+        primary = asyncio.ensure_future(self._post(body, candidates))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.hedge.take():
+            return await primary
+
+        # the hedge starts at the next endpoint in line and keeps the same failover order after it
+        hedge = asyncio.ensure_future(self._post(body, candidates[1:] + candidates[:1]))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        self._losers.add(loser)
+                        loser.add_done_callback(self._forget_loser)
+                    if task is hedge:
+                        self.hedge.record_won()
+                    return task.result()
+        return primary.result()
+
+    def _forget_loser(self, task):
+        self._losers.discard(task)
+        if not task.cancelled():
+            task.exception()  # the winner already answered, its failure is only in the pool's stats
+
+    async def make_request(self, method, params):
+        body = self.encode_rpc_request(method, params)
+        if method in BatchingHTTPProvider.BATCHABLE_METHODS:
+            return self.decode_rpc_response(await self._post_read(body))
+        return self.decode_rpc_response(await self._post(body))
+
+    async def make_batch_request(self, batch_requests):
+        response = self.decode_rpc_response(await self._post(self.encode_batch_rpc_request(batch_requests)))
+        if not isinstance(response, list):
+            # RPC errors return only one response with the error object
+            return response
+        # JSON-RPC does not promise the order of a batch's responses, web3 pairs them with the requests
+        # by position; a response without an id (some node errors) leaves them in the order received
+        if all(item.get("id") is not None for item in response):
+            response = sorted(response, key=lambda item: item["id"])
+        return response
+
+    async def disconnect(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def make_async_web3(endpoints, hedge=None, timeout=30, headers=None):
+    return AsyncWeb3(PooledAsyncHTTPProvider(endpoints, hedge=hedge, timeout=timeout, headers=headers))
+
+
+async def open_pooled_session(async_w3, max_connections=32, keepalive_timeout=30):
+    """Give the provider one long-lived aiohttp session with a bounded keep-alive connection pool.
+    Must be awaited on the loop the provider is used from."""
+    connector = aiohttp.TCPConnector(limit=max_connections, keepalive_timeout=keepalive_timeout)
+    session = aiohttp.ClientSession(connector=connector)
+    await async_w3.provider.cache_async_session(session)
+    return session
+
+
+############################################################################################################
+############################################ Multicall3 ####################################################
+############################################################################################################
+
+
+class AsyncMulticall:
+    """
+    asyncio counterpart of Multicall. Takes the same bound contract calls (only used for their
+    address, ABI and calldata, so the sync contracts work) and sends them over an AsyncWeb3,
+    with at most max_concurrency eth_calls outstanding at once. Round trips go to metrics like Multicall's.
+    """
+
+    def __init__(self, async_w3, address, abi, batch_size=50, max_concurrency=16, enabled=True, metrics=None):
+        self.w3 = async_w3
+        self.contract = async_w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.metrics = metrics
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _observe(self, calls, started, sizes):
+        if self.metrics is not None:
+            self.metrics.observe(calls, time.perf_counter() - started, sizes)
+
+    async def call(self, contract_function, block_identifier=None, gas=None):
+        # plain eth_call for one bound contract function, decoded like contract_function.call()
+        transaction = {"to": contract_function.address, "data": contract_function._encode_transaction_data()}
+        if gas is not None:
+            transaction["gas"] = gas
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                return_data = await self.w3.eth.call(transaction, block_identifier or "latest")
+            except Exception:
+                self._observe([contract_function], started, [None])
+                raise
+        self._observe([contract_function], started, [len(return_data)])
+        return decode_function_output(self.w3.codec, contract_function.abi, return_data)
+
+    async def _call_result(self, contract_function, block_identifier):
+        try:
+            return CallResult(True, await self.call(contract_function, block_identifier))
+        except Exception as e:
+            return CallResult(False, e)
+
+    async def _aggregate_chunk(self, calls, block_identifier):
+        if not self.enabled:
+            return await asyncio.gather(*[self._call_result(call, block_identifier) for call in calls])
+
+        packed = [(call.address, True, call._encode_transaction_data()) for call in calls]
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                raw_results = await self.contract.functions.aggregate3(packed).call(block_identifier=block_identifier)
+            except Exception:
+                self._observe(calls, started, [None] * len(calls))
+                raise
+
+        results = []
+        self._observe(calls, started, [len(return_data) if success else None for success, return_data in raw_results])
+        for call, (success, return_data) in zip(calls, raw_results):
+            if not success:
+                results.append(CallResult(False, MulticallError(f"{call.fn_name} reverted")))
+                continue
+            try:
+                results.append(CallResult(True, decode_function_output(self.w3.codec, call.abi, return_data)))
+            except Exception as e:
+                results.append(CallResult(False, e))
+        return results
+
+    async def aggregate(self, calls, batch_size=None, block_identifier=None, require_success=False):
+        calls = list(calls)
+        batch_size = batch_size or self.batch_size
+        chunks = [calls[i:i + batch_size] for i in range(0, len(calls), batch_size)]
+
+        chunk_results = await asyncio.gather(*[self._aggregate_chunk(chunk, block_identifier) for chunk in chunks])
+        results = [result for chunk in chunk_results for result in chunk]
+
+        if require_success:
+            for call, result in zip(calls, results):
+                if not result.success:
+                    raise MulticallError(f"{call.fn_name} failed: {result.value}")
+
+        return results
@@ -0,0 +1,292 @@
+import concurrent.futures
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from web3 import HTTPProvider
+
+from app.module.endpoint_pool import EndpointPool
+
+
+class HedgePolicy:
+    """
+    When to hedge a read-only request: once it has been outstanding for the percentile of recent
+    successful latencies (not before there are 20 of them, never under min_delay), and only while the
+    hedges stay within budget times the hedgeable requests. One policy is shared by every provider
+    sending to the same EndpointPool, so the sync and async backends draw from one budget.
+    """
+
+    def __init__(self, enabled=False, percentile=95, min_delay=0.05, budget=0.1):
+        self.enabled    = enabled
+        self.percentile = percentile
+        self.min_delay  = min_delay
+        self.budget     = budget
+
+        self._lock      = threading.Lock()
+        self._latencies = deque(maxlen=256)  # recent successful POST latencies, for the hedge delay
+        self.stats      = {"hedgeable_posts": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_over_budget": 0,
+                           "hedge_delay_ms": None}
+
+    def record_latency(self, latency):
+        self._latencies.append(latency)
+
+    def delay(self):
+        """Seconds to wait before hedging a hedgeable request that starts now, None for no hedge."""
+        latencies = sorted(self._latencies)
+        delay = None
+        if len(latencies) >= 20:
+            index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+            delay = max(self.min_delay, latencies[index])
+        with self._lock:
+            self.stats["hedgeable_posts"] += 1
+            self.stats["hedge_delay_ms"] = round(1000 * delay, 1) if delay is not None else None
+        return delay
+
+    def take(self):
+        with self._lock:
+            if self.stats["hedges_fired"] + 1 > self.budget * self.stats["hedgeable_posts"]:
+                self.stats["hedges_over_budget"] += 1
+                return False
+            self.stats["hedges_fired"] += 1
+            return True
+
+    def record_won(self):
+        with self._lock:
+            self.stats["hedges_won"] += 1
+
+
+class RequestBatch:
+    """
+    Explicit batch collected by BatchingHTTPProvider.batch(). Requests added here are only
+    sent when the with-block exits, as one JSON-RPC batch array, so add() returns a future.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.entries = []
+
+    def add(self, method, params):
+        future = concurrent.futures.Future()
+        self.entries.append((method, params, future))
+        return future
+
+
+class BatchingHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider that coalesces read requests issued from many threads within batch_window
+    seconds (or until max_batch_size are pending) into one JSON-RPC batch POST, then hands each
+    caller back its own response by id. Everything else goes through the normal single request path.
+
+    Every POST goes to the fastest healthy endpoint of endpoint_uri + fallback_endpoints and fails
+    over to the next one on connection or HTTP errors (see EndpointPool).
+
+    With hedging on, a read-only POST still outstanding after the hedge_percentile of recent
+    latencies is duplicated to the next endpoint and the first response wins. Hedges are capped
+    at hedge_budget times the number of hedgeable POSTs (see HedgePolicy, self.hedge).
+    """
+
+    BATCHABLE_METHODS = {
+        "eth_call",
+        "eth_getBalance",
+        "eth_getCode",
+        "eth_getStorageAt",
+        "eth_getBlockByNumber",
+        "eth_getBlockByHash",
+        "eth_getTransactionReceipt",
+    }
+
+    def __init__(self, endpoint_uri, request_kwargs=None, batch_window=0.005, max_batch_size=50,
+                 sender_workers=4, enabled=True, max_in_flight=16, fallback_endpoints=(),
+                 breaker_failures=5, breaker_cooldown=30.0, hedging=False, hedge_percentile=95,
+                 hedge_min_delay=0.05, hedge_budget=0.1, hedge_workers=16, **kwargs):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs, **kwargs)
+        self.batch_window   = batch_window
+        self.max_batch_size = max_batch_size
+        self.enabled        = enabled
+
+        self._timeout   = (request_kwargs or {}).get("timeout", 30)
+        self._headers   = dict((request_kwargs or {}).get("headers", {}), **{"Content-Type": "application/json"})
+        self._session   = requests.Session()
+        self._condition = threading.Condition()
+        self._pending   = []
+        self._senders   = concurrent.futures.ThreadPoolExecutor(max_workers=sender_workers)
+        self._flusher   = None
+        # max_in_flight caps concurrent HTTP requests per endpoint, whichever thread issues them
+        self.endpoints  = EndpointPool([endpoint_uri, *[uri for uri in fallback_endpoints if uri != endpoint_uri]],
+                                       max_in_flight=max_in_flight,
+                                       failure_threshold=breaker_failures,
+                                       cooldown=breaker_cooldown)
+
+        self.hedge      = HedgePolicy(hedging and len(self.endpoints.endpoints) > 1,
+                                      hedge_percentile, hedge_min_delay, hedge_budget)
+        self._hedgers   = concurrent.futures.ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="rpc-hedge")
+
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0, "http_posts": 0,
+                      "max_in_flight": max_in_flight, "in_flight_wait_seconds": 0.0, "failovers": 0}
+
+    ############################################################################################################
+    ############################################ request path ##################################################
+    ############################################################################################################
+
+    def _acquire_in_flight(self, endpoint):
+        started = time.monotonic()
+        endpoint.in_flight.acquire()
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            with self._condition:
+                self.stats["in_flight_wait_seconds"] += waited
+
+    def _post(self, body, candidates=None):
+        errors = []
+        for endpoint in candidates or self.endpoints.candidates():
+            if errors:
+                with self._condition:
+                    self.stats["failovers"] += 1
+
+            self._acquire_in_flight(endpoint)
+            started = time.monotonic()
+            try:
+                response = self._session.post(endpoint.uri, data=body, headers=self._headers, timeout=self._timeout)
+                response.raise_for_status()
+            except Exception as e:
+                self.endpoints.record_failure(endpoint, time.monotonic() - started)
+                errors.append(f"{endpoint.label}: {e}")
+                continue
+            finally:
+                endpoint.in_flight.release()
+
+            # JSON-RPC level errors (reverts, bad params) come back in the body and still count as healthy
+            latency = time.monotonic() - started
+            self.endpoints.record_success(endpoint, latency)
+            self.hedge.record_latency(latency)
+            return response.content
+
+        raise ConnectionError(f"All RPC endpoints failed: {'; '.join(errors)}")
+
+    def _single_request(self, method, params):
+        body = self.encode_rpc_request(method, params)
+        if method in self.BATCHABLE_METHODS:
+            return self.decode_rpc_response(self._post_read(body))
+        return self.decode_rpc_response(self._post(body))
+
+    ############################################################################################################
+    ############################################ hedging #######################################################
+    ############################################################################################################
+
+    def _post_read(self, body):
+        """POST for read-only requests: hedged to a second endpoint when the first one is slow."""
+        if not self.hedge.enabled:
+            return self._post(body)
+
+        candidates = self.endpoints.candidates()
+        delay = self.hedge.delay()
+        if delay is None or len(candidates) < 2:
+            return self._post(body, candidates)
+
+        primary = self._hedgers.submit(self._post, body, candidates)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        if not self.hedge.take():
+            return primary.result()
+
+        # the hedge starts at the next endpoint in line and keeps the same failover order after it
+        hedge = self._hedgers.submit(self._post, body, candidates[1:] + candidates[:1])
+        for future in concurrent.futures.as_completed([primary, hedge]):
+            if future.exception() is None:
+                if future is hedge:
+                    self.hedge.record_won()
+                return future.result()
+        return primary.result()
+
+    def make_request(self, method, params):
+        if not self.enabled or method not in self.BATCHABLE_METHODS:
+            return self._single_request(method, params)
+
+        future = concurrent.futures.Future()
+        with self._condition:
+            self._ensure_flusher()
+            self._pending.append((method, params, future))
+            self._condition.notify()
+
+        return future.result(timeout=self._timeout + self.batch_window + 1)
+
+    @contextmanager
+    def batch(self):
+        request_batch = RequestBatch(self)
+        yield request_batch
+        for start in range(0, len(request_batch.entries), self.max_batch_size):
+            self._send_batch(request_batch.entries[start:start + self.max_batch_size])
+
+    ############################################################################################################
+    ############################################ window flushing ###############################################
+    ############################################################################################################
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name="rpc-batch-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                # hold the window open so concurrent callers can join the batch
+                deadline = time.monotonic() + self.batch_window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._pending[:self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size:]
+
+            self._senders.submit(self._send_batch, batch)
+
+    def _send_batch(self, entries):
+        if not entries:
+            return
+
+        with self._condition:
+            self.stats["requests"] += len(entries)
+            self.stats["batches"] += 1
+            self.stats["http_posts"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(entries))
+
+        try:
+            if len(entries) == 1:
+                method, params, future = entries[0]
+                future.set_result(self._single_request(method, params))
+                return
+
+            encoded = [self.encode_rpc_request(method, params) for method, params, _ in entries]
+            request_ids = [json.loads(body)["id"] for body in encoded]
+
+            body = b"[" + b",".join(encoded) + b"]"
+            if all(method in self.BATCHABLE_METHODS for method, _, _ in entries):
+                responses = self.decode_rpc_response(self._post_read(body))
+            else:
+                responses = self.decode_rpc_response(self._post(body))
+
+            if isinstance(responses, dict):
+                # node rejected the batch as a whole (e.g. batch size limit)
+                raise ValueError(responses.get("error", responses))
+
+            by_id = {item.get("id"): item for item in responses}
+            for request_id, (_, _, future) in zip(request_ids, entries):
+                if request_id in by_id:
+                    future.set_result(by_id[request_id])
+                else:
+                    future.set_exception(ValueError(f"No response for batched request id {request_id}"))
+        except Exception as e:
+            for _, _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
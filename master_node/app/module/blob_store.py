@@ -0,0 +1,359 @@
+import gzip
+import hashlib
+import io
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+import brotli
+
+from app.module.file_utils import FILE_MODE
+
+
+# a year, the longest max-age caches are expected to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,10})?$")
+
+# Content-Encoding -> suffix of the compressed copy written next to a blob
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+STORED_SUFFIXES = tuple(PRECOMPRESSED_SUFFIXES.values())
+
+
+def is_content_addressed(name):
+    """True for names a BlobStore hands out, whose content can never change."""
+    return bool(CONTENT_ADDRESSED_NAME.match(name))
+
+
+def clean_ext(ext):
+    # client supplied, keep it only if it is a plain extension
+    ext = (ext or "").lower()
+    return ext if re.match(r"^\.[a-z0-9]{1,10}$", ext) else ""
+
+
+class BlobWriter:
+    """
+    File-like writer that hashes what it is given into a temp file. Used as a context manager it
+    commits the blob when the block completes and drops the temp file when the block raises.
+    """
+
+    def __init__(self, store, ext):
+        self.store      = store
+        self.ext        = clean_ext(ext)
+        self.name       = None  # set by commit()
+        self.created    = None  # False when the content was already stored
+        self.size       = 0
+
+        self._hash = hashlib.sha256()
+        fd, self._temp_path = tempfile.mkstemp(dir=store.root, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.name = f"{self._hash.hexdigest()}{self.ext}"
+        self.created = self.store._adopt(self._temp_path, self.name, self.size)
+        return self.name
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.commit()
+        return False
+
+
+class BlobStore:
+    """
+    Directory of files named by the SHA-256 of their content plus an extension. Content is hashed
+    while it is written to a temp file, which is then renamed to its final name, or dropped when a
+    blob with that name already exists, so the same upload is stored once and its name and URL
+    never change meaning.
+
+    With compressed a blob is kept only as <name>.gz and <name>.br, compressed once at write time:
+    the .gz is what open() streams back decompressed, and both can be sent as they are to clients
+    that accept them. Plain files already in the directory stay readable until compress_existing()
+    has replaced them.
+    """
+
+    def __init__(self, root, compressed=False):
+        self.root           = root
+        self.compressed     = compressed
+        self._lock  = threading.Lock()
+        self._stats = {"writes": 0, "deduplicated": 0, "bytes_written": 0, "bytes_deduplicated": 0,
+                       "bytes_stored": 0, "bytes_precompressed": 0}
+        self._reads = {kind: {"count": 0, "bytes": 0, "seconds": 0.0} for kind in ("plain", "gzip")}
+        self._usage = (0.0, None)  # (monotonic time taken, usage)
+
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name)) or os.path.isfile(self.path(name) + ".gz")
+
+    def writer(self, ext=""):
+        return BlobWriter(self, ext)
+
+    def put_stream(self, stream, ext="", chunk_size=1024 * 1024):
+        """Store everything read from stream, returns (name, created)."""
+        with self.writer(ext) as blob:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                blob.write(chunk)
+        return blob.name, blob.created
+
+    def adopt_file(self, path, sha256, ext=""):
+        """
+        Store the file at path, whose SHA-256 the caller has already computed, by renaming it into
+        the store instead of copying and hashing it again; returns (name, created). path is gone
+        afterwards either way. A file on another filesystem than the store is copied.
+        """
+        if not re.match(r"^[0-9a-f]{64}$", sha256):
+            raise ValueError(f"Not a SHA-256 hex digest: {sha256}")
+        if os.stat(path).st_dev != os.stat(self.root).st_dev:
+            with open(path, "rb") as f:
+                name, created = self.put_stream(f, ext)
+            os.remove(path)
+            return name, created
+
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        name = f"{sha256}{clean_ext(ext)}"
+        return name, self._adopt(path, name, os.path.getsize(path))
+
+    def _adopt(self, temp_path, name, size):
+        final_path = self.path(name)
+        with self._lock:
+            created = not self.exists(name)
+            if created and not self.compressed:
+                os.chmod(temp_path, FILE_MODE)
+                os.replace(temp_path, final_path)
+                self._stats["bytes_stored"] += size
+            if created:
+                self._stats["writes"] += 1
+                self._stats["bytes_written"] += size
+            else:
+                os.remove(temp_path)
+                self._stats["deduplicated"] += 1
+                self._stats["bytes_deduplicated"] += size
+        if created and self.compressed:
+            try:
+                self._compress(temp_path, final_path)
+            finally:
+                os.remove(temp_path)
+        return created
+
+    def _compress(self, source_path, final_path, chunk_size=1024 * 1024):
+        # streamed chunk by chunk, a large blob is never held in memory; gzip without a timestamp so
+        # the same blob always compresses to the same bytes. The .gz goes last, it is what exists()
+        # and open() look for, so a blob is never visible before both copies are in place.
+        for suffix, open_compressed in ((".br", _BrotliWriter),
+                                        (".gz", lambda f: gzip.GzipFile(fileobj=f, mode="wb", compresslevel=9, mtime=0))):
+            fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    with open(source_path, "rb") as source, open_compressed(f) as compressed:
+                        for chunk in iter(lambda: source.read(chunk_size), b""):
+                            compressed.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    compressed_size = f.tell()
+                os.chmod(temp_path, FILE_MODE)
+                os.replace(temp_path, final_path + suffix)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            with self._lock:
+                self._stats["bytes_stored" if suffix == ".gz" else "bytes_precompressed"] += compressed_size
+
+    def compress_existing(self, progress=None):
+        """Replace the plain blobs left from before the store was compressed, returns how many there were."""
+        if not self.compressed:
+            return 0
+        names = [entry.name for entry in os.scandir(self.root)
+                 if entry.is_file() and is_content_addressed(entry.name) and not entry.name.endswith(STORED_SUFFIXES)]
+        for done, name in enumerate(names, start=1):
+            if not os.path.exists(self.path(name) + ".gz"):
+                self._compress(self.path(name), self.path(name))
+            os.remove(self.path(name))
+            if progress is not None:
+                progress(done / len(names), f"{done}/{len(names)} blobs")
+        return len(names)
+
+    ############################################################################################################
+    ############################################ reading #######################################################
+    ############################################################################################################
+
+    def open(self, name):
+        """Binary file-like with the content of name, decompressed as it is read."""
+        # .gz first: compress_existing() writes it before it removes the plain file
+        for suffix in (".gz", "", ".gz"):
+            try:
+                if suffix:
+                    return BlobReader(self, gzip.open(self.path(name) + suffix, "rb"), "gzip")
+                return BlobReader(self, open(self.path(name), "rb"), "plain")
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(self.path(name))
+
+    def size(self, name):
+        """Size of the content of name, without decompressing it."""
+        try:
+            return os.path.getsize(self.path(name))
+        except FileNotFoundError:
+            # gzip ends with the content length modulo 2^32, blobs here are far smaller
+            with open(self.path(name) + ".gz", "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                return struct.unpack("<I", f.read(4))[0]
+
+    def mtime(self, name):
+        try:
+            return os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return os.path.getmtime(self.path(name) + ".gz")
+
+    def precompressed(self, name, encoding):
+        """Path of the copy of name compressed with encoding ("br" or "gzip"), None if there is none."""
+        suffix = PRECOMPRESSED_SUFFIXES.get(encoding)
+        if suffix is None or not os.path.exists(self.path(name) + suffix):
+            return None
+        return self.path(name) + suffix
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    def _count_read(self, kind, size, seconds):
+        with self._lock:
+            self._reads[kind]["count"] += 1
+            self._reads[kind]["bytes"] += size
+            self._reads[kind]["seconds"] += seconds
+
+    def usage(self, max_age=60.0):
+        """
+        Content bytes of every blob against the bytes they take on disk, recounted at most every
+        max_age seconds.
+        """
+        taken, usage = self._usage
+        if usage is not None and time.monotonic() - taken < max_age:
+            return usage
+
+        usage = {"blobs": 0, "content_bytes": 0, "disk_bytes": 0, "precompressed_bytes": 0}
+        for entry in os.scandir(self.root):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            if entry.name.endswith(".br"):
+                usage["precompressed_bytes"] += entry.stat().st_size
+                continue
+            name = entry.name[:-3] if entry.name.endswith(".gz") else entry.name
+            if not is_content_addressed(name):
+                continue
+            if entry.name.endswith(".gz") and os.path.exists(self.path(name)):
+                continue  # a plain blob compress_existing() is halfway through
+            usage["blobs"] += 1
+            usage["disk_bytes"] += entry.stat().st_size
+            usage["content_bytes"] += self.size(name)
+        usage["ratio"] = round(usage["disk_bytes"] / usage["content_bytes"], 4) if usage["content_bytes"] else None
+        self._usage = (time.monotonic(), usage)
+        return usage
+
+    def stats(self):
+        with self._lock:
+            reads = {
+                kind: dict(value, mb_per_second=round(value["bytes"] / value["seconds"] / 1e6, 1) if value["seconds"] else None)
+                for kind, value in self._reads.items()
+            }
+            return dict(self._stats, compressed=self.compressed, reads=reads)
+
+
+class BlobReader(io.RawIOBase):
+    """
+    What BlobStore.open() returns. Times the reads for stats(), and has no usable fileno(): for a
+    compressed blob the file's size is not the content's, so nothing should stat it. Seekable in
+    content offsets, so a Range can be served from it; a gzip blob gets there by decompressing up to
+    the offset (backwards from the start), and cannot seek from the end.
+    """
+
+    def __init__(self, store, f, kind):
+        self._store     = store
+        self._file      = f
+        self._kind      = kind
+        self._bytes     = 0
+        self._seconds   = 0.0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._file.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        started = time.perf_counter()
+        position = self._file.seek(offset, whence)
+        self._seconds += time.perf_counter() - started
+        return position
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        # a whole-blob read() goes to the underlying file in one call, not in RawIOBase's 8 KB steps
+        started = time.perf_counter()
+        data = self._file.read(size)
+        self._seconds += time.perf_counter() - started
+        self._bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        size = self._file.readinto(buffer)
+        self._seconds += time.perf_counter() - started
+        self._bytes += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._store._count_read(self._kind, self._bytes, self._seconds)
+        super().close()
+
+
+class _BrotliWriter:
+    # file-like wrapper so brotli streams through the same loop as gzip.GzipFile; quality 9 rather
+    # than 11, which compresses text about a seventh smaller but some thirty times slower
+
+    def __init__(self, f):
+        self._file = f
+        self._compressor = brotli.Compressor(quality=9)
+
+    def write(self, data):
+        self._file.write(self._compressor.process(data))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self._file.write(self._compressor.finish())
+        return False
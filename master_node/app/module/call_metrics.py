@@ -0,0 +1,137 @@
+import contextvars
+import threading
+from bisect import bisect_left
+
+
+# upper bounds in milliseconds, the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+# totals of the HTTP request being served; the dict is shared with worker threads and the event loop
+# through copied contexts, so every update goes through CallMetrics._lock
+_request_totals = contextvars.ContextVar("call_metrics_request_totals", default=None)
+
+
+def _new_totals():
+    return {"round_trips": 0, "calls": 0, "seconds": 0.0, "bytes": 0, "failures": 0, "retries": 0}
+
+
+class CallMetrics:
+    """
+    Per contract function counters for the chain reads: calls, failures, bytes returned and a
+    latency histogram of the round trip each call went out in (one aggregate3 chunk carries many
+    calls, all of which see that chunk's latency). Retries are counted per blockchain_code function,
+    which is the level with_retry works at.
+
+    Between begin_request() and end_request() everything is also added to per-request totals, for
+    the Server-Timing header.
+    """
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._names     = {}    # lower-case contract address -> contract key, e.g. "collection"
+        self._functions = {}    # "contract.function" -> counters
+        self._retries   = {}    # decorated function name -> {"retries", "failures"}
+        self._totals    = _new_totals()  # since start, for measuring a stretch of work by difference
+        self._lock      = threading.Lock()
+
+    def name_contracts(self, contracts):
+        for name, contract in contracts.items():
+            self._names[contract.address.lower()] = name
+
+    def _function_key(self, call):
+        return f"{self._names.get(call.address.lower(), call.address)}.{call.fn_name}"
+
+    ############################################################################################################
+    ############################################ recording #####################################################
+    ############################################################################################################
+
+    def observe(self, calls, seconds, sizes):
+        """One round trip carrying the bound contract calls; sizes[i] is the bytes call i returned, None if it failed."""
+        bucket = bisect_left(self.buckets_ms, seconds * 1000)
+        totals = _request_totals.get()
+        with self._lock:
+            for call, size in zip(calls, sizes):
+                key = self._function_key(call)
+                entry = self._functions.get(key)
+                if entry is None:
+                    entry = self._functions[key] = {
+                        "calls": 0, "failures": 0, "bytes": 0, "seconds": 0.0, "histogram": [0] * len(self.buckets_ms),
+                    }
+                entry["calls"] += 1
+                entry["seconds"] += seconds
+                entry["histogram"][bucket] += 1
+                if size is None:
+                    entry["failures"] += 1
+                else:
+                    entry["bytes"] += size
+
+            for running in (self._totals, totals):
+                if running is None:
+                    continue
+                running["round_trips"] += 1
+                running["calls"] += len(calls)
+                running["seconds"] += seconds
+                running["bytes"] += sum(size for size in sizes if size is not None)
+                running["failures"] += sum(1 for size in sizes if size is None)
+
+    def record_retry(self, function_name, gave_up=False):
+        totals = _request_totals.get()
+        with self._lock:
+            entry = self._retries.setdefault(function_name, {"retries": 0, "failures": 0})
+            entry["failures" if gave_up else "retries"] += 1
+            if not gave_up:
+                self._totals["retries"] += 1
+                if totals is not None:
+                    totals["retries"] += 1
+
+    ############################################################################################################
+    ############################################ per request ###################################################
+    ############################################################################################################
+
+    def begin_request(self):
+        return _request_totals.set(_new_totals())
+
+    def request_totals(self):
+        totals = _request_totals.get()
+        if totals is None:
+            return None
+        with self._lock:
+            return dict(totals)
+
+    def end_request(self, token):
+        _request_totals.reset(token)
+
+    def totals(self):
+        """Totals since start across every request and background job."""
+        with self._lock:
+            return dict(self._totals)
+
+    @staticmethod
+    def server_timing(totals):
+        """Server-Timing header value for a request's totals, None when it made no chain reads.
+        dur sums the round trips, so it exceeds wall time when they overlap."""
+        if not totals or not totals["calls"]:
+            return None
+        desc = (f"{totals['calls']} contract calls in {totals['round_trips']} round trips, "
+                f"{totals['bytes']} bytes, {totals['retries']} retries, {totals['failures']} failed")
+        return f'chain;dur={1000 * totals["seconds"]:.1f};desc="{desc}"'
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    def stats(self):
+        labels = [f"le_{int(bound)}ms" if bound != float("inf") else "le_inf" for bound in self.buckets_ms]
+        with self._lock:
+            functions = {
+                key: {
+                    "calls": entry["calls"],
+                    "failures": entry["failures"],
+                    "bytes": entry["bytes"],
+                    "avg_ms": round(1000 * entry["seconds"] / entry["calls"], 2),
+                    "histogram": dict(zip(labels, entry["histogram"])),
+                }
+                for key, entry in sorted(self._functions.items())
+            }
+            return {"functions": functions, "retries": {key: dict(entry) for key, entry in sorted(self._retries.items())}}
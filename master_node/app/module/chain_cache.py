@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+class _Inflight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BlockAwareCache:
+    """
+    Memoizes chain reads by (function, arguments) together with the block number they were read at.
+    An entry is served while it is at most max_staleness_blocks behind the chain head, concurrent
+    misses for the same key wait on a single loader (single-flight), and entries that fall out of
+    the staleness window are dropped whenever a new block is seen.
+
+    With stale_while_revalidate_blocks > 0 an entry up to that many blocks further behind is still
+    returned straight away while one reload for its key runs through submit_refresh in the background.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, block_number_fn, max_staleness_blocks=2, block_poll_interval=1.0, max_entries=1024, enabled=True,
+                 stale_while_revalidate_blocks=0, submit_refresh=None):
+        self.block_number_fn        = block_number_fn
+        self.max_staleness_blocks   = max_staleness_blocks
+        self.block_poll_interval    = block_poll_interval
+        self.max_entries            = max_entries
+        self.enabled                = enabled
+        self.stale_while_revalidate_blocks = stale_while_revalidate_blocks if submit_refresh is not None else 0
+        self.submit_refresh         = submit_refresh  # runs a no-argument callable off the request path
+
+        self._lock          = threading.Lock()
+        self._block_lock    = threading.Lock()
+        self._entries       = OrderedDict()  # key -> (block_number, value)
+        self._inflight      = {}
+        self._block_number  = None
+        self._block_checked = 0.0
+
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale_hits": 0, "refreshes": 0, "refresh_errors": 0,
+                       "evictions": 0, "invalidations": 0, "block_errors": 0}
+
+    ############################################################################################################
+    ############################################ block tracking ################################################
+    ############################################################################################################
+
+    def current_block(self):
+        now = time.monotonic()
+        if self._block_number is not None and now - self._block_checked < self.block_poll_interval:
+            return self._block_number
+
+        with self._block_lock:
+            if self._block_number is not None and time.monotonic() - self._block_checked < self.block_poll_interval:
+                return self._block_number
+            try:
+                block_number = self.block_number_fn()
+            except Exception as e:
+                # keep serving against the last block we know of rather than hammering a failing node
+                print(f"Error getting block number for chain cache: {str(e)}")
+                self._stats["block_errors"] += 1
+                self._block_checked = time.monotonic()
+                return self._block_number
+
+            if self._block_number is None or block_number > self._block_number:
+                self._block_number = block_number
+                self._invalidate_older_than(block_number - self.max_staleness_blocks - self.stale_while_revalidate_blocks)
+            self._block_checked = time.monotonic()
+            return self._block_number
+
+    def _invalidate_older_than(self, min_block):
+        with self._lock:
+            stale_keys = [key for key, (block_number, _) in self._entries.items() if block_number < min_block]
+            for key in stale_keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale_keys)
+
+    ############################################################################################################
+    ############################################ lookups #######################################################
+    ############################################################################################################
+
+    def get_or_load(self, key, loader):
+        if not self.enabled:
+            return loader()
+
+        block_number = self.current_block()
+        if block_number is None:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and block_number - entry[0] <= self.max_staleness_blocks:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+
+            inflight = self._inflight.get(key)
+            if entry is not None and block_number - entry[0] <= self.max_staleness_blocks + self.stale_while_revalidate_blocks:
+                # stale but within the grace window: answer now, reload once in the background
+                self._entries.move_to_end(key)
+                self._stats["stale_hits"] += 1
+                if inflight is None:
+                    inflight = self._inflight[key] = _Inflight()
+                    self._stats["refreshes"] += 1
+                    self.submit_refresh(lambda: self._refresh(key, block_number, loader, inflight))
+                return entry[1]
+
+            if inflight is not None:
+                self._stats["coalesced"] += 1
+                is_leader = False
+            else:
+                inflight = self._inflight[key] = _Inflight()
+                self._stats["misses"] += 1
+                is_leader = True
+
+        if not is_leader:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value
+
+        return self._load(key, block_number, loader, inflight)
+
+    def _load(self, key, block_number, loader, inflight):
+        try:
+            inflight.value = loader()
+            # failed reads come back as None from with_retry and are never cached
+            if inflight.value is not None:
+                self._store(key, block_number, inflight.value)
+            return inflight.value
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.event.set()
+
+    def _refresh(self, key, block_number, loader, inflight):
+        try:
+            self._load(key, block_number, loader, inflight)
+        except Exception as e:
+            print(f"Error refreshing chain cache entry: {str(e)}")
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+
+    def _store(self, key, block_number, value):
+        with self._lock:
+            self._entries[key] = (block_number, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def cached(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__name__, args, tuple(sorted(kwargs.items())))
+            return self.get_or_load(key, lambda: func(*args, **kwargs))
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                block_number=self._block_number,
+                max_staleness_blocks=self.max_staleness_blocks,
+                stale_while_revalidate_blocks=self.stale_while_revalidate_blocks,
+                hit_ratio=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            )
@@ -0,0 +1,576 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id              INTEGER PRIMARY KEY CHECK (id = 1),
+    block_number    INTEGER NOT NULL,
+    block_hash      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    block_number    INTEGER PRIMARY KEY,
+    block_hash      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    block_number    INTEGER NOT NULL,
+    log_index       INTEGER NOT NULL,
+    block_hash      TEXT NOT NULL,
+    tx_hash         TEXT NOT NULL,
+    contract        TEXT NOT NULL,
+    event           TEXT NOT NULL,
+    entity          TEXT NOT NULL,
+    collection_id   INTEGER NOT NULL,
+    nft_id          INTEGER,
+    PRIMARY KEY (block_number, log_index)
+);
+
+CREATE TABLE IF NOT EXISTS collections (
+    collection_id   INTEGER PRIMARY KEY,
+    name            TEXT,
+    context_window  INTEGER,
+    base_model      TEXT,
+    image           TEXT,
+    description     TEXT,
+    creator         TEXT,
+    date_created    INTEGER,
+    owner           TEXT,
+    nft_count       INTEGER,
+    unique_holders  INTEGER,
+    block_number    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS collections_owner ON collections (owner);
+
+CREATE TABLE IF NOT EXISTS nfts (
+    collection_id       INTEGER NOT NULL,
+    nft_id              INTEGER NOT NULL,
+    level_of_ownership  INTEGER,
+    name                TEXT,
+    creator             TEXT,
+    creation_date       INTEGER,
+    owner               TEXT,
+    has_metadata        INTEGER NOT NULL,
+    image               TEXT,
+    base_model          TEXT,
+    data                TEXT,
+    rag                 TEXT,
+    fine_tune_data      TEXT,
+    description         TEXT,
+    block_number        INTEGER NOT NULL,
+    PRIMARY KEY (collection_id, nft_id)
+);
+CREATE INDEX IF NOT EXISTS nfts_owner ON nfts (owner);
+
+CREATE TABLE IF NOT EXISTS access (
+    collection_id   INTEGER NOT NULL,
+    nft_id          INTEGER NOT NULL,
+    user            TEXT NOT NULL,
+    access_level    INTEGER NOT NULL,
+    PRIMARY KEY (collection_id, nft_id, user)
+);
+CREATE INDEX IF NOT EXISTS access_user ON access (user);
+"""
+
+
+# which piece of state an event invalidates, the indexer re-reads that state instead of replaying deltas
+EVENT_ENTITIES = {
+    "CollectionCreated"     : "collection",
+    "CollectionTransferred" : "collection",
+    "CollectionUpdated"     : "collection",
+    "NFTCreated"            : "nft",
+    "NFTBurned"             : "nft",
+    "Transfer"              : "nft",
+    "MetadataCreated"       : "nft",
+    "MetadataUpdated"       : "nft",
+    "MetadataDeleted"       : "nft",
+    "ReplicaCreated"        : "nft",
+    "AccessGranted"         : "access",
+    "AccessLevelChanged"    : "access",
+    "AccessRevoked"         : "access",
+}
+
+
+def build_topic_map(contracts):
+    """(contract address, event topic) -> (contract key, web3 event) for every event in EVENT_ENTITIES."""
+    topics = {}
+    for contract_key in ("collection", "nft", "metadata", "access"):
+        contract = contracts[contract_key]
+        for item in contract.abi:
+            if item["type"] == "event" and item["name"] in EVENT_ENTITIES:
+                topic = Web3.to_hex(event_abi_to_log_topic(item))
+                topics[(contract.address.lower(), topic)] = (contract_key, getattr(contract.events, item["name"])())
+    return topics
+
+
+def decode_log(topics, log):
+    """The event row of a NeuraNFT contract log, None for logs that are not in the topic map."""
+    if not log["topics"]:
+        return None
+    key = (log["address"].lower(), Web3.to_hex(log["topics"][0]))
+    if key not in topics:
+        return None
+
+    contract_key, event = topics[key]
+    args = event.process_log(log)["args"]
+    entity = EVENT_ENTITIES[event.event_name]
+
+    collection_id = args["collectionId"]
+    nft_id = args.get("tokenId", args.get("nftId"))
+
+    return {
+        "block_number"  : log["blockNumber"],
+        "log_index"     : log["logIndex"],
+        "block_hash"    : Web3.to_hex(log["blockHash"]),
+        "tx_hash"       : Web3.to_hex(log["transactionHash"]),
+        "contract"      : contract_key,
+        "event"         : event.event_name,
+        "entity"        : entity,
+        "collection_id" : collection_id,
+        "nft_id"        : nft_id if entity != "collection" else None,
+    }
+
+
+class ChainIndexer:
+    """
+    Local SQLite index of collections, NFTs, metadata, owners and access grants.
+
+    Starting from a checkpoint it pulls the logs of the four NeuraNFT contracts in block ranges,
+    works out which collections / NFTs / access lists each event touched and re-reads exactly that
+    state (via Multicall) at the end of the range. Only blocks `confirmations` behind head are indexed
+    and the hash of every indexed range end is kept, so a reorg is detected on the next pass and the
+    index is rewound to the last block whose hash still matches before catching up again.
+
+    Everything chain-facing is injected (w3, contracts, multicall), so the same class runs against
+    eth-tester or a local dev node as well as Base.
+    """
+
+    def __init__(self, w3, contracts, multicall, db_path, default_metadata, start_block=None, confirmations=3,
+                 chunk_size=2000, poll_interval=2.0, max_lag_blocks=10, reorg_depth=128, worker_context=nullcontext):
+        self.w3                 = w3
+        self.contracts          = contracts
+        self.multicall          = multicall
+        self.db_path            = db_path
+        self.default_metadata   = default_metadata
+        self.start_block        = start_block
+        self.confirmations      = confirmations
+        self.chunk_size         = chunk_size
+        self.poll_interval      = poll_interval
+        self.max_lag_blocks     = max_lag_blocks
+        self.reorg_depth        = reorg_depth
+        self.worker_context     = worker_context  # entered around the background loop, e.g. to tag its RPC traffic
+
+        self.head_block     = None
+        self.last_error     = None
+        self.stats          = {"syncs": 0, "logs": 0, "entities_refreshed": 0, "reorgs": 0, "last_sync_seconds": 0.0}
+
+        self._local     = threading.local()
+        self._thread    = None
+        self._stop      = threading.Event()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._write_conn = self._connect()
+        self._write_conn.executescript(SCHEMA)
+        self._write_conn.commit()
+
+        self._topics = build_topic_map(contracts)
+
+    ############################################################################################################
+    ############################################ setup #########################################################
+    ############################################################################################################
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _read_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    ############################################################################################################
+    ############################################ background loop ###############################################
+    ############################################################################################################
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with self.worker_context():
+            self._run_loop()
+
+    def _run_loop(self):
+        while not self._stop.is_set():
+            try:
+                caught_up = self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                print(f"Error in chain indexer: {str(e)}")
+                self.last_error = str(e)
+                caught_up = True
+            if caught_up:
+                self._stop.wait(self.poll_interval)
+
+    def checkpoint(self):
+        row = self._read_conn().execute("SELECT block_number, block_hash FROM checkpoint WHERE id = 1").fetchone()
+        return (row["block_number"], row["block_hash"]) if row else None
+
+    def is_ready(self):
+        checkpoint = self.checkpoint()
+        if checkpoint is None or self.head_block is None:
+            return False
+        return self.head_block - checkpoint[0] <= self.max_lag_blocks + self.confirmations
+
+    def sync_once(self):
+        """Index at most one chunk of blocks. Returns True once the index has reached the confirmed head."""
+        started = time.monotonic()
+        self.head_block = self.w3.eth.block_number
+        target = self.head_block - self.confirmations
+
+        checkpoint = self.checkpoint()
+        if checkpoint is None:
+            if self.start_block is None:
+                self._bootstrap_snapshot(target)
+                self._record_sync(started)
+                return True
+            checkpoint = (self.start_block - 1, None)
+        elif self._detect_reorg(checkpoint):
+            self._rewind()
+            checkpoint = self.checkpoint()
+            if checkpoint is None:
+                return False
+
+        from_block = checkpoint[0] + 1
+        if from_block > target:
+            self._record_sync(started)
+            return True
+
+        to_block = min(target, from_block + self.chunk_size - 1)
+        self._index_range(from_block, to_block)
+        self._record_sync(started)
+        return to_block >= target
+
+    def _record_sync(self, started):
+        self.stats["syncs"] += 1
+        self.stats["last_sync_seconds"] = round(time.monotonic() - started, 4)
+
+    ############################################################################################################
+    ############################################ catch-up ######################################################
+    ############################################################################################################
+
+    def _block_hash(self, block_number):
+        return Web3.to_hex(self.w3.eth.get_block(block_number)["hash"])
+
+    def _index_range(self, from_block, to_block):
+        addresses = [self.contracts[key].address for key in ("collection", "nft", "metadata", "access")]
+        logs = self.w3.eth.get_logs({"fromBlock": from_block, "toBlock": to_block, "address": addresses})
+
+        events = []
+        for log in logs:
+            decoded = decode_log(self._topics, log)
+            if decoded is not None:
+                events.append(decoded)
+
+        to_hash = self._block_hash(to_block)
+        entities = {(event["entity"], event["collection_id"], event["nft_id"]) for event in events}
+        refreshed = self._read_entities(entities, to_block)
+
+        with self._write_conn as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO events VALUES "
+                "(:block_number, :log_index, :block_hash, :tx_hash, :contract, :event, :entity, :collection_id, :nft_id)",
+                events,
+            )
+            self._write_entities(conn, refreshed, to_block)
+            self._set_checkpoint(conn, to_block, to_hash)
+
+        self.stats["logs"] += len(events)
+
+    def _set_checkpoint(self, conn, block_number, block_hash):
+        conn.execute("INSERT OR REPLACE INTO checkpoint (id, block_number, block_hash) VALUES (1, ?, ?)",
+                     (block_number, block_hash))
+        conn.execute("INSERT OR REPLACE INTO blocks (block_number, block_hash) VALUES (?, ?)", (block_number, block_hash))
+        conn.execute(
+            "DELETE FROM blocks WHERE block_number NOT IN "
+            "(SELECT block_number FROM blocks ORDER BY block_number DESC LIMIT ?)",
+            (self.reorg_depth,),
+        )
+
+    ############################################################################################################
+    ############################################ reorgs ########################################################
+    ############################################################################################################
+
+    def _detect_reorg(self, checkpoint):
+        block_number, block_hash = checkpoint
+        return self._block_hash(block_number) != block_hash
+
+    def _rewind(self):
+        self.stats["reorgs"] += 1
+        stored_blocks = self._write_conn.execute(
+            "SELECT block_number, block_hash FROM blocks ORDER BY block_number DESC"
+        ).fetchall()
+
+        fork_block = None
+        for row in stored_blocks:
+            if self._block_hash(row["block_number"]) == row["block_hash"]:
+                fork_block = (row["block_number"], row["block_hash"])
+                break
+
+        if fork_block is None:
+            # deeper than anything we kept, start again from a fresh snapshot
+            print("Chain indexer: reorg deeper than stored history, rebuilding index")
+            with self._write_conn as conn:
+                for table in ("checkpoint", "blocks", "events", "collections", "nfts", "access"):
+                    conn.execute(f"DELETE FROM {table}")
+            return
+
+        print(f"Chain indexer: reorg detected, rewinding to block {fork_block[0]}")
+        touched = self._write_conn.execute(
+            "SELECT DISTINCT entity, collection_id, nft_id FROM events WHERE block_number > ?", (fork_block[0],)
+        ).fetchall()
+        entities = {(row["entity"], row["collection_id"], row["nft_id"]) for row in touched}
+        refreshed = self._read_entities(entities, fork_block[0])
+
+        with self._write_conn as conn:
+            conn.execute("DELETE FROM events WHERE block_number > ?", (fork_block[0],))
+            conn.execute("DELETE FROM blocks WHERE block_number > ?", (fork_block[0],))
+            self._write_entities(conn, refreshed, fork_block[0])
+            self._set_checkpoint(conn, fork_block[0], fork_block[1])
+
+    ############################################################################################################
+    ############################################ state reads ###################################################
+    ############################################################################################################
+
+    def _bootstrap_snapshot(self, block_number):
+        """First run without INDEXER_START_BLOCK: read the whole current state at one block instead of replaying history."""
+        print(f"Chain indexer: bootstrapping snapshot at block {block_number}")
+        total_collections = self.multicall.call(self.contracts["collection"].functions.getTotalCollections(),
+                                                 block_identifier=block_number)
+        collection_ids = list(range(1, total_collections + 1))
+
+        id_results = self.multicall.aggregate(
+            [self.contracts["nft"].functions.getCollectionNFTs(collection_id) for collection_id in collection_ids],
+            block_identifier=block_number,
+            require_success=True,
+        )
+
+        entities = {("collection", collection_id, None) for collection_id in collection_ids}
+        for collection_id, result in zip(collection_ids, id_results):
+            for nft_id in result.value:
+                entities.add(("nft", collection_id, nft_id))
+                entities.add(("access", collection_id, nft_id))
+
+        refreshed = self._read_entities(entities, block_number)
+        block_hash = self._block_hash(block_number)
+
+        with self._write_conn as conn:
+            self._write_entities(conn, refreshed, block_number)
+            self._set_checkpoint(conn, block_number, block_hash)
+
+    def _entity_calls(self, entity, collection_id, nft_id):
+        collection = self.contracts["collection"].functions
+        if entity == "collection":
+            return [
+                collection.getCollectionMetadata(collection_id),
+                collection.getCollectionNFTCount(collection_id),
+                collection.getCollectionOwner(collection_id),
+                collection.getCollectionUniqueHolders(collection_id),
+            ]
+        if entity == "nft":
+            return [
+                self.contracts["nft"].functions.getNFTInfo(collection_id, nft_id),
+                self.contracts["metadata"].functions.getMetadata(collection_id, nft_id),
+            ]
+        return [self.contracts["access"].functions.getAllUsersAccessForNFT(collection_id, nft_id)]
+
+    def _read_entities(self, entities, block_number):
+        # an NFT change also moves its collection's NFT count and holder count
+        entities = set(entities)
+        entities |= {("collection", collection_id, None) for entity, collection_id, _ in entities if entity == "nft"}
+        entities = sorted(entities, key=lambda item: (item[0], item[1], item[2] or 0))
+
+        calls, spans = [], []
+        for entity in entities:
+            entity_calls = self._entity_calls(*entity)
+            spans.append((entity, len(calls), len(entity_calls)))
+            calls.extend(entity_calls)
+
+        results = self.multicall.aggregate(calls, block_identifier=block_number) if calls else []
+        self.stats["entities_refreshed"] += len(entities)
+        return [(entity, results[start:start + count]) for entity, start, count in spans]
+
+    def _write_entities(self, conn, refreshed, block_number):
+        for (entity, collection_id, nft_id), results in refreshed:
+            if entity == "collection":
+                if not all(result.success for result in results):
+                    continue
+                metadata, nft_count, owner, unique_holders = [result.value for result in results]
+                conn.execute(
+                    "INSERT OR REPLACE INTO collections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (collection_id, metadata[0], metadata[1], metadata[2], metadata[3], metadata[4],
+                     metadata[5], metadata[6], owner, nft_count, unique_holders, block_number),
+                )
+            elif entity == "nft":
+                info_result, metadata_result = results
+                if not info_result.success or int(info_result.value[4], 16) == 0:
+                    # burned NFTs read back as an empty struct with a zero owner
+                    conn.execute("DELETE FROM nfts WHERE collection_id = ? AND nft_id = ?", (collection_id, nft_id))
+                    conn.execute("DELETE FROM access WHERE collection_id = ? AND nft_id = ?", (collection_id, nft_id))
+                    continue
+                info = info_result.value
+                metadata = metadata_result.value if metadata_result.success else [None] * 6
+                conn.execute(
+                    "INSERT OR REPLACE INTO nfts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (collection_id, nft_id, info[0], info[1], info[2], info[3], info[4],
+                     1 if metadata_result.success else 0, *metadata, block_number),
+                )
+            else:
+                access_result, = results
+                if not access_result.success:
+                    continue
+                conn.execute("DELETE FROM access WHERE collection_id = ? AND nft_id = ?", (collection_id, nft_id))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO access VALUES (?, ?, ?, ?)",
+                    [(collection_id, nft_id, user, level) for user, level in access_result.value],
+                )
+
+    ############################################################################################################
+    ############################################ queries #######################################################
+    ############################################################################################################
+
+    def _nft_row_to_dict(self, row):
+        metadata = (
+            [row["image"], row["base_model"], row["data"], row["rag"], row["fine_tune_data"], row["description"]]
+            if row["has_metadata"] else self.default_metadata
+        )
+        return {
+            "id": row["nft_id"],
+            "collectionId": row["collection_id"],
+            "levelOfOwnership": row["level_of_ownership"],
+            "name": row["name"],
+            "creator": row["creator"],
+            "creationDate": row["creation_date"],
+            "owner": row["owner"],
+            "image": metadata[0],
+            "baseModel": metadata[1],
+            "data": metadata[2],
+            "rag": metadata[3],
+            "fineTuneData": metadata[4],
+            "description": metadata[5]
+        }
+
+    # listing queries take an optional keyset (after = sort key of the last row already served) and limit
+
+    def collections(self, owner=None, after_id=None, limit=None):
+        conditions, params = [], []
+        if owner is not None:
+            conditions.append("owner = ?")
+            params.append(owner)
+        if after_id is not None:
+            conditions.append("collection_id > ?")
+            params.append(after_id)
+        query = "SELECT * FROM collections"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY collection_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._read_conn().execute(query, params).fetchall()
+        return [
+            {
+                "id": row["collection_id"],
+                "name": row["name"],
+                "contextWindow": row["context_window"],
+                "model": row["base_model"],
+                "image": row["image"],
+                "description": row["description"],
+                "creator": row["creator"],
+                "date": row["date_created"],
+                "owner": row["owner"],
+                "collectionaddress": f"#{row['collection_id']}",
+            }
+            for row in rows
+        ]
+
+    def collection_details(self, collection_id):
+        row = self._read_conn().execute("SELECT * FROM collections WHERE collection_id = ?", (collection_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": collection_id,
+            "name": row["name"],
+            "contextWindow": row["context_window"],
+            "baseModel": row["base_model"],
+            "image": row["image"],
+            "description": row["description"],
+            "creator": row["creator"],
+            "dateCreated": row["date_created"],
+            "owner": row["owner"],
+            "collectionaddress": f"#{collection_id}",
+            "noOfNFTs": row["nft_count"],
+            "uniqueHolders": row["unique_holders"],
+            "model": row["base_model"],
+            "noOfServers": 5
+        }
+
+    def nfts_of_collection(self, collection_id, after_id=None, limit=None):
+        rows = self._read_conn().execute(
+            "SELECT * FROM nfts WHERE collection_id = ? AND nft_id > ? ORDER BY nft_id LIMIT ?",
+            (collection_id, -1 if after_id is None else after_id, -1 if limit is None else limit),
+        ).fetchall()
+        return [self._nft_row_to_dict(row) for row in rows]
+
+    def nfts_for_user(self, user_address, after=None, limit=None):
+        after_collection, after_nft = after if after is not None else (-1, -1)
+        rows = self._read_conn().execute(
+            "SELECT nfts.*, access.access_level FROM access "
+            "JOIN nfts ON nfts.collection_id = access.collection_id AND nfts.nft_id = access.nft_id "
+            "WHERE access.user = ? AND (access.collection_id, access.nft_id) > (?, ?) "
+            "ORDER BY nfts.collection_id, nfts.nft_id LIMIT ?",
+            (user_address, after_collection, after_nft, -1 if limit is None else limit),
+        ).fetchall()
+        nfts = []
+        for row in rows:
+            nft = self._nft_row_to_dict(row)
+            nft["accessLevel"] = row["access_level"]
+            nfts.append(nft)
+        return nfts
+
+    def access_list(self, collection_id, nft_id):
+        rows = self._read_conn().execute(
+            "SELECT user, access_level FROM access WHERE collection_id = ? AND nft_id = ?", (collection_id, nft_id)
+        ).fetchall()
+        return [{"user": row["user"], "accessLevel": row["access_level"]} for row in rows]
+
+    def status(self):
+        checkpoint = self.checkpoint()
+        conn = self._read_conn()
+        return dict(
+            self.stats,
+            ready=self.is_ready(),
+            checkpoint_block=checkpoint[0] if checkpoint else None,
+            head_block=self.head_block,
+            last_error=self.last_error,
+            collections=conn.execute("SELECT COUNT(*) FROM collections").fetchone()[0],
+            nfts=conn.execute("SELECT COUNT(*) FROM nfts").fetchone()[0],
+            access_grants=conn.execute("SELECT COUNT(*) FROM access").fetchone()[0],
+        )
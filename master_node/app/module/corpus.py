@@ -0,0 +1,184 @@
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zipfile
+from xml.etree import ElementTree
+
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ExtractionError(ValueError):
+    """A file that could not be turned into text, reported for that file alone."""
+
+
+############################################################################################################
+############################################ extractors ####################################################
+############################################################################################################
+
+def extract_txt(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    # UTF-8 first (with or without a byte order mark), whatever else as Latin-1, which never fails
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def extract_docx(path):
+    # a .docx is a zip of XML: the body text is the w:t runs of word/document.xml, one line per w:p
+    try:
+        with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as f:
+            paragraphs = []
+            for _, element in ElementTree.iterparse(f):
+                if element.tag == WORD_NAMESPACE + "p":
+                    paragraphs.append("".join(node.text or "" for node in element.iter(WORD_NAMESPACE + "t")))
+                    element.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractionError(f"not a readable .docx: {str(e)}")
+    return "\n".join(paragraphs)
+
+
+def extract_doc(path):
+    # the old binary Word format has no parser in the standard library, antiword does it
+    if shutil.which("antiword") is None:
+        raise ExtractionError(".doc files need antiword installed on the server")
+    result = subprocess.run(["antiword", "-w", "0", path], capture_output=True, timeout=120)
+    if result.returncode != 0:
+        raise ExtractionError(f"not a readable .doc: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def chunk_text(text, chunk_chars=1000, overlap_chars=200):
+    """
+    Split text into passages of at most chunk_chars, each starting overlap_chars before the end of
+    the previous one. Cuts fall on a paragraph, sentence or word break where there is one in the last
+    fifth of a passage.
+    """
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            window = text[start + chunk_chars * 4 // 5:end]
+            for breaker in ("\n\n", ". ", "\n", " "):
+                cut = window.rfind(breaker)
+                if cut != -1:
+                    end = start + chunk_chars * 4 // 5 + cut + len(breaker)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+        # the overlap starts on a word
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+    return chunks
+
+
+############################################################################################################
+############################################ corpus ########################################################
+############################################################################################################
+
+
+class CorpusBuilder:
+    """
+    Turns a batch of documents into one corpus: each file is extracted by the extractor for its
+    type on a pool of max_workers threads (PDFs through the PDFExtractor, which spreads their pages
+    over its own processes), passed through normalizer, and written to the corpus in the order the
+    files were given, under a "# <filename>" heading, as soon as it and every file before it are done.
+
+    A file that fails is reported with its error and left out; the rest of the corpus still builds.
+    Each file's text is also cut into chunks of chunk_chars for embedding.
+    """
+
+    def __init__(self, pdf_extractor, normalizer=None, max_workers=4, chunk_chars=1000, chunk_overlap=200):
+        self.pdf_extractor  = pdf_extractor
+        self.normalizer     = normalizer
+        self.max_workers    = max_workers
+        self.chunk_chars    = chunk_chars
+        self.chunk_overlap  = chunk_overlap
+
+        self.extractors = {
+            "pdf"   : lambda path: self.pdf_extractor.extract_text(path, self.normalizer),
+            "txt"   : self._normalized(extract_txt),
+            "docx"  : self._normalized(extract_docx),
+            "doc"   : self._normalized(extract_doc),
+        }
+
+        self._executor  = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="corpus")
+        self._lock      = threading.Lock()
+        self._stats     = {"corpora": 0, "files": 0, "failed_files": 0, "bytes": 0, "chunks": 0,
+                           "seconds_by_type": {kind: 0.0 for kind in self.extractors}}
+
+    def _normalized(self, extract):
+        return lambda path: self.normalizer(extract(path)) if self.normalizer is not None else extract(path)
+
+    def file_type(self, filename):
+        ext = os.path.splitext(filename)[1].lower().lstrip(".")
+        return ext if ext in self.extractors else None
+
+    def _extract(self, path, file_type):
+        started = time.perf_counter()
+        text = self.extractors[file_type](path)
+        return text, time.perf_counter() - started
+
+    def build(self, files, out, progress=None):
+        """
+        files is a list of (path, filename); the corpus is written as UTF-8 to the binary file-like
+        out. Returns (summary, chunks): summary["files"] has the status, timing and size or error of
+        every file, chunks is a list of {"file", "text"}.
+        """
+        started = time.perf_counter()
+        futures = [self._executor.submit(self._extract, path, self.file_type(filename)) if self.file_type(filename) else None
+                   for path, filename in files]
+
+        report, chunks, written = [], [], 0
+        try:
+            for done, ((path, filename), future) in enumerate(zip(files, futures), start=1):
+                entry = {"filename": filename, "type": self.file_type(filename), "status": "failed"}
+                try:
+                    if future is None:
+                        raise ExtractionError("unsupported file type")
+                    text, seconds = future.result()
+                    entry["seconds"] = round(seconds, 4)
+                    if not text.strip():
+                        raise ExtractionError("no text found")
+                except Exception as e:
+                    entry["error"] = str(e)
+                else:
+                    data = f"# {filename}\n\n{text.strip()}\n\n".encode()
+                    out.write(data)
+                    written += len(data)
+                    file_chunks = chunk_text(text, self.chunk_chars, self.chunk_overlap)
+                    chunks.extend({"file": filename, "text": chunk} for chunk in file_chunks)
+                    entry.update(status="ok", bytes=len(data), chunks=len(file_chunks))
+                report.append(entry)
+                if progress is not None:
+                    progress(done / len(files), f"{done}/{len(files)} files")
+        finally:
+            # a failure writing the corpus leaves no extraction running for it
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+
+        with self._lock:
+            self._stats["corpora"] += 1
+            self._stats["files"] += len(report)
+            self._stats["failed_files"] += sum(1 for entry in report if entry["status"] != "ok")
+            self._stats["bytes"] += written
+            self._stats["chunks"] += len(chunks)
+            for entry in report:
+                if "seconds" in entry:
+                    self._stats["seconds_by_type"][entry["type"]] += entry["seconds"]
+        return {"files": report, "bytes": written, "seconds": round(time.perf_counter() - started, 4)}, chunks
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, seconds_by_type=dict(self._stats["seconds_by_type"]), max_workers=self.max_workers)
@@ -0,0 +1,132 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+
+
+class DataSourceResolver:
+    """
+    Loads the {"data": ...} document an NFT's data link points at.
+
+    Links into our own file storage (any of local_endpoints followed by /data/<file> or
+    /data/raw/<file>) are read straight from data_store, a BlobStore, instead of making an HTTP round trip back
+    to this backend. Anything else is fetched over HTTP through a small LRU cache, bounded by
+    max_entries and max_bytes, whose entries are revalidated with If-None-Match/If-Modified-Since;
+    responses marked immutable are reused without asking again, and responses without a validator
+    are not cached.
+
+    resolve() returns (document, info) where info says which path was taken ("local", "cache",
+    "revalidated" or "remote") and how long it took.
+    """
+
+    def __init__(self, local_endpoints, data_store, max_entries=64, max_bytes=64 * 1024 * 1024, timeout=30.0):
+        self.local_endpoints    = [self._origin(endpoint) for endpoint in local_endpoints if endpoint]
+        self.data_store         = data_store
+        self.max_entries        = max_entries
+        self.max_bytes          = max_bytes
+        self.timeout            = timeout
+
+        self._session   = requests.Session()
+        self._cache     = OrderedDict()  # url -> {"validators", "immutable", "document", "size"}
+        self._bytes     = 0
+        self._lock      = threading.Lock()
+        self._stats     = {source: {"count": 0, "seconds": 0.0} for source in ("local", "cache", "revalidated", "remote")}
+        self._stats["errors"] = 0
+
+    @staticmethod
+    def _origin(url):
+        parsed = urlparse(url)
+        return (parsed.scheme.lower(), parsed.netloc.lower())
+
+    def local_file(self, link):
+        """Name of the blob in data_store a link to our own storage refers to, None for other links."""
+        parsed = urlparse(link)
+        if (parsed.scheme.lower(), parsed.netloc.lower()) not in self.local_endpoints:
+            return None
+        for prefix in ("/data/raw/", "/data/"):
+            if parsed.path.startswith(prefix):
+                name = parsed.path[len(prefix):]
+                return name if name and "/" not in name and not name.startswith(".") else None
+        return None
+
+    ############################################################################################################
+    ############################################ resolving #####################################################
+    ############################################################################################################
+
+    def resolve(self, link):
+        started = time.perf_counter()
+        try:
+            name = self.local_file(link)
+            if name is not None:
+                document, source = self._read_local(name), "local"
+            else:
+                document, source = self._fetch(link)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats[source]["count"] += 1
+            self._stats[source]["seconds"] += seconds
+        return document, {"source": source, "seconds": round(seconds, 4)}
+
+    def _read_local(self, name):
+        # same answer /data/<file> would have given, minus the HTTP hop and the JSON round trip
+        if not self.data_store.exists(name):
+            return None
+        with io.TextIOWrapper(self.data_store.open(name), encoding="utf-8") as f:
+            return {"data": f.read()}
+
+    def _fetch(self, link):
+        with self._lock:
+            entry = self._cache.get(link)
+            if entry is not None:
+                self._cache.move_to_end(link)
+        if entry is not None and entry["immutable"]:
+            return entry["document"], "cache"
+
+        headers = {}
+        if entry is not None:
+            headers = {key: value for key, value in entry["validators"].items() if value}
+        response = self._session.get(link, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and entry is not None:
+            return entry["document"], "revalidated"
+
+        response.raise_for_status()
+        document = response.json()
+        validators = {"If-None-Match": response.headers.get("ETag"), "If-Modified-Since": response.headers.get("Last-Modified")}
+        if any(validators.values()):
+            self._store(link, {
+                "validators": validators,
+                "immutable": "immutable" in response.headers.get("Cache-Control", ""),
+                "document": document,
+                "size": len(response.content),
+            })
+        return document, "remote"
+
+    def _store(self, link, entry):
+        if entry["size"] > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(link, None)
+            if previous is not None:
+                self._bytes -= previous["size"]
+            self._cache[link] = entry
+            self._bytes += entry["size"]
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted["size"]
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                {source: dict(value) if isinstance(value, dict) else value for source, value in self._stats.items()},
+                cache_entries=len(self._cache),
+                cache_bytes=self._bytes,
+            )
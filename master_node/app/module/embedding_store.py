@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from app.module.file_utils import write_atomic
+
+
+def content_digest(text):
+    """SHA-256 of text as stored, the same digest a BlobStore names its .data file by."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Embedding artifacts keyed by the SHA-256 of the text they were made from and the model that made
+    them, written next to the .data files as <sha256>.<model>.emb.gz: gzipped JSON with the texts
+    that were embedded (the whole document, or its chunks) and one embedding per text.
+
+    build() is meant for upload time, so the first chat on an NFT only has to load() what was
+    already computed. embed(texts, model_name) does the embedding.
+    """
+
+    def __init__(self, root, model_name, embed):
+        self.root       = root
+        self.model_name = model_name
+        self.embed      = embed
+
+        self._lock  = threading.Lock()
+        self._stats = {"built": 0, "build_seconds": 0.0, "loaded": 0, "load_seconds": 0.0, "missing": 0}
+
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        model = re.sub(r"[^A-Za-z0-9]+", "-", self.model_name).strip("-")
+        return os.path.join(self.root, f"{digest}.{model}.emb.gz")
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def build(self, digest, texts):
+        """Embed texts for the content with this digest unless that was done before, returns {"status", "seconds"}."""
+        if self.exists(digest):
+            return {"status": "exists", "seconds": 0.0}
+
+        started = time.perf_counter()
+        embeddings = self.embed(texts, self.model_name)
+        artifact = {"digest": digest, "model": self.model_name, "texts": texts, "embeddings": embeddings}
+        # mtime=0: the same embeddings always give the same file
+        write_atomic(self.path(digest), gzip.compress(json.dumps(artifact).encode(), compresslevel=6, mtime=0))
+
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats["built"] += 1
+            self._stats["build_seconds"] += seconds
+        return {"status": "built", "seconds": round(seconds, 4)}
+
+    def load(self, digest):
+        """The artifact for the content with this digest, None when none has been built."""
+        started = time.perf_counter()
+        try:
+            with gzip.open(self.path(digest), "rb") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["missing"] += 1
+            return None
+
+        with self._lock:
+            self._stats["loaded"] += 1
+            self._stats["load_seconds"] += time.perf_counter() - started
+        return artifact
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, model=self.model_name)
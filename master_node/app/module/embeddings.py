@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 from llama_index.core import SimpleDirectoryReader, Document
 from llama_index.embeddings.langchain import LangchainEmbedding
@@ -13,9 +15,18 @@ from langchain.embeddings import HuggingFaceEmbeddings
 #     return embeddings
 
 
-def get_embeddings(text_data):
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+@functools.lru_cache(maxsize=4)
+def get_embed_model(model_name=EMBEDDING_MODEL):
+    # loading the model takes seconds, every caller after the first gets the loaded one
+    return LangchainEmbedding(HuggingFaceEmbeddings(model_name=model_name))
+
+
+def get_embeddings(text_data, model_name=EMBEDDING_MODEL):
     # documents = SimpleDirectoryReader(directory).load_data()
-    embed_model = LangchainEmbedding(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
+    embed_model = get_embed_model(model_name)
     # texts = [doc.text for doc in documents]
     embeddings = embed_model.get_text_embedding_batch(text_data)
     embeddings_array = np.array(embeddings)
@@ -0,0 +1,109 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def redact_uri(uri):
+    """Scheme, host and port of uri, without the credentials, path or query a provider puts its API key in."""
+    parts = urlsplit(uri)
+    port = f":{parts.port}" if parts.port else ""
+    return f"{parts.scheme}://{parts.hostname}{port}"
+
+
+class Endpoint:
+    def __init__(self, uri, max_in_flight):
+        self.uri = uri
+        self.label = redact_uri(uri)  # what stats and error messages show, provider URIs carry API keys
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+        self.latency = None       # EWMA of request latency in seconds, None until the first response
+        self.error_rate = 0.0     # EWMA of failures (1) vs successes (0)
+        self.consecutive_failures = 0
+        self.opened_at = None     # circuit breaker open since, None while closed
+        self.probing = False      # a half-open probe request is out
+
+        self.requests = 0
+        self.failures = 0
+        self.trips = 0
+
+    def score(self):
+        # unmeasured endpoints sort first so every endpoint gets sampled
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+
+class EndpointPool:
+    """
+    Health tracking and selection across several RPC endpoints.
+
+    Every request outcome updates the endpoint's latency and error-rate EWMAs. After failure_threshold
+    consecutive failures the endpoint's circuit breaker opens and it is skipped for cooldown seconds,
+    then one half-open probe request decides whether it closes again. candidates() orders the usable
+    endpoints fastest-healthy first; callers fail over down that list.
+    """
+
+    def __init__(self, uris, max_in_flight=16, failure_threshold=5, cooldown=30.0, ewma_alpha=0.2):
+        if not uris:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints          = [Endpoint(uri, max_in_flight) for uri in uris]
+        self.failure_threshold  = failure_threshold
+        self.cooldown           = cooldown
+        self.ewma_alpha         = ewma_alpha
+        self._lock              = threading.Lock()
+
+    def candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            closed, probes, open_ = [], [], []
+            for endpoint in self.endpoints:
+                if endpoint.opened_at is None:
+                    closed.append(endpoint)
+                elif now - endpoint.opened_at >= self.cooldown and not endpoint.probing:
+                    endpoint.probing = True
+                    probes.append(endpoint)
+                else:
+                    open_.append(endpoint)
+
+            closed.sort(key=Endpoint.score)
+            # every breaker open: trying the one that tripped longest ago beats failing outright
+            open_.sort(key=lambda endpoint: endpoint.opened_at)
+            return probes + closed + (open_ if not closed and not probes else [])
+
+    def record_success(self, endpoint, latency):
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.latency = latency if endpoint.latency is None else self._ewma(endpoint.latency, latency)
+            endpoint.error_rate = self._ewma(endpoint.error_rate, 0.0)
+            endpoint.consecutive_failures = 0
+            endpoint.opened_at = None
+            endpoint.probing = False
+
+    def record_failure(self, endpoint, latency):
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.latency = latency if endpoint.latency is None else self._ewma(endpoint.latency, latency)
+            endpoint.error_rate = self._ewma(endpoint.error_rate, 1.0)
+            endpoint.consecutive_failures += 1
+            if endpoint.probing or (endpoint.opened_at is None and endpoint.consecutive_failures >= self.failure_threshold):
+                if endpoint.opened_at is None:
+                    endpoint.trips += 1
+                endpoint.opened_at = time.monotonic()
+            endpoint.probing = False
+
+    def _ewma(self, current, sample):
+        return (1 - self.ewma_alpha) * current + self.ewma_alpha * sample
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "uri": endpoint.label,
+                    "state": "closed" if endpoint.opened_at is None else ("half_open" if endpoint.probing else "open"),
+                    "latency_ms": round(1000 * endpoint.latency, 1) if endpoint.latency is not None else None,
+                    "error_rate": round(endpoint.error_rate, 4),
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "trips": endpoint.trips,
+                }
+                for endpoint in self.endpoints
+            ]
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+
+def _process_umask():
+    # read from /proc where there is one: os.umask() can only be queried by setting it, and a file
+    # another thread creates in that moment would get the wrong mode
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+# what open() gives a new file, 0644 under the usual umask. mkstemp creates its files 0600, and a file
+# renamed into place from one keeps that, which the nginx workers (another user, reading the upload
+# folders through a bind mount) cannot open
+FILE_MODE = 0o666 & ~_process_umask()
+
+
+def write_atomic(path, body):
+    """Write to a temp file in the same directory and rename over path, readers never see a partial file."""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, FILE_MODE)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -33,6 +33,16 @@ def api_key_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def master_key_required(f):
+    # operator-only routes: the master key, not the per-user keys api_key_required also accepts
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key') or ''
+        if not secrets.compare_digest(api_key.encode(), MASTER_API_KEY.encode()):
+            return jsonify({'message': 'Invalid API key'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
 def generate_jwt_token(api_key):
     payload = {
         'api_key': api_key,
@@ -0,0 +1,133 @@
+import glob
+import io
+import os
+import re
+import threading
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.module.file_utils import write_atomic
+
+
+# longest side in pixels, an image already smaller than a variant is only re-encoded
+VARIANT_SIZES = {"thumb": 160, "card": 480, "full": 1600}
+
+# file extension -> (Pillow format, save options)
+VARIANT_FORMATS = {
+    "webp"  : ("WEBP", {"quality": 80, "method": 4}),
+    "jpg"   : ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+VARIANT_NAME = re.compile(r"^([0-9a-f]{64})_(thumb|card|full)\.(webp|jpg)$")
+
+
+def parse_variant_name(name):
+    """(source digest, size, format) for a variant file name, None for anything else."""
+    match = VARIANT_NAME.match(name)
+    return match.groups() if match else None
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _for_format(image, pillow_format):
+    # JPEG has no alpha channel: flatten onto white, WebP keeps it
+    if not _has_alpha(image):
+        return image.convert("RGB") if image.mode != "RGB" else image
+    image = image.convert("RGBA")
+    if pillow_format != "JPEG":
+        return image
+    flattened = Image.new("RGB", image.size, (255, 255, 255))
+    flattened.paste(image, mask=image.getchannel("A"))
+    return flattened
+
+
+class ImageVariants:
+    """
+    Resized, re-encoded copies of the content-addressed images in folder, written next to them as
+    <sha256>_<size>.<format> for every size in VARIANT_SIZES and format in VARIANT_FORMATS. Like the
+    originals the names never change meaning, so they are served as immutable.
+
+    build() decodes the original once and scales each size down from the next larger one.
+    """
+
+    def __init__(self, folder, sizes=VARIANT_SIZES, formats=VARIANT_FORMATS):
+        self.folder     = folder
+        self.sizes      = sizes
+        self.formats    = formats
+
+        self._lock  = threading.Lock()
+        self._stats = {"images": 0, "variants": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+    def can_process(self, source_name):
+        return os.path.splitext(source_name)[1].lower() in SOURCE_EXTENSIONS
+
+    def variant_names(self, source_name):
+        digest = os.path.splitext(source_name)[0]
+        return [f"{digest}_{size}.{ext}" for size in self.sizes for ext in self.formats]
+
+    def missing(self, source_name):
+        return [name for name in self.variant_names(source_name) if not os.path.exists(os.path.join(self.folder, name))]
+
+    def source_for(self, digest):
+        """Name of the original a variant was (or will be) made from, None when there is none."""
+        for path in glob.glob(os.path.join(self.folder, f"{digest}.*")):
+            if self.can_process(path):
+                return os.path.basename(path)
+        return None
+
+    ############################################################################################################
+    ############################################ building ######################################################
+    ############################################################################################################
+
+    def build(self, source_name, progress=None):
+        """Write every missing variant of source_name, returns {variant name: bytes}."""
+        started = time.perf_counter()
+        source_path = os.path.join(self.folder, source_name)
+        missing = set(self.missing(source_name))
+        if not missing:
+            return {}
+
+        largest = max(self.sizes.values())
+        written = {}
+        try:
+            image = Image.open(source_path)
+        except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+            raise ValueError(f"{source_name} is not an image that can be resized: {str(e)}")
+
+        with image:
+            # JPEG can decode straight at a reduced scale, enough for the largest variant
+            image.draft("RGB", (largest, largest))
+            current = ImageOps.exif_transpose(image)
+            current.load()
+
+            digest = os.path.splitext(source_name)[0]
+            for done, (size, pixels) in enumerate(sorted(self.sizes.items(), key=lambda item: -item[1]), start=1):
+                current = current.copy()
+                current.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+                for ext, (pillow_format, options) in self.formats.items():
+                    name = f"{digest}_{size}.{ext}"
+                    if name not in missing:
+                        continue
+                    buffer = io.BytesIO()
+                    _for_format(current, pillow_format).save(buffer, pillow_format, **options)
+                    write_atomic(os.path.join(self.folder, name), buffer.getvalue())
+                    written[name] = buffer.tell()
+                if progress is not None:
+                    progress(done / len(self.sizes), f"{size} done")
+
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["variants"] += len(written)
+            self._stats["bytes_in"] += os.path.getsize(source_path)
+            self._stats["bytes_out"] += sum(written.values())
+            self._stats["seconds"] += time.perf_counter() - started
+        return written
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, sizes=self.sizes, formats=list(self.formats))
@@ -0,0 +1,319 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq             INTEGER PRIMARY KEY AUTOINCREMENT,
+    id              TEXT NOT NULL UNIQUE,
+    kind            TEXT NOT NULL,
+    dedupe_key      TEXT,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    progress        REAL NOT NULL DEFAULT 0,
+    message         TEXT,
+    result          TEXT,
+    error           TEXT,
+    error_status    INTEGER,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    created_at      REAL NOT NULL,
+    started_at      REAL,
+    updated_at      REAL NOT NULL,
+    finished_at     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+"""
+
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobError(Exception):
+    """Raised by a handler for a failure the caller should see with a specific HTTP status, e.g. bad input."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class JobQueue:
+    """
+    Persistent job queue in SQLite worked off by a pool of threads in this process.
+
+    Handlers are registered per kind as handler(payload, progress) -> result, where payload and
+    result are JSON-serializable and progress(fraction, message=None) records how far along the job
+    is. submit() with a dedupe_key hands back the queued or running job with the same key instead
+    of adding a second one, and refuses new work with JobQueueFull once max_queued jobs are waiting.
+
+    Queued jobs survive a restart. start() queues the jobs a previous process left running again, up
+    to max_attempts starts, which assumes one process works off the database at a time: only the
+    server should call it. Finished jobs are kept for retention_seconds for status polling.
+    """
+
+    def __init__(self, db_path, workers=4, max_queued=100, max_attempts=3, retention_seconds=24 * 3600,
+                 poll_interval=1.0, worker_context=nullcontext):
+        self.db_path            = db_path
+        self.workers            = workers
+        self.max_queued         = max_queued
+        self.max_attempts       = max_attempts
+        self.retention_seconds  = retention_seconds
+        self.poll_interval      = poll_interval
+        self.worker_context     = worker_context
+
+        self.stats      = {"submitted": 0, "deduplicated": 0, "rejected": 0, "done": 0, "failed": 0, "requeued": 0}
+
+        self._handlers  = {}
+        self._local     = threading.local()
+        self._changed   = threading.Condition()  # notified when a job is submitted or finishes
+        self._threads   = []
+        self._stop      = threading.Event()
+        self._purged    = 0.0
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+        with self._changed:
+            self._changed.notify_all()
+
+    ############################################################################################################
+    ############################################ storage #######################################################
+    ############################################################################################################
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit, writes that read first take the lock up front with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _requeue_interrupted(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND attempts < ?",
+                (QUEUED, now, RUNNING, self.max_attempts),
+            ).rowcount
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE status = ?",
+                (FAILED, "interrupted too many times", now, now, RUNNING),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.stats["requeued"] += requeued
+
+    def _job_dict(self, row, conn):
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": round(row["progress"], 4),
+            "message": row["message"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == QUEUED:
+            job["queue_position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND seq < ?", (QUEUED, row["seq"])
+            ).fetchone()[0]
+        if row["status"] == DONE:
+            job["result"] = json.loads(row["result"])
+        if row["status"] == FAILED:
+            job["error"] = row["error"]
+            job["error_status"] = row["error_status"]
+        return job
+
+    def get(self, job_id):
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row, conn) if row else None
+
+    ############################################################################################################
+    ############################################ submitting ####################################################
+    ############################################################################################################
+
+    def submit(self, kind, payload, dedupe_key=None):
+        """Queue a job, returns (job, deduplicated)."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind}")
+
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY seq LIMIT 1",
+                    (dedupe_key, QUEUED, RUNNING),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    self.stats["deduplicated"] += 1
+                    return self._job_dict(row, conn), True
+
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                conn.execute("COMMIT")
+                self.stats["rejected"] += 1
+                raise JobQueueFull(f"{queued} jobs are already waiting")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, dedupe_key, json.dumps(payload), QUEUED, now, now),
+            )
+            conn.execute("COMMIT")
+        except JobQueueFull:
+            raise
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.stats["submitted"] += 1
+        with self._changed:
+            self._changed.notify_all()
+        return self.get(job_id), False
+
+    def wait(self, job_id, timeout):
+        """Block until the job is done or failed or timeout seconds have passed, returns its latest state."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED) or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    ############################################################################################################
+    ############################################ workers #######################################################
+    ############################################################################################################
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._requeue_interrupted(self._conn())
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _run(self):
+        with self.worker_context():
+            while not self._stop.is_set():
+                try:
+                    job = self._claim()
+                    if job is None:
+                        self._purge_finished()
+                        with self._changed:
+                            self._changed.wait(self.poll_interval)
+                        continue
+                    self._execute(job)
+                except Exception as e:
+                    print(f"Error in job worker: {str(e)}")
+                    self._stop.wait(self.poll_interval)
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # only kinds this process can run, a job of a kind registered later waits for its handler
+            kinds = list(self._handlers)
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND kind IN ({','.join('?' * len(kinds))}) ORDER BY seq LIMIT 1",
+                [QUEUED, *kinds],
+            ).fetchone() if kinds else None
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, updated_at = ? WHERE seq = ?",
+                    (RUNNING, now, now, row["seq"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _execute(self, row):
+        conn = self._conn()
+        last_write = [0.0]
+
+        def progress(fraction, message=None):
+            # a page-by-page caller would otherwise write on every page
+            now = time.monotonic()
+            if now - last_write[0] < 0.5 and fraction < 1:
+                return
+            last_write[0] = now
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), updated_at = ? WHERE seq = ?",
+                (max(0.0, min(1.0, fraction)), message, time.time(), row["seq"]),
+            )
+
+        try:
+            result = self._handlers[row["kind"]](json.loads(row["payload"]), progress)
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = 1, result = ?, updated_at = ?, finished_at = ? WHERE seq = ?",
+                (DONE, json.dumps(result), time.time(), time.time(), row["seq"]),
+            )
+            self.stats["done"] += 1
+        except Exception as e:
+            print(f"Job {row['id']} ({row['kind']}) failed: {str(e)}")
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, error_status = ?, updated_at = ?, finished_at = ? WHERE seq = ?",
+                (FAILED, str(e), getattr(e, "status", 500), time.time(), time.time(), row["seq"]),
+            )
+            self.stats["failed"] += 1
+
+        with self._changed:
+            self._changed.notify_all()
+
+    def _purge_finished(self):
+        if time.monotonic() - self._purged < 60:
+            return
+        self._purged = time.monotonic()
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - self.retention_seconds),
+        )
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    def status(self):
+        counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return dict(
+            self.stats,
+            workers=self.workers,
+            alive_workers=sum(1 for thread in self._threads if thread.is_alive()),
+            queued=counts.get(QUEUED, 0),
+            running=counts.get(RUNNING, 0),
+            max_queued=self.max_queued,
+        )
@@ -0,0 +1,211 @@
+import concurrent.futures
+import threading
+import time
+from collections import namedtuple
+
+from web3 import Web3
+
+
+# Multicall3 is deployed at the same address on Base, Base Sepolia and most EVM chains
+MULTICALL3_DEFAULT_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+# one entry per packed call, value holds the decoded output or the exception on failure
+CallResult = namedtuple("CallResult", ["success", "value"])
+
+
+class MulticallError(Exception):
+    pass
+
+
+############################################################################################################
+############################################ ABI helpers ###################################################
+############################################################################################################
+
+
+def _abi_type(param):
+    # eth_abi wants tuples spelled out as "(type1,type2)[]"
+    abi_type = param["type"]
+    if abi_type.startswith("tuple"):
+        components = ",".join(_abi_type(component) for component in param["components"])
+        return f"({components}){abi_type[len('tuple'):]}"
+    return abi_type
+
+
+def _normalize(param, value):
+    # mirror what contract.functions.x().call() hands back: checksummed addresses, lists for arrays
+    abi_type = param["type"]
+    if abi_type.endswith("]"):
+        inner = dict(param, type=abi_type[:abi_type.rindex("[")])
+        return [_normalize(inner, item) for item in value]
+    if abi_type == "tuple":
+        return tuple(_normalize(component, item) for component, item in zip(param["components"], value))
+    if abi_type == "address":
+        return Web3.to_checksum_address(value)
+    return value
+
+
+def decode_function_output(codec, function_abi, return_data):
+    outputs = function_abi["outputs"]
+    decoded = codec.decode([_abi_type(output) for output in outputs], bytes(return_data))
+    values = [_normalize(output, value) for output, value in zip(outputs, decoded)]
+    return values[0] if len(values) == 1 else values
+
+
+############################################################################################################
+############################################ Multicall3 ####################################################
+############################################################################################################
+
+
+class Multicall:
+    """
+    Packs bound contract calls (e.g. contracts['nft'].functions.getNFTInfo(1, 2)) into
+    Multicall3 aggregate3 eth_calls of at most batch_size calls each and decodes every
+    result on its own, so one reverting call does not fail the whole batch.
+    Every round trip is reported to metrics (a CallMetrics) when one is given.
+    """
+
+    def __init__(self, w3, address, abi, batch_size=50, max_workers=4, enabled=True, executor=None, metrics=None):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.enabled = enabled
+        # optional shared, long-lived executor the chunks run on instead of a pool per aggregate()
+        self.executor = executor
+        self.metrics = metrics
+
+    def _observe(self, calls, started, sizes):
+        if self.metrics is not None:
+            self.metrics.observe(calls, time.perf_counter() - started, sizes)
+
+    def call(self, contract_function, block_identifier=None, gas=None):
+        """Plain eth_call for one bound contract function, decoded like contract_function.call()."""
+        transaction = {"to": contract_function.address, "data": contract_function._encode_transaction_data()}
+        if gas is not None:
+            transaction["gas"] = gas
+        started = time.perf_counter()
+        try:
+            return_data = self.w3.eth.call(transaction, block_identifier or "latest")
+        except Exception:
+            self._observe([contract_function], started, [None])
+            raise
+        self._observe([contract_function], started, [len(return_data)])
+        return decode_function_output(self.w3.codec, contract_function.abi, return_data)
+
+    def _call_individually(self, calls, block_identifier):
+        results = []
+
+        # a batching provider can still put all the calls on the wire as one JSON-RPC batch
+        provider_batch = getattr(self.w3.provider, "batch", None)
+        if provider_batch is not None:
+            block = block_identifier or "latest"
+            started = time.perf_counter()
+            with provider_batch() as request_batch:
+                futures = [
+                    request_batch.add("eth_call", [
+                        {"to": call.address, "data": call._encode_transaction_data()},
+                        block if isinstance(block, str) else hex(block),
+                    ])
+                    for call in calls
+                ]
+            sizes = []
+            for call, future in zip(calls, futures):
+                try:
+                    response = future.result()
+                    if "error" in response:
+                        raise ValueError(response["error"])
+                    return_data = bytes.fromhex(response["result"][2:])
+                    results.append(CallResult(True, decode_function_output(self.w3.codec, call.abi, return_data)))
+                    sizes.append(len(return_data))
+                except Exception as e:
+                    results.append(CallResult(False, e))
+                    sizes.append(None)
+            self._observe(calls, started, sizes)
+            return results
+
+        for call in calls:
+            try:
+                results.append(CallResult(True, self.call(call, block_identifier)))
+            except Exception as e:
+                results.append(CallResult(False, e))
+        return results
+
+    def _aggregate_chunk(self, calls, block_identifier):
+        if not self.enabled:
+            return self._call_individually(calls, block_identifier)
+
+        packed = [(call.address, True, call._encode_transaction_data()) for call in calls]
+        started = time.perf_counter()
+        try:
+            raw_results = self.contract.functions.aggregate3(packed).call(block_identifier=block_identifier)
+        except Exception:
+            self._observe(calls, started, [None] * len(calls))
+            raise
+
+        results, sizes = [], []
+        for call, (success, return_data) in zip(calls, raw_results):
+            sizes.append(len(return_data) if success else None)
+            if not success:
+                results.append(CallResult(False, MulticallError(f"{call.fn_name} reverted")))
+                continue
+            try:
+                results.append(CallResult(True, decode_function_output(self.w3.codec, call.abi, return_data)))
+            except Exception as e:
+                results.append(CallResult(False, e))
+        self._observe(calls, started, sizes)
+        return results
+
+    def _chunks(self, calls, batch_size):
+        batch_size = batch_size or self.batch_size
+        return [calls[i:i + batch_size] for i in range(0, len(calls), batch_size)]
+
+    def _on_executor_thread(self):
+        # chunks submitted from one of the executor's own workers would wait on that same pool
+        prefix = getattr(self.executor, "thread_name_prefix", None) or getattr(self.executor, "_thread_name_prefix", "")
+        return bool(prefix) and threading.current_thread().name.startswith(prefix)
+
+    def submit(self, calls, batch_size=None, block_identifier=None):
+        """
+        Schedule the chunks on the shared executor without waiting for them, one future per chunk.
+        From one of the executor's own workers the chunks run right here instead and the futures come
+        back already done, as in aggregate().
+        """
+        chunks = self._chunks(list(calls), batch_size)
+        if not self._on_executor_thread():
+            return [self.executor.submit(self._aggregate_chunk, chunk, block_identifier) for chunk in chunks]
+
+        futures = []
+        for chunk in chunks:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(self._aggregate_chunk(chunk, block_identifier))
+            except Exception as e:
+                future.set_exception(e)
+            futures.append(future)
+        return futures
+
+    @staticmethod
+    def gather(futures):
+        return [result for future in futures for result in future.result()]
+
+    def aggregate(self, calls, batch_size=None, block_identifier=None, require_success=False):
+        calls = list(calls)
+        chunks = self._chunks(calls, batch_size)
+
+        if len(chunks) <= 1 or (self.executor is not None and self._on_executor_thread()):
+            chunk_results = [self._aggregate_chunk(chunk, block_identifier) for chunk in chunks]
+        elif self.executor is not None:
+            chunk_results = [future.result() for future in self.submit(calls, batch_size, block_identifier)]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                chunk_results = list(executor.map(lambda chunk: self._aggregate_chunk(chunk, block_identifier), chunks))
+
+        results = [result for chunk in chunk_results for result in chunk]
+
+        if require_success:
+            for call, result in zip(calls, results):
+                if not result.success:
+                    raise MulticallError(f"{call.fn_name} failed: {result.value}")
+
+        return results
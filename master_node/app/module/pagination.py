@@ -0,0 +1,45 @@
+import base64
+import json
+from bisect import bisect_right
+
+
+MAX_PAGE_SIZE = 100
+
+
+# Cursors are opaque to clients: the sort key of the last item on the previous page, as url-safe base64 JSON.
+
+def encode_cursor(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # composite keys, e.g. (collection_id, nft_id), come back from JSON as lists
+    return tuple(key) if isinstance(key, list) else key
+
+
+def page_after(keys, after, limit):
+    """Slice sorted keys to the limit keys following after. Returns (page_keys, next_after or None)."""
+    start = bisect_right(keys, after) if after is not None else 0
+    page = keys[start:start + limit]
+    return page, (page[-1] if page and start + limit < len(keys) else None)
+
+
+def page_rows(rows, limit, key):
+    """Page from rows fetched with limit + 1 (e.g. LIMIT in SQL). Returns (rows, next_after or None)."""
+    if len(rows) > limit:
+        return rows[:limit], key(rows[limit - 1])
+    return rows, None
+
+
+def project(item, fields):
+    if item is None or fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
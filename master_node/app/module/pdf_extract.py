@@ -0,0 +1,192 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+import PyPDF2
+
+from pdf_worker import extract_range
+
+
+class PDFLimitError(ValueError):
+    """The document is over one of the extractor's page, file size or text size limits."""
+
+
+############################################################################################################
+############################################ extractor #####################################################
+############################################################################################################
+
+
+def _normalized(pages, normalizer):
+    return pages if normalizer is None else [normalizer(text) for text in pages]
+
+
+class PDFExtractor:
+    """
+    Extracts the text of a PDF across a pool of worker processes, pages_per_task pages per task,
+    and streams it page by page, in page order, into a destination file. At most two tasks per
+    worker are in flight, so a long document never sits in memory as a whole. Documents of up to
+    pages_per_task pages are extracted in the calling thread.
+
+    max_pages and max_file_bytes are checked before any text is extracted, max_text_bytes while
+    writing; going over any of them raises PDFLimitError.
+
+    The pool spawns its workers rather than forking them, the pool is started from a job worker
+    thread and forking a process with threads running is not safe. What the workers run lives in
+    pdf_worker, outside the app package, so a spawned worker imports PyPDF2 and nothing else.
+    The normalizer runs here in the parent, on each page as it comes back.
+    """
+
+    def __init__(self, max_workers=None, pages_per_task=8, max_pages=2000, max_file_bytes=100 * 1024 * 1024,
+                 max_text_bytes=50 * 1024 * 1024):
+        self.max_workers    = max_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.max_pages      = max_pages
+        self.max_file_bytes = max_file_bytes
+        self.max_text_bytes = max_text_bytes
+
+        self._pool      = None
+        self._pool_lock = threading.Lock()
+        self._lock      = threading.Lock()
+        self._stats     = {"documents": 0, "pages": 0, "bytes": 0, "seconds": 0.0, "parallel_documents": 0,
+                           "rejected": 0, "errors": 0}
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    ############################################################################################################
+    ############################################ extraction ####################################################
+    ############################################################################################################
+
+    def _page_count(self, path):
+        file_bytes = os.path.getsize(path)
+        if self.max_file_bytes and file_bytes > self.max_file_bytes:
+            raise PDFLimitError(f"PDF is {file_bytes} bytes, the limit is {self.max_file_bytes}")
+
+        page_count = len(PyPDF2.PdfReader(path).pages)
+        if self.max_pages and page_count > self.max_pages:
+            raise PDFLimitError(f"PDF has {page_count} pages, the limit is {self.max_pages}")
+        return page_count
+
+    def _page_texts(self, path, page_count, normalizer):
+        """Yields the text of every page in order, extracting ranges ahead of the consumer in the pool."""
+        ranges = [(start, min(start + self.pages_per_task, page_count))
+                  for start in range(0, page_count, self.pages_per_task)]
+
+        if len(ranges) <= 1:
+            for start, end in ranges:
+                yield from _normalized(extract_range(path, start, end), normalizer)
+            return
+
+        executor = self._executor()
+        pending = deque()
+        try:
+            for start, end in ranges:
+                pending.append(executor.submit(extract_range, path, start, end))
+                if len(pending) >= 2 * self.max_workers:
+                    yield from _normalized(pending.popleft().result(), normalizer)
+            while pending:
+                yield from _normalized(pending.popleft().result(), normalizer)
+        finally:
+            # the consumer stopped early (limit hit, error): drop what has not started yet
+            for future in pending:
+                future.cancel()
+
+    def extract_to(self, path, f, normalizer=None, progress=None):
+        """
+        Write the UTF-8 text of the PDF at path to the binary file-like f, page by page, each page
+        passed through normalizer (e.g. a TextNormalizer) when one is given.
+        Returns {"pages", "bytes", "seconds", "pages_per_second"}. progress(pages_written, page_count)
+        is called after every page.
+        """
+        started = time.perf_counter()
+        written, pages_written = 0, 0
+        try:
+            page_count = self._page_count(path)
+            with closing(self._page_texts(path, page_count, normalizer)) as page_texts:
+                for text in page_texts:
+                    data = text.encode()
+                    written += len(data)
+                    if self.max_text_bytes and written > self.max_text_bytes:
+                        raise PDFLimitError(f"PDF text is over the {self.max_text_bytes} byte limit")
+                    f.write(data)
+                    pages_written += 1
+                    if progress is not None:
+                        progress(pages_written, page_count)
+        except BaseException as e:
+            self._count("rejected" if isinstance(e, PDFLimitError) else "errors")
+            raise
+
+        return self._finish(page_count, written, started)
+
+    def extract_text(self, path, normalizer=None):
+        """Text of the PDF at path as one string, under the same limits as extract_to."""
+        started = time.perf_counter()
+        try:
+            page_count = self._page_count(path)
+            pages, written = [], 0
+            with closing(self._page_texts(path, page_count, normalizer)) as page_texts:
+                for text in page_texts:
+                    written += len(text.encode())
+                    if self.max_text_bytes and written > self.max_text_bytes:
+                        raise PDFLimitError(f"PDF text is over the {self.max_text_bytes} byte limit")
+                    pages.append(text)
+        except BaseException as e:
+            self._count("rejected" if isinstance(e, PDFLimitError) else "errors")
+            raise
+
+        self._finish(page_count, written, started)
+        return "".join(pages)
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _finish(self, page_count, written, started):
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats["documents"] += 1
+            self._stats["pages"] += page_count
+            self._stats["bytes"] += written
+            self._stats["seconds"] += seconds
+            if page_count > self.pages_per_task:
+                self._stats["parallel_documents"] += 1
+        return {
+            "pages": page_count,
+            "bytes": written,
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(page_count / seconds, 1) if seconds > 0 else None,
+        }
+
+    @staticmethod
+    def server_timing(result):
+        """Server-Timing header value for one extract_to() result."""
+        return (f'pdf;dur={1000 * result["seconds"]:.1f};'
+                f'desc="{result["pages"]} pages, {result["pages_per_second"]} pages/s, {result["bytes"]} bytes"')
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                max_workers=self.max_workers,
+                pages_per_task=self.pages_per_task,
+                pages_per_second=round(self._stats["pages"] / self._stats["seconds"], 1) if self._stats["seconds"] else None,
+            )
@@ -0,0 +1,207 @@
+import sys
+import threading
+import time
+
+
+class ReverseIndex:
+    """
+    In-memory reverse indexes for address-scoped lookups on the direct chain read path:
+    owner -> collection ids and user -> {(collection_id, nft_id): access level}, together with the
+    collection and NFT records they point at.
+
+    The chain reads feed it as they happen (full collection listings, NFT batches, per-user and
+    per-NFT access lists) and each update only touches the keys that changed. Every record and every
+    complete mapping carries the block it was read at; lookups take a min_block and report a miss
+    (None) instead of answering from data older than that.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+        self._collections       = {}    # collection_id -> collection record
+        self._owner_collections = {}    # owner -> {collection_id}
+        self._owners_block      = None  # block of the last full collection listing
+
+        self._nfts              = {}    # (collection_id, nft_id) -> (block, nft record)
+        self._user_access       = {}    # user -> {(collection_id, nft_id): access level}
+        self._user_blocks       = {}    # user -> block their access list was last read in full
+        self._nft_access        = {}    # (collection_id, nft_id) -> {user: access level}
+
+        self._stats = {"hits": 0, "misses": 0, "refreshes": 0, "keys_changed": 0, "refresh_seconds": 0.0}
+
+    ############################################################################################################
+    ############################################ refresh #######################################################
+    ############################################################################################################
+
+    def _record_refresh(self, started, keys_changed):
+        self._stats["refreshes"] += 1
+        self._stats["keys_changed"] += keys_changed
+        self._stats["refresh_seconds"] += time.perf_counter() - started
+
+    def replace_collections(self, collections, block_number):
+        """Full listing of every collection (getAllCollections format), moves only owners that changed."""
+        started = time.perf_counter()
+        with self._lock:
+            changed = 0
+            listed = {collection["id"]: collection for collection in collections}
+
+            for collection_id in set(self._collections) - set(listed):
+                self._move_owner(collection_id, self._collections.pop(collection_id)["owner"], None)
+                changed += 1
+
+            for collection_id, collection in listed.items():
+                previous = self._collections.get(collection_id)
+                if previous is None or previous["owner"] != collection["owner"]:
+                    self._move_owner(collection_id, previous["owner"] if previous else None, collection["owner"])
+                    changed += 1
+                self._collections[collection_id] = collection
+
+            self._owners_block = block_number
+            self._record_refresh(started, changed)
+
+    def _move_owner(self, collection_id, old_owner, new_owner):
+        if old_owner is not None:
+            owned = self._owner_collections.get(old_owner)
+            if owned is not None:
+                owned.discard(collection_id)
+                if not owned:
+                    del self._owner_collections[old_owner]
+        if new_owner is not None:
+            self._owner_collections.setdefault(new_owner, set()).add(collection_id)
+
+    def update_nfts(self, nfts, block_number):
+        started = time.perf_counter()
+        with self._lock:
+            for nft in nfts:
+                record = {key: value for key, value in nft.items() if key != "accessLevel"}
+                self._nfts[(nft["collectionId"], nft["id"])] = (block_number, record)
+            self._record_refresh(started, len(nfts))
+
+    def set_user_access(self, user, entries, block_number):
+        """Complete access list of one user, as (collection_id, nft_id, access_level) entries."""
+        started = time.perf_counter()
+        with self._lock:
+            current = {(collection_id, nft_id): level for collection_id, nft_id, level in entries}
+            previous = self._user_access.get(user, {})
+
+            changed = 0
+            for key in previous.keys() - current.keys():
+                users = self._nft_access.get(key)
+                if users is not None:
+                    users.pop(user, None)
+                    if not users:
+                        del self._nft_access[key]
+                changed += 1
+            for key, level in current.items():
+                if previous.get(key) != level:
+                    self._nft_access.setdefault(key, {})[user] = level
+                    changed += 1
+
+            if current:
+                self._user_access[user] = current
+            else:
+                self._user_access.pop(user, None)
+            self._user_blocks[user] = block_number
+            self._record_refresh(started, changed)
+
+    def set_nft_access(self, collection_id, nft_id, access_levels, block_number):
+        """Complete access list of one NFT ([{"user", "accessLevel"}]), patched into every affected user's entries.
+        Does not make those users' lists complete, only keeps lists that already are in step."""
+        started = time.perf_counter()
+        key = (collection_id, nft_id)
+        with self._lock:
+            current = {access["user"]: access["accessLevel"] for access in access_levels}
+            previous = self._nft_access.get(key, {})
+
+            changed = 0
+            for user in previous.keys() - current.keys():
+                user_entries = self._user_access.get(user)
+                if user_entries is not None:
+                    user_entries.pop(key, None)
+                changed += 1
+            for user, level in current.items():
+                if previous.get(user) != level:
+                    self._user_access.setdefault(user, {})[key] = level
+                    changed += 1
+
+            if current:
+                self._nft_access[key] = current
+            else:
+                self._nft_access.pop(key, None)
+            self._record_refresh(started, changed)
+
+    ############################################################################################################
+    ############################################ lookups #######################################################
+    ############################################################################################################
+
+    def _count(self, hit):
+        self._stats["hits" if hit else "misses"] += 1
+
+    def collections_of(self, owner, min_block=None):
+        with self._lock:
+            if self._owners_block is None or (min_block is not None and self._owners_block < min_block):
+                self._count(False)
+                return None
+            self._count(True)
+            return [self._collections[collection_id] for collection_id in sorted(self._owner_collections.get(owner, ()))]
+
+    def access_of(self, user, min_block=None):
+        with self._lock:
+            block_number = self._user_blocks.get(user)
+            if block_number is None or (min_block is not None and block_number < min_block):
+                self._count(False)
+                return None
+            self._count(True)
+            return [(collection_id, nft_id, level) for (collection_id, nft_id), level in sorted(self._user_access.get(user, {}).items())]
+
+    def nfts(self, keys, min_block=None):
+        """Returns ({key: nft record} for keys known at or after min_block, [keys still to read])."""
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._nfts.get(key)
+                if entry is not None and (min_block is None or entry[0] >= min_block):
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(missing)
+        return found, missing
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    @staticmethod
+    def _sizeof(container):
+        # containers plus their direct keys / values / record fields, shared strings are counted once per holder
+        size = sys.getsizeof(container)
+        for key, value in container.items():
+            size += sys.getsizeof(key)
+            if isinstance(value, tuple):
+                value = value[1]
+            if isinstance(value, dict):
+                size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value.values())
+            elif isinstance(value, set):
+                size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+            else:
+                size += sys.getsizeof(value)
+        return size
+
+    def stats(self):
+        with self._lock:
+            approx_bytes = sum(self._sizeof(container) for container in (
+                self._collections, self._owner_collections, self._nfts, self._user_access, self._user_blocks, self._nft_access,
+            ))
+            return dict(
+                self._stats,
+                refresh_seconds=round(self._stats["refresh_seconds"], 4),
+                avg_refresh_ms=round(1000 * self._stats["refresh_seconds"] / self._stats["refreshes"], 4) if self._stats["refreshes"] else 0.0,
+                collections=len(self._collections),
+                owners=len(self._owner_collections),
+                nfts=len(self._nfts),
+                users=len(self._user_access),
+                access_grants=sum(len(entries) for entries in self._nft_access.values()),
+                owners_block=self._owners_block,
+                approx_bytes=approx_bytes,
+            )
@@ -0,0 +1,160 @@
+import concurrent.futures
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ContextDecorator
+
+
+current_request_type = contextvars.ContextVar("rpc_request_type", default="default")
+
+
+class request_type(ContextDecorator):
+    """Tag chain reads made inside the block (or decorated function) with a queue for fair scheduling."""
+
+    def __init__(self, name):
+        self.name = name
+        self._tokens = []
+
+    def _recreate_cm(self):
+        # a fresh instance per decorated call, the same function runs on many threads at once
+        return request_type(self.name)
+
+    def __enter__(self):
+        self._tokens.append(current_request_type.set(self.name))
+        return self
+
+    def __exit__(self, *exc):
+        current_request_type.reset(self._tokens.pop())
+        return False
+
+
+class RPCExecutor:
+    """
+    Process-wide, long-lived worker pool shared by every chain read.
+
+    Work is queued per request type (e.g. "detail", "listing", "crawl") and the workers take from the
+    queues round-robin, so a catalog crawl with thousands of queued chunks cannot starve an interactive
+    NFT lookup. Tasks run in the submitter's contextvars context. Queue wait (submit -> start) and
+    call time (start -> end) are tracked per request type.
+    """
+
+    def __init__(self, max_workers=20, thread_name_prefix="rpc-worker"):
+        self.max_workers        = max_workers
+        self.thread_name_prefix = thread_name_prefix
+
+        self._condition = threading.Condition()
+        self._queues    = OrderedDict()  # request type -> deque of pending tasks
+        self._workers   = []
+        self._shutdown  = False
+        self._stats     = {}
+
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._work, name=f"{thread_name_prefix}_{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    ############################################################################################################
+    ############################################ submission ####################################################
+    ############################################################################################################
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_as(current_request_type.get(), fn, *args, **kwargs)
+
+    def submit_as(self, kind, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        task = (future, contextvars.copy_context(), fn, args, kwargs, time.monotonic())
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("RPC executor has been shut down")
+            self._queues.setdefault(kind, deque()).append(task)
+            self._kind_stats(kind)["submitted"] += 1
+            self._condition.notify()
+
+        return future
+
+    def map(self, fn, *iterables):
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return [future.result() for future in futures]
+
+    def on_worker_thread(self):
+        return threading.current_thread().name.startswith(self.thread_name_prefix)
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    ############################################################################################################
+    ############################################ workers #######################################################
+    ############################################################################################################
+
+    def _next_task(self):
+        # round-robin: take from the first non-empty queue, then move that type to the back
+        for kind in list(self._queues):
+            queue = self._queues[kind]
+            if queue:
+                self._queues.move_to_end(kind)
+                return kind, queue.popleft()
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                kind, task = self._next_task()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    kind, task = self._next_task()
+
+            future, context, fn, args, kwargs, submitted = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.monotonic()
+            try:
+                result = context.run(fn, *args, **kwargs)
+                future.set_result(result)
+                failed = False
+            except BaseException as e:
+                future.set_exception(e)
+                failed = True
+            finished = time.monotonic()
+
+            with self._condition:
+                stats = self._kind_stats(kind)
+                stats["completed"] += 1
+                stats["failed"] += int(failed)
+                stats["queue_wait_seconds"] += started - submitted
+                stats["call_seconds"] += finished - started
+                stats["max_queue_wait_seconds"] = max(stats["max_queue_wait_seconds"], started - submitted)
+
+    ############################################################################################################
+    ############################################ metrics #######################################################
+    ############################################################################################################
+
+    def _kind_stats(self, kind):
+        if kind not in self._stats:
+            self._stats[kind] = {
+                "submitted": 0, "completed": 0, "failed": 0,
+                "queue_wait_seconds": 0.0, "call_seconds": 0.0, "max_queue_wait_seconds": 0.0,
+            }
+        return self._stats[kind]
+
+    def stats(self):
+        with self._condition:
+            by_type = {}
+            for kind, stats in self._stats.items():
+                completed = stats["completed"] or 1
+                by_type[kind] = dict(
+                    stats,
+                    queued=len(self._queues.get(kind, ())),
+                    avg_queue_wait_ms=round(1000 * stats["queue_wait_seconds"] / completed, 3),
+                    avg_call_ms=round(1000 * stats["call_seconds"] / completed, 3),
+                )
+            return {"max_workers": self.max_workers, "request_types": by_type}
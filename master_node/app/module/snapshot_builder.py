@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from web3 import Web3
+
+from app.module.chain_indexer import build_topic_map, decode_log
+from app.module.file_utils import write_atomic
+
+
+NFTS_SNAPSHOT       = "all_nft.json"
+POPULAR_SNAPSHOT    = "all_popular_collections.json"
+STATE_FILE          = "snapshot_state.json"
+
+
+def popularity(details, nft_access):
+    # collections ranked by access grants over their NFTs, then unique holders, then NFT count
+    access_grants = sum(len(access_levels) for access_levels in nft_access)
+    return {
+        "accessGrants": access_grants,
+        "uniqueHolders": details["uniqueHolders"],
+        "nfts": len(nft_access),
+        "score": access_grants + 2 * details["uniqueHolders"] + len(nft_access),
+    }
+
+
+class SnapshotBuilder:
+    """
+    Background builder of the all_nft.json and all_popular_collections.json snapshots.
+
+    The first pass reads the whole catalog at a confirmed block (head minus `confirmations`). Every
+    later pass pulls the contract logs since that checkpoint and re-reads only the collections and
+    NFTs they touched, so an idle chain costs one eth_getLogs per pass. The raw reads are kept (and
+    persisted next to the snapshots) so both files are recomposed in memory, written atomically and
+    swapped into the copies the routes serve together with their ETags. A checkpoint whose block hash
+    no longer matches, i.e. a reorg past the confirmation depth, falls back to a full rebuild.
+
+    The chain reads are injected: multicall for the collection count,
+    read_collections(ids, block) -> {id: (details, nft_ids)} and read_nfts(keys, block) ->
+    {(collection_id, nft_id): (nft_information, access_levels)}.
+    """
+
+    def __init__(self, w3, contracts, multicall, read_collections, read_nfts, compose, output_dir, confirmations=3,
+                 chunk_size=2000, interval=60.0, popular_limit=20, worker_context=nullcontext):
+        self.w3                 = w3
+        self.contracts          = contracts
+        self.multicall          = multicall
+        self.read_collections   = read_collections
+        self.read_nfts          = read_nfts
+        self.compose            = compose
+        self.output_dir         = output_dir
+        self.confirmations      = confirmations
+        self.chunk_size         = chunk_size
+        self.interval           = interval
+        self.popular_limit      = popular_limit
+        self.worker_context     = worker_context
+
+        self.last_error = None
+        self.stats      = {"builds": 0, "full_builds": 0, "logs": 0, "collections_read": 0, "nfts_read": 0,
+                           "writes": 0, "last_build_seconds": 0.0}
+
+        self._checkpoint    = None  # (block_number, block_hash) the raw state below was read at
+        self._collections   = {}    # collection_id -> (details, nft_ids)
+        self._nfts          = {}    # (collection_id, nft_id) -> (nft_information, access_levels)
+        self._served        = {}    # snapshot name -> (body, etag)
+        self._lock          = threading.Lock()
+        self._thread        = None
+        self._stop          = threading.Event()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._topics = build_topic_map(contracts)
+        self._load_state()
+
+    ############################################################################################################
+    ############################################ background loop ###############################################
+    ############################################################################################################
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot-builder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with self.worker_context():
+            while not self._stop.is_set():
+                try:
+                    self.build_once()
+                    self.last_error = None
+                except Exception as e:
+                    print(f"Error in snapshot builder: {str(e)}")
+                    self.last_error = str(e)
+                self._stop.wait(self.interval)
+
+    def build_once(self):
+        """Bring the snapshots up to the confirmed head. Returns True when their content changed."""
+        started = time.monotonic()
+        target = self.w3.eth.block_number - self.confirmations
+
+        if self._checkpoint is None or self._block_hash(self._checkpoint[0]) != self._checkpoint[1]:
+            self._full_build(target)
+            read = True
+        elif target > self._checkpoint[0]:
+            read = self._incremental_build(self._checkpoint[0] + 1, target)
+        elif self._served:
+            return False
+        else:
+            # state restored from disk is already at the head, it only needs serving
+            target = self._checkpoint[0]
+            read = False
+
+        self._checkpoint = (target, self._block_hash(target))
+        # with no tracked events in the new blocks the snapshots and the state on disk stand; only the
+        # checkpoint moves on, in memory until the next change is saved (a restart scans those blocks again)
+        changed = self._publish() if read or not self._served else False
+
+        self.stats["builds"] += 1
+        self.stats["last_build_seconds"] = round(time.monotonic() - started, 4)
+        return changed
+
+    def _block_hash(self, block_number):
+        return Web3.to_hex(self.w3.eth.get_block(block_number)["hash"])
+
+    ############################################################################################################
+    ############################################ chain reads ###################################################
+    ############################################################################################################
+
+    def _full_build(self, block_number):
+        print(f"Snapshot builder: full build at block {block_number}")
+        total_collections = self.multicall.call(self.contracts["collection"].functions.getTotalCollections(),
+                                                 block_identifier=block_number)
+        self._collections = self.read_collections(list(range(1, total_collections + 1)), block_number)
+
+        keys = [(collection_id, nft_id) for collection_id, (_, nft_ids) in self._collections.items() for nft_id in nft_ids]
+        self._nfts = self.read_nfts(keys, block_number)
+
+        self.stats["full_builds"] += 1
+        self.stats["collections_read"] += len(self._collections)
+        self.stats["nfts_read"] += len(keys)
+
+    def _incremental_build(self, from_block, to_block):
+        # returns whether any tracked event touched a collection or NFT, i.e. whether anything was re-read
+        addresses = [self.contracts[key].address for key in ("collection", "nft", "metadata", "access")]
+        collection_ids, nft_keys = set(), set()
+
+        for chunk_start in range(from_block, to_block + 1, self.chunk_size):
+            chunk_end = min(to_block, chunk_start + self.chunk_size - 1)
+            logs = self.w3.eth.get_logs({"fromBlock": chunk_start, "toBlock": chunk_end, "address": addresses})
+            self.stats["logs"] += len(logs)
+            for log in logs:
+                event = decode_log(self._topics, log)
+                if event is None:
+                    continue
+                # NFT changes also move their collection's NFT ids and holder count
+                collection_ids.add(event["collection_id"])
+                if event["nft_id"] is not None:
+                    nft_keys.add((event["collection_id"], event["nft_id"]))
+
+        if not collection_ids:
+            return False
+
+        refreshed = self.read_collections(sorted(collection_ids), to_block)
+        for collection_id in collection_ids:
+            previous_ids = set(self._collections[collection_id][1]) if collection_id in self._collections else set()
+            if collection_id in refreshed:
+                current_ids = set(refreshed[collection_id][1])
+                self._collections[collection_id] = refreshed[collection_id]
+            else:
+                current_ids = set()
+                self._collections.pop(collection_id, None)
+            # minted without an event we track, or burned
+            nft_keys |= {(collection_id, nft_id) for nft_id in current_ids - previous_ids}
+            for nft_id in previous_ids - current_ids:
+                self._nfts.pop((collection_id, nft_id), None)
+                nft_keys.discard((collection_id, nft_id))
+
+        nft_keys = sorted(key for key in nft_keys if key[0] in self._collections and key[1] in self._collections[key[0]][1])
+        refreshed_nfts = self.read_nfts(nft_keys, to_block)
+        for key in nft_keys:
+            if key in refreshed_nfts:
+                self._nfts[key] = refreshed_nfts[key]
+            else:
+                self._nfts.pop(key, None)
+
+        self.stats["collections_read"] += len(collection_ids)
+        self.stats["nfts_read"] += len(nft_keys)
+        return True
+
+    ############################################################################################################
+    ############################################ snapshots #####################################################
+    ############################################################################################################
+
+    def _compose(self):
+        nfts, collection_access = [], {}
+        for (collection_id, nft_id), (nft_information, access_levels) in sorted(self._nfts.items()):
+            if collection_id not in self._collections:
+                continue
+            collection_access.setdefault(collection_id, []).append(access_levels)
+            # compose mutates the NFT record, the raw state stays as read
+            nft = self.compose(dict(nft_information) if nft_information else None, self._collections[collection_id][0], access_levels)
+            if nft:
+                nfts.append(nft)
+
+        ranked = []
+        for collection_id, (details, _) in self._collections.items():
+            ranked.append(dict(details, popularity=popularity(details, collection_access.get(collection_id, []))))
+        ranked.sort(key=lambda collection: (-collection["popularity"]["score"], collection["id"]))
+        for rank, collection in enumerate(ranked, start=1):
+            collection["rank"] = rank
+
+        return {
+            NFTS_SNAPSHOT: {"nfts": nfts},
+            POPULAR_SNAPSHOT: {"collections": ranked[:self.popular_limit]},
+        }
+
+    def _publish(self):
+        changed = False
+        for name, payload in self._compose().items():
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            served = self._served.get(name)
+            if served is not None and served[1] == etag:
+                continue
+            write_atomic(os.path.join(self.output_dir, name), body)
+            with self._lock:
+                self._served[name] = (body, etag)
+            self.stats["writes"] += 1
+            changed = True
+
+        self._save_state()
+        return changed
+
+    def snapshot(self, name):
+        """(body, etag) of the latest snapshot built in this process, None before the first build."""
+        with self._lock:
+            return self._served.get(name)
+
+    ############################################################################################################
+    ############################################ checkpoint state ##############################################
+    ############################################################################################################
+
+    def _save_state(self):
+        state = {
+            "checkpoint": self._checkpoint,
+            "collections": [[collection_id, details, nft_ids] for collection_id, (details, nft_ids) in self._collections.items()],
+            "nfts": [[collection_id, nft_id, nft_information, access_levels]
+                     for (collection_id, nft_id), (nft_information, access_levels) in self._nfts.items()],
+        }
+        write_atomic(os.path.join(self.output_dir, STATE_FILE), json.dumps(state, separators=(",", ":")).encode())
+
+    def _load_state(self):
+        path = os.path.join(self.output_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+            self._collections = {collection_id: (details, nft_ids) for collection_id, details, nft_ids in state["collections"]}
+            self._nfts = {(collection_id, nft_id): (nft_information, access_levels)
+                          for collection_id, nft_id, nft_information, access_levels in state["nfts"]}
+            self._checkpoint = tuple(state["checkpoint"]) if state["checkpoint"] else None
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Snapshot builder: ignoring unreadable state file: {str(e)}")
+            self._checkpoint, self._collections, self._nfts = None, {}, {}
+
+    def status(self):
+        with self._lock:
+            served = {name: {"etag": etag, "bytes": len(body)} for name, (body, etag) in self._served.items()}
+        return dict(
+            self.stats,
+            checkpoint_block=self._checkpoint[0] if self._checkpoint else None,
+            collections=len(self._collections),
+            nfts=len(self._nfts),
+            snapshots=served,
+            last_error=self.last_error,
+        )
@@ -0,0 +1,143 @@
+import codecs
+import functools
+import re
+import unicodedata
+
+
+# unicode_form -> what happens to characters outside ASCII
+#   keep        left as extracted
+#   nfkc        compatibility forms folded (ligatures, full-width letters, superscripts), scripts kept
+#   ascii_fold  accents dropped and common punctuation mapped to ASCII, anything else becomes a space
+#   ascii       every non-ASCII character becomes a space, what the extractor used to do
+UNICODE_FORMS = ("keep", "nfkc", "ascii_fold", "ascii")
+
+
+def _space(error):
+    # called once per run of characters the ascii codec cannot encode, not once per character
+    return " " * (error.end - error.start), error.end
+
+
+codecs.register_error("text_normalize.space", _space)
+
+
+def _to_ascii(text):
+    if text.isascii():
+        return text
+    return text.encode("ascii", "text_normalize.space").decode("ascii")
+
+
+# C0 and C1 controls other than tab and newlines, plus invisible format characters PDFs are full of
+# (soft hyphens, zero-width spaces and joiners, byte order marks); line and paragraph separators
+# become plain newlines and vertical tab and form feed plain spaces
+_CONTROL_TABLE = dict.fromkeys([*range(0x00, 0x09), *range(0x0E, 0x20), *range(0x7F, 0xA0),
+                                0x00AD, *range(0x200B, 0x2010), 0x2060, 0xFEFF])
+_CONTROL_TABLE.update({0x0B: " ", 0x0C: " ", 0x85: "\n", 0x2028: "\n", 0x2029: "\n"})
+
+# finds runs of the characters above, so translate only ever sees those: translating the whole
+# buffer through a dict is several times slower than scanning it
+_CONTROLS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\xad\u200b-\u200f\u2028\u2029\u2060\ufeff]+")
+
+
+def _strip_control(text):
+    # every character above is also one isprintable() rejects, and that check is a lot cheaper than
+    # any regex scan, so text without them (most pages) skips the scan
+    if text.replace("\n", "").replace("\t", "").replace("\r", "").isprintable():
+        return text
+    return _CONTROLS.sub(lambda match: match.group().translate(_CONTROL_TABLE), text)
+
+# letters and punctuation NFKD does not take apart
+_ASCII_FOLD_EXTRA = {
+    "ß": "ss", "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE", "ø": "o", "Ø": "O", "ł": "l", "Ł": "L",
+    "đ": "d", "Đ": "D", "ð": "d", "Ð": "D", "þ": "th", "Þ": "Th", "ı": "i",
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+    "«": '"', "»": '"', "‹": "'", "›": "'", "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-",
+    "−": "-", "•": "*", "·": ".", "×": "x", "÷": "/",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _ascii_fold_table():
+    # built on first use: drops every combining mark in the BMP, which is where NFKD puts accents
+    table = dict.fromkeys(cp for cp in range(0x10000) if unicodedata.category(chr(cp)) == "Mn")
+    table.update({ord(ch): replacement for ch, replacement in _ASCII_FOLD_EXTRA.items()})
+    return table
+
+
+_NON_ASCII      = re.compile(r"[^\x00-\x7f]+")
+_BLANK_LINES    = re.compile(r"\n\n\n+")
+
+
+def _ascii_fold(run):
+    return _to_ascii(unicodedata.normalize("NFKD", run).translate(_ascii_fold_table()))
+
+
+# every character str.split() treats as a blank other than the space itself; newlines are not blanks
+_BLANKS     = tuple(chr(cp) for cp in range(0x10000) if chr(cp).isspace() and chr(cp) not in " \n")
+_SPACE_RUNS = re.compile("  +")
+
+
+def _collapse_whitespace(text, blanks=_BLANKS):
+    # str.replace and substring checks, plus regexes that start with a literal, so the scans run at
+    # memory speed and text that is already clean is only ever read: a regex over a class of blanks
+    # or a per-line split costs several times more. blanks are the ones the text may still contain.
+    # A lone blank at either end is kept so text joined after this one does not run into it.
+    for blank in blanks:
+        if blank in text:
+            text = text.replace(blank, " ")
+    if "  " in text:
+        text = _SPACE_RUNS.sub(" ", text)
+    if " \n" in text:
+        text = text.replace(" \n", "\n")
+    if "\n " in text:
+        text = text.replace("\n ", "\n")
+    if "\n\n\n" in text:
+        text = _BLANK_LINES.sub("\n\n", text)
+    return text
+
+
+class TextNormalizer:
+    """
+    Normalises extracted text in a few passes over the whole buffer, each of them a str method,
+    unicodedata.normalize, codec or compiled regex call, so the per-character work happens in C
+    rather than in a Python loop; the rare runs the regexes find are the only thing handled one by one.
+
+    In order: strip_control drops control and invisible format characters, unicode_form is one of
+    UNICODE_FORMS, and collapse_whitespace turns runs of blanks into one space, trims blanks around
+    line breaks and keeps at most one empty line in a row.
+    """
+
+    def __init__(self, unicode_form="nfkc", strip_control=True, collapse_whitespace=True):
+        if unicode_form not in UNICODE_FORMS:
+            raise ValueError(f"Unknown unicode form {unicode_form}, expected one of {', '.join(UNICODE_FORMS)}")
+        self.unicode_form           = unicode_form
+        self.strip_control          = strip_control
+        self.collapse_whitespace    = collapse_whitespace
+
+        # the blanks that survive the passes before collapse_whitespace, the others (most of the
+        # Unicode ones, after strip_control and nfkc) are not worth looking for
+        self._blanks = tuple(blank for blank in _BLANKS if any(ch in _BLANKS for ch in self._convert(blank)))
+
+    def _convert(self, text):
+        if self.strip_control:
+            text = _strip_control(text)
+
+        if self.unicode_form == "nfkc":
+            text = unicodedata.normalize("NFKC", text)
+        elif self.unicode_form == "ascii_fold" and not text.isascii():
+            text = _NON_ASCII.sub(lambda match: _ascii_fold(match.group()), text)
+        elif self.unicode_form == "ascii":
+            text = _to_ascii(text)
+        return text
+
+    def __call__(self, text):
+        text = self._convert(text)
+        if self.collapse_whitespace:
+            text = _collapse_whitespace(text, self._blanks)
+        return text
+
+    def describe(self):
+        return {
+            "unicode_form": self.unicode_form,
+            "strip_control": self.strip_control,
+            "collapse_whitespace": self.collapse_whitespace,
+        }
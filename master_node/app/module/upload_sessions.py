@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from app.module.file_utils import write_atomic
+
+
+SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A request the client has to change, with the HTTP status to answer it with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset  # where the upload really stands, for a client that lost track
+
+
+class UploadSessions:
+    """
+    Resumable uploads staged in folder: create() opens a session for a file of a declared size,
+    write_chunk() appends one chunk at the offset the session has reached, and complete() hands the
+    finished file over once every byte is in and, when one was declared, its SHA-256 matches.
+
+    Each session is <id>.part, the bytes so far, and <id>.json, its metadata. The offset in the
+    metadata only moves after a chunk has been written, synced and checked against its SHA-256, so
+    a chunk cut off by a dropped connection or a restart is truncated away and sent again. Sessions
+    not touched for idle_seconds are removed by a sweeper thread.
+    """
+
+    def __init__(self, folder, max_chunk_bytes=8 * 1024 * 1024, idle_seconds=24 * 3600, poll_interval=300.0):
+        self.folder             = folder
+        self.max_chunk_bytes    = max_chunk_bytes
+        self.idle_seconds       = idle_seconds
+        self.poll_interval      = poll_interval
+
+        self.stats      = {"created": 0, "chunks": 0, "bytes": 0, "checksum_failures": 0, "offset_conflicts": 0,
+                           "completed": 0, "aborted": 0, "expired": 0}
+
+        self._locks     = {}
+        self._lock      = threading.Lock()
+        self._stop      = threading.Event()
+        self._thread    = None
+
+        os.makedirs(folder, exist_ok=True)
+
+    ############################################################################################################
+    ############################################ sessions ######################################################
+    ############################################################################################################
+
+    def _paths(self, upload_id):
+        if not SESSION_ID.match(upload_id or ""):
+            raise UploadError("Upload not found", 404)
+        base = os.path.join(self.folder, upload_id)
+        return base + ".part", base + ".json"
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _save(self, session):
+        _, meta_path = self._paths(session["id"])
+        write_atomic(meta_path, json.dumps(session).encode())
+
+    def get(self, upload_id):
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Upload not found", 404)
+
+    def create(self, kind, filename, size, sha256=None, max_bytes=None):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if max_bytes and size > max_bytes:
+            raise UploadError(f"File is {size} bytes, the limit is {max_bytes}", 413)
+        if sha256 is not None and not re.match(r"^[0-9a-f]{64}$", str(sha256).lower()):
+            raise UploadError("sha256 must be 64 hex characters")
+
+        now = time.time()
+        session = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "offset": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        part_path, _ = self._paths(session["id"])
+        open(part_path, "wb").close()
+        self._save(session)
+        self.stats["created"] += 1
+        return session
+
+    def write_chunk(self, upload_id, offset, stream, checksum=None):
+        """
+        Append the chunk read from stream at offset, which has to be where the session stands.
+        checksum is the chunk's SHA-256 in hex; a chunk that does not match is dropped. Returns the
+        updated session.
+        """
+        lock = self._session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise UploadError("Another chunk of this upload is being written", 409, self.get(upload_id)["offset"])
+        try:
+            session = self.get(upload_id)
+            if offset != session["offset"]:
+                self.stats["offset_conflicts"] += 1
+                raise UploadError(f"Upload is at offset {session['offset']}, not {offset}", 409, session["offset"])
+
+            part_path, _ = self._paths(upload_id)
+            limit = min(self.max_chunk_bytes, session["size"] - offset)
+            digest = hashlib.sha256()
+            written = 0
+            with open(part_path, "r+b") as f:
+                # anything past the offset is a chunk that never finished
+                f.truncate(offset)
+                f.seek(offset)
+                try:
+                    for piece in iter(lambda: stream.read(1024 * 1024), b""):
+                        written += len(piece)
+                        if written > limit:
+                            raise UploadError(f"Chunk is over the {limit} bytes this upload can take at offset {offset}", 413, offset)
+                        digest.update(piece)
+                        f.write(piece)
+                    if checksum is not None and digest.hexdigest() != checksum.lower():
+                        self.stats["checksum_failures"] += 1
+                        raise UploadError("Chunk checksum does not match, send it again", 400, offset)
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+                f.flush()
+                os.fsync(f.fileno())
+
+            session["offset"] = offset + written
+            session["updated_at"] = time.time()
+            self._save(session)
+            self.stats["chunks"] += 1
+            self.stats["bytes"] += written
+            return session
+        finally:
+            lock.release()
+
+    def complete(self, upload_id):
+        """
+        Check the upload is whole and matches its declared SHA-256, then return (session, path,
+        sha256) and forget the session: the file at path belongs to the caller from here on, who
+        moves or removes it (one left behind is swept like an idle session).
+        """
+        lock = self._session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise UploadError("A chunk of this upload is still being written", 409, self.get(upload_id)["offset"])
+        try:
+            session = self.get(upload_id)
+            if session["offset"] != session["size"]:
+                raise UploadError(f"Upload has {session['offset']} of {session['size']} bytes", 409, session["offset"])
+
+            part_path, meta_path = self._paths(upload_id)
+            os.truncate(part_path, session["size"])
+            digest = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for piece in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(piece)
+            if session["sha256"] and digest.hexdigest() != session["sha256"]:
+                # every chunk matched its own checksum, so the client declared the wrong file: start over
+                self._remove(upload_id)
+                raise UploadError("File checksum does not match the sha256 the upload was created with", 400)
+
+            done_path = os.path.splitext(part_path)[0] + ".done"
+            os.replace(part_path, done_path)
+            os.utime(done_path)
+            os.remove(meta_path)
+            self.stats["completed"] += 1
+            return session, done_path, digest.hexdigest()
+        finally:
+            lock.release()
+            with self._lock:
+                self._locks.pop(upload_id, None)
+
+    def abort(self, upload_id):
+        self.get(upload_id)
+        self._remove(upload_id)
+        self.stats["aborted"] += 1
+
+    def _remove(self, upload_id):
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    ############################################################################################################
+    ############################################ sweeper #######################################################
+    ############################################################################################################
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="upload-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.expire_idle()
+            except Exception as e:
+                print(f"Error expiring uploads: {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def expire_idle(self):
+        """Remove sessions idle for longer than idle_seconds, and files left without a session as long."""
+        cutoff = time.time() - self.idle_seconds
+        expired = 0
+        for entry in os.scandir(self.folder):
+            upload_id, ext = os.path.splitext(entry.name)
+            if not SESSION_ID.match(upload_id) or entry.stat().st_mtime >= cutoff:
+                continue
+            lock = self._session_lock(upload_id)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                if ext == ".json":
+                    with open(entry.path) as f:
+                        if json.load(f)["updated_at"] < cutoff:
+                            self._remove(upload_id)
+                            expired += 1
+                elif not os.path.exists(os.path.join(self.folder, upload_id + ".json")):
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            finally:
+                lock.release()
+                with self._lock:
+                    self._locks.pop(upload_id, None)
+        self.stats["expired"] += expired
+        return expired
+
+    def status(self):
+        sessions = [entry for entry in os.scandir(self.folder) if entry.name.endswith(".json")]
+        return dict(
+            self.stats,
+            open_sessions=len(sessions),
+            staged_bytes=sum(entry.stat().st_size for entry in os.scandir(self.folder) if entry.name.endswith(".part")),
+            max_chunk_bytes=self.max_chunk_bytes,
+            idle_seconds=self.idle_seconds,
+        )
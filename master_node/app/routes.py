@@ -4,11 +4,13 @@ from app import app
 from flask import request, jsonify
 
 
-import PyPDF2  # For handling PDFs
+import tempfile
 
 from app.module.embeddings import get_embeddings, get_documents
+from app.module.pdf_extract import PDFLimitError
 
 from app.module.helper_functions import generate_api_key, allowed_file, api_key_required, generate_jwt_token, token_required
+from app.routesv2 import pdf_extractor
 
 import os
 
@@ -25,16 +27,6 @@ temp_folder         = app.config['TEMP_FILE_PATH']
 
 ########################## converting PDF to text ##########################
 
-def convert_pdf_to_text(file):
-    try:
-        reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        raise Exception(f"Error processing PDF: {str(e)}")
-
 @app.route('/convert_pdf', methods=['POST'])
 def convert_pdf():
     if 'file' not in request.files:
@@ -43,11 +35,18 @@ def convert_pdf():
     file = request.files['file']
     
     if file and allowed_file(file.filename):
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
         try:
-            text = convert_pdf_to_text(file)
+            with os.fdopen(fd, 'wb') as f:
+                file.save(f)
+            text = pdf_extractor.extract_text(pdf_path)
             return jsonify({'text': text}), 200
+        except PDFLimitError as e:
+            return jsonify({'error': str(e)}), 413
         except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            return jsonify({'error': f"Error processing PDF: {str(e)}"}), 500
+        finally:
+            os.remove(pdf_path)
     else:
         return jsonify({'error': 'Invalid file type. Only PDF files are allowed for this endpoint.'}), 400
 
@@ -1,20 +1,33 @@
 from app import app
 
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, send_file
+from werkzeug.security import safe_join
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 
 
-import requests
-import PyPDF2  # For handling PDFs
+import io
+import shutil
 import tempfile
-from app.module.embeddings import get_embeddings, get_documents
+import time
+from app.module.embeddings import get_embeddings, get_documents, EMBEDDING_MODEL
+from app.module.embedding_store import EmbeddingStore, content_digest
+from app.module.corpus import CorpusBuilder
+from app.module.pdf_extract import PDFExtractor, PDFLimitError
+from app.module.text_normalize import TextNormalizer
+from app.module.job_queue import JobQueueFull, JobError
+from app.module.data_source import DataSourceResolver
+from app.jobs import job_queue, job_response, JOB_FOLDER
+from app.uploads import register_upload
+import hashlib
 import unicodedata
 
 from app.module.helper_functions import generate_api_key, allowed_file, api_key_required, generate_jwt_token, token_required
+from werkzeug.utils import secure_filename
 
 from app import blockchain_code
 
 
-from app.data_fetch import generate_random_string
+from app.module.blob_store import BlobStore, IMMUTABLE_MAX_AGE, PRECOMPRESSED_SUFFIXES, is_content_addressed
 
 import os
 
@@ -25,10 +38,72 @@ UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
 FILE_STORAGE_ENDPOINT = app.config['filestorage_endpoint']
 DATA_FOLDER = os.path.join(UPLOAD_FOLDER,"data")
 
+# extracted text is kept as .gz (and .br), read back decompressed as it streams or sent as it is
+data_store = BlobStore(DATA_FOLDER, compressed=int(app.config['DATA_COMPRESSED']) == 1)
+
+# NFT data links into our own storage are read from data_store, anything else goes through a revalidated cache
+data_sources = DataSourceResolver(
+    [FILE_STORAGE_ENDPOINT, app.config['local_data_endpoint']], data_store,
+    max_entries = int(app.config['DATA_FETCH_CACHE_ENTRIES']),
+    max_bytes   = int(app.config['DATA_FETCH_CACHE_MB']) * 1024 * 1024,
+    timeout     = float(app.config['DATA_FETCH_TIMEOUT_SECONDS']),
+)
+
 #  to be replace by reddis or on chain session management storage
 api_keys            = app.config['API_KEYS'] 
 chat_sessions       = app.config['CHAT_SESSIONS']
 
+pdf_extractor = PDFExtractor(
+    max_workers     = int(app.config['PDF_EXTRACT_WORKERS']) or None,
+    pages_per_task  = int(app.config['PDF_PAGES_PER_TASK']),
+    max_pages       = int(app.config['PDF_MAX_PAGES']),
+    max_file_bytes  = int(app.config['PDF_MAX_FILE_MB']) * 1024 * 1024,
+    max_text_bytes  = int(app.config['PDF_MAX_TEXT_MB']) * 1024 * 1024,
+)
+
+# applied to every page before the text is stored; it runs in this process, on each page as the
+# extractor's workers send it back, not in the workers themselves
+text_normalizer = TextNormalizer(
+    unicode_form        = app.config['TEXT_UNICODE_FORM'],
+    strip_control       = int(app.config['TEXT_STRIP_CONTROL']) == 1,
+    collapse_whitespace = int(app.config['TEXT_COLLAPSE_WHITESPACE']) == 1,
+)
+
+corpus_builder = CorpusBuilder(
+    pdf_extractor, text_normalizer,
+    max_workers     = int(app.config['INGEST_WORKERS']),
+    chunk_chars     = int(app.config['INGEST_CHUNK_CHARS']),
+    chunk_overlap   = int(app.config['INGEST_CHUNK_OVERLAP_CHARS']),
+)
+INGEST_MAX_FILES = int(app.config['INGEST_MAX_FILES'])
+
+# embeddings made when data is uploaded, next to its .data file, so generate_key only has to load them
+embedding_store = EmbeddingStore(DATA_FOLDER, EMBEDDING_MODEL, get_embeddings)
+EMBED_ON_UPLOAD = int(app.config['EMBED_ON_UPLOAD']) == 1
+
+
+def document_texts(text):
+    # the texts a whole .data file is embedded as, the same at upload time and in generate_key
+    return [f"AI_Data: {text}\n"]
+
+
+def wants_embedding():
+    # ?embed=1 or ?embed=0 (or an embed form field) overrides EMBED_ON_UPLOAD for one upload
+    embed = request.values.get('embed')
+    return EMBED_ON_UPLOAD if embed is None else embed.strip().lower() in ("1", "true", "yes")
+
+
+def embed_upload(digest, texts, progress):
+    # an upload stands without its embeddings, generate_key computes them on the first chat then
+    progress(0.9, f"embedding {len(texts)} texts")
+    try:
+        embedding = embedding_store.build(digest, texts)
+    except Exception as e:
+        print(f"Error embedding {digest}: {str(e)}")
+        embedding = {'status': 'failed', 'error': str(e)}
+    return dict(embedding, model=embedding_store.model_name)
+
+
 
 @app.route("/")
 def index():
@@ -38,21 +113,51 @@ def index():
 
 ########################## converting PDF to text ##########################
 
-def convert_pdf_to_text(file):
+def convert_pdf_job(payload, progress):
+    pdf_path = payload['pdf_path']
     try:
-        reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text
+        # the text is streamed page by page into a blob named by its hash, the same text is stored once
+        with data_store.writer(".data") as blob:
+            result = pdf_extractor.extract_to(
+                pdf_path, blob, normalizer=text_normalizer,
+                progress=lambda done, total: progress(done / total, f"{done}/{total} pages"),
+            )
+        print(f"Extracted {result['pages']} pages ({result['bytes']} bytes) in {result['seconds']}s, {result['pages_per_second']} pages/s")
+        if payload.get('embed'):
+            with io.TextIOWrapper(data_store.open(blob.name), encoding='utf-8') as f:
+                result['embedding'] = embed_upload(blob.name.split('.')[0], document_texts(f.read()), progress)
+    except PDFLimitError as e:
+        raise JobError(str(e), 413)
     except Exception as e:
         raise Exception(f"Error processing PDF: {str(e)}")
+    finally:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+    
+    return dict(result, url=f"{FILE_STORAGE_ENDPOINT}/data/{blob.name}")
+
+
+job_queue.register("convert_pdf", convert_pdf_job)
+
 
+def compress_data_job(payload, progress):
+    compressed = data_store.compress_existing(progress)
+    print(f"Compressed {compressed} plain .data files")
+    return {'compressed': compressed}
 
 
-def sanitize_text(text):
-    # return ''.join(ch for ch in text if unicodedata.category(ch)[0] != 'C')
-    return ''.join(ch  if ord(ch) < 128 else " " for ch in text)
+job_queue.register("compress_data", compress_data_job)
+
+
+def compress_existing_data():
+    # .data files written before DATA_COMPRESSED are compressed in the background, once per server start;
+    # called by the server entry point (app.py), never at import
+    if data_store.compressed:
+        try:
+            job_queue.submit("compress_data", {}, dedupe_key="compress_data")
+        except JobQueueFull:
+            pass
+
 
 @app.route('/convertpdfToLink', methods=['POST'])
 def convert_pdf_to_link():
@@ -62,42 +167,198 @@ def convert_pdf_to_link():
     file = request.files['file']
     
     if file and allowed_file(file.filename):
-        try:
-            text = convert_pdf_to_text(file)
-            text = sanitize_text(text)
-            
-            
-            random_filename = f"{generate_random_string()}.data"
-            
-            # store the text in a file and return the file path
-            with open(os.path.join(DATA_FOLDER,random_filename), 'w') as f:
-                f.write(text)
-            
-            data_url = f"{FILE_STORAGE_ENDPOINT}/data/{random_filename}"
-            
-            return data_url, 200
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        # the upload waits in JOB_FOLDER for its job, the same PDF uploaded again while that job is queued or running joins it
+        os.makedirs(JOB_FOLDER, exist_ok=True)
+        fd, pdf_path = tempfile.mkstemp(dir=JOB_FOLDER, suffix=".pdf")
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        
+        return submit_pdf_conversion(pdf_path, digest.hexdigest(), wants_embedding())
     else:
         return jsonify({'error': 'Invalid file type. Only PDF files are allowed for this endpoint.'}), 400
+
+
+def submit_pdf_conversion(pdf_path, sha256, embed=EMBED_ON_UPLOAD):
+    # pdf_path is in JOB_FOLDER and belongs to the job from here on
+    try:
+        job, deduplicated = job_queue.submit("convert_pdf", {'pdf_path': pdf_path, 'embed': embed},
+                                             dedupe_key=f"convert_pdf:{sha256}:{int(embed)}")
+    except JobQueueFull as e:
+        os.remove(pdf_path)
+        return jsonify({'error': f"Too many jobs queued: {str(e)}"}), 503, {'Retry-After': '10'}
+    
+    if deduplicated:
+        os.remove(pdf_path)
     
+    return job_response(job, lambda result: (result['url'], 200, {'Server-Timing': PDFExtractor.server_timing(result)}))
 
+
+def complete_pdf_upload(session, path, sha256):
+    # a chunked upload through /uploads, converted like one sent to /convertpdfToLink
+    os.makedirs(JOB_FOLDER, exist_ok=True)
+    fd, pdf_path = tempfile.mkstemp(dir=JOB_FOLDER, suffix=".pdf")
+    os.close(fd)
+    os.replace(path, pdf_path)
+    return submit_pdf_conversion(pdf_path, sha256)
+
+
+register_upload("pdf", complete_pdf_upload, allowed_file, pdf_extractor.max_file_bytes)
+    
+
+
+########################## ingesting a corpus ##########################
+
+def ingest_corpus_job(payload, progress):
+    folder = payload['folder']
+    try:
+        # every file's text goes into one .data blob in the order given, chunked for embedding as it is written
+        with data_store.writer(".data") as blob:
+            summary, chunks = corpus_builder.build(
+                payload['files'], blob,
+                progress=lambda fraction, message: progress(0.8 * fraction, message),
+            )
+            if not chunks:
+                raise JobError("No text could be extracted from any file: " +
+                               "; ".join(f"{entry['filename']}: {entry['error']}" for entry in summary['files']), 422)
+        failed = [entry['filename'] for entry in summary['files'] if entry['status'] != 'ok']
+        print(f"Ingested {len(summary['files']) - len(failed)}/{len(summary['files'])} files ({summary['bytes']} bytes, {len(chunks)} chunks) in {summary['seconds']}s")
+        
+        embedding = None
+        if payload.get('embed'):
+            # the chunks rather than the whole corpus, under the corpus' digest
+            embedding = embed_upload(blob.name.split('.')[0], [chunk['text'] for chunk in chunks], progress)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    return dict(summary, url=f"{FILE_STORAGE_ENDPOINT}/data/{blob.name}", chunks=len(chunks), embedding=embedding)
+
+
+job_queue.register("ingest_corpus", ingest_corpus_job)
+
+
+@app.route('/ingest', methods=['POST'])
+def ingest_corpus():
+    
+    # curl -X POST http://localhost:5500/ingest -F "file=@paper.pdf" -F "file=@notes.txt" -F "file=@spec.docx"
+    # one corpus for an NFT out of every file sent, with each file's timing or error in "files"
+    
+    files = [file for file in request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({'error': 'No file part provided'}), 400
+    if len(files) > INGEST_MAX_FILES:
+        return jsonify({'error': f"At most {INGEST_MAX_FILES} files per request"}), 413
+    rejected = [file.filename for file in files if not allowed_file(file.filename)]
+    if rejected:
+        return jsonify({'error': f"File type not allowed: {', '.join(rejected)}"}), 400
+    
+    # staged in JOB_FOLDER for the job; the same files in the same order while that job is queued or running join it
+    os.makedirs(JOB_FOLDER, exist_ok=True)
+    folder = tempfile.mkdtemp(dir=JOB_FOLDER, prefix="ingest-")
+    staged, batch = [], hashlib.sha256()
+    for i, file in enumerate(files):
+        path = os.path.join(folder, f"{i}_{secure_filename(file.filename) or 'file'}")
+        digest = hashlib.sha256()
+        with open(path, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        staged.append([path, file.filename])
+        batch.update(f"{file.filename}\0{digest.hexdigest()}\0".encode())
+    
+    try:
+        embed = wants_embedding()
+        job, deduplicated = job_queue.submit("ingest_corpus", {'folder': folder, 'files': staged, 'embed': embed},
+                                             dedupe_key=f"ingest_corpus:{batch.hexdigest()}:{int(embed)}")
+    except JobQueueFull as e:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({'error': f"Too many jobs queued: {str(e)}"}), 503, {'Retry-After': '10'}
+    
+    if deduplicated:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    return job_response(job, lambda result: (jsonify(result), 200))
+
+
+# {"data": ...} envelope for existing clients, /data/raw/<datafile> below serves the file itself
 @app.route('/data', methods=['GET'])
 @app.route('/data/<datafile>', methods=['GET'])
 def get_data(datafile="default.data"):
 
 
-    path_to_file = os.path.join(app.config['UPLOAD_FOLDER'],"data")
-    if not os.path.exists(os.path.join(path_to_file, datafile)):
+    if not data_store.exists(datafile):
         return "No data found"
     
     print("filename, UPLOAD_FOLDER", datafile, UPLOAD_FOLDER)
     
     
-    with open(os.path.join(path_to_file, datafile), 'r') as f:
+    with io.TextIOWrapper(data_store.open(datafile), encoding='utf-8') as f:
         data = f.read()
     
-    return jsonify({"data": data}), 200
+    response = jsonify({"data": data})
+    if is_content_addressed(datafile):
+        # the name is the hash of the content, it can be cached for good
+        response.set_etag(datafile.split('.')[0])
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+    return response, 200
+
+
+@app.route('/data/raw/<datafile>', methods=['GET'])
+def get_raw_data(datafile):
+    
+    # the file itself rather than the {"data": ...} envelope: sent from disk with Range, ETag and
+    # Last-Modified, as the stored .br or .gz when the client accepts one; anyone else gets the plain
+    # file, or the .gz decompressed on the way out when that is all there is (Range still applies to
+    # the decompressed content, its length is known without decompressing)
+    
+    path = safe_join(DATA_FOLDER, datafile)
+    if path is None or not data_store.exists(datafile):
+        return jsonify({'error': 'No data found'}), 404
+    
+    encoding = next((encoding for encoding in PRECOMPRESSED_SUFFIXES
+                     if request.accept_encodings.quality(encoding) > 0 and data_store.precompressed(datafile, encoding)), None)
+    
+    immutable = is_content_addressed(datafile)
+    etag = True
+    if immutable:
+        etag = datafile.split('.')[0] + (f"-{encoding}" if encoding else "")
+    
+    if encoding:
+        source = data_store.precompressed(datafile, encoding)
+    elif os.path.isfile(path):
+        source = path
+    else:
+        source = data_store.open(datafile)
+    
+    response = send_file(
+        source,
+        mimetype='text/plain',
+        etag=etag,
+        last_modified=data_store.mtime(datafile),
+        max_age=IMMUTABLE_MAX_AGE if immutable else None,
+        conditional=isinstance(source, str),
+    )
+    if not isinstance(source, str):
+        # send_file cannot size a stream, so the conditional and Range handling it skipped happens here
+        size = data_store.size(datafile)
+        response.content_length = size
+        try:
+            response = response.make_conditional(request, accept_ranges=True, complete_length=size)
+        except RequestedRangeNotSatisfiable:
+            source.close()
+            raise
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
 
 
 def check_access(access_list, signed_message):
@@ -140,7 +401,66 @@ def generate_key():
     
     # signed_message = info_dict['signed_message']
     
-    nft = blockchain_code.nft_of_a_collection_with_access(int(collection_id), int(nft_id))
+    try:
+        collection_id, nft_id = int(collection_id), int(nft_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'collection_id and nft_id must be integers'}), 400
+    
+    # the job only fetches and embeds the NFT's data, so concurrent callers for one NFT share that work;
+    # each of them gets its own key, made in key_response when the result reaches them
+    try:
+        job, _ = job_queue.submit("generate_key", {'collection_id': collection_id, 'nft_id': nft_id},
+                                  dedupe_key=f"generate_key:{collection_id}:{nft_id}")
+    except JobQueueFull as e:
+        return jsonify({'error': f"Too many jobs queued: {str(e)}"}), 503, {'Retry-After': '10'}
+    
+    return job_response(job, key_response, status_url=f"/generate_key/{job['id']}")
+
+
+@app.route('/generate_key/<job_id>', methods=['GET'])
+def get_generated_key(job_id):
+    
+    # where a /generate_key answered with 202 is polled: a new key once the job is done
+    
+    job = job_queue.get(job_id)
+    if job is None or job['kind'] != "generate_key":
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return job_response(job, key_response, status_url=f"/generate_key/{job_id}")
+
+
+def key_response(result):
+    # the key lives only in api_keys and this response, never in the job's stored result
+    started = time.perf_counter()
+    artifact = embedding_store.load(result['digest'])
+    if artifact is None:
+        return jsonify({'error': 'The embeddings for this data are gone, generate the key again'}), 409
+    
+    embeddings = get_embeddings([result['nftContent']]) + artifact['embeddings']
+    documents = get_documents([result['nftContent']] + artifact['texts'])
+    
+    api_key = generate_api_key()
+    api_keys[api_key] = {
+        'embeddings': embeddings,
+        'documents': documents
+    }
+    timings = dict(result['timings'], key={"source": "artifact", "seconds": round(time.perf_counter() - started, 4)})
+    
+    # the first chat's cost in the browser's timing panel: where the data and its embeddings came from
+    return jsonify({'apiKey': api_key,
+                    "hpcEndpoint": app.config["Load_balancer_Endpoints"]["hpcEndpoint"],
+                    "hpcEndpointPort": app.config["Load_balancer_Endpoints"]["hpcEndpointPort"],
+                    "timings": timings,
+                    }), 200, {'Server-Timing': ", ".join(
+        f'{name};dur={1000 * timing["seconds"]:.1f};desc="{timing["source"]}"' for name, timing in timings.items())}
+
+
+def generate_key_job(payload, progress):
+    
+    progress(0.0, "reading NFT")
+    nft = blockchain_code.nft_of_a_collection_with_access(payload['collection_id'], payload['nft_id'])
+    if not nft:
+        raise JobError('NFT not found', 404)
     
     data_link = nft['data']
     access_list = nft['accessList']
@@ -162,17 +482,20 @@ def generate_key():
     if not check_urk_format(data_link) :
         data_link = f"{FILE_STORAGE_ENDPOINT}/data/default.data"
 
-    data = requests.get(data_link).json()
+    progress(0.2, "fetching data")
+    data, fetch = data_sources.resolve(data_link)
+    print(f"Data for NFT {payload['collection_id']}/{payload['nft_id']}: {fetch['source']} in {fetch['seconds']}s")
+    progress(0.4, f"data from {fetch['source']} in {fetch['seconds']}s")
     
     
     # also get rag data etc
     
     if not data or 'data' not in data:
-        return jsonify({'error': 'AI_Data and baseModel are required'}), 400
+        raise JobError('AI_Data and baseModel are required', 400)
 
     
     # Prepare the content for the temporary file
-    content_main    = f"AI_Data: {data['data']}\n"
+    content_main    = document_texts(data['data'])
     
     
     
@@ -201,21 +524,22 @@ def generate_key():
         optional_content += "Additional Data: " + ", ".join(additional_content) + "\n"
 
 
-    embeddings = get_embeddings([optional_content, content_main])
-    documents = get_documents([optional_content, content_main])
+    progress(0.5, "embedding")
+    # the data was embedded when it was uploaded, only the NFT's own fields are left to key_response;
+    # data uploaded before that (or from elsewhere) is embedded now and kept for the next key
+    digest = content_digest(data['data'])
+    embedding = embedding_store.build(digest, content_main)
+    embedding = {"source": "artifact" if embedding['status'] == "exists" else "computed", "seconds": embedding['seconds']}
+    print(f"Embeddings for NFT {payload['collection_id']}/{payload['nft_id']}: {embedding['source']} in {embedding['seconds']}s")
  
     # print("embeddings", embeddings)
     # print("documents", documents)
 
-    api_key = generate_api_key()
-    api_keys[api_key] = {
-        'embeddings': embeddings,
-        'documents': documents
-    }
-    
+    # nothing secret: this is kept with the job and readable by anyone with its id
+    return {'digest': digest,
+            'nftContent': optional_content,
+            'timings': {"fetch": fetch, "embedding": embedding},
+            }
 
-    return jsonify({'apiKey': api_key,
-                    "hpcEndpoint": app.config["Load_balancer_Endpoints"]["hpcEndpoint"],
-                    "hpcEndpointPort": app.config["Load_balancer_Endpoints"]["hpcEndpointPort"]
-                    }), 200
 
+job_queue.register("generate_key", generate_key_job)
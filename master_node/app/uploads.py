@@ -0,0 +1,140 @@
+from app import app
+
+from flask import request, jsonify
+
+from app.module.upload_sessions import UploadSessions, UploadError
+
+import os
+
+
+UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
+
+# chunks are written here as they arrive, next to the folders the finished files are moved into
+STAGING_FOLDER  = os.path.join(UPLOAD_FOLDER,"staging")
+UPLOAD_MAX      = int(app.config['UPLOAD_MAX_MB']) * 1024 * 1024
+
+
+############################################################################################################
+######################################### Resumable uploads ################################################
+############################################################################################################
+
+upload_sessions = UploadSessions(
+    STAGING_FOLDER,
+    max_chunk_bytes = int(app.config['UPLOAD_CHUNK_MAX_MB']) * 1024 * 1024,
+    idle_seconds    = float(app.config['UPLOAD_IDLE_HOURS']) * 3600,
+)
+# its sweeper is started by the server entry point (app.py), never at import
+
+# kind -> {"complete", "accepts", "max_bytes"}, filled in by the route modules like the job handlers
+upload_kinds = {}
+
+
+def register_upload(kind, complete, accepts, max_bytes=None):
+    """
+    complete(session, path, sha256) turns a finished upload into the same response the single-request
+    endpoint for that kind gives and takes over the file at path; accepts(filename) says which files
+    the kind takes.
+    """
+    upload_kinds[kind] = {"complete": complete, "accepts": accepts, "max_bytes": max_bytes or UPLOAD_MAX}
+
+
+def upload_error(e):
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status, ({'Upload-Offset': str(e.offset)} if e.offset is not None else {})
+
+
+def session_body(session):
+    return dict(session, url=f"/uploads/{session['id']}", chunkSize=upload_sessions.max_chunk_bytes)
+
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+
+    # curl -X POST http://localhost:5500/uploads -H "Content-Type: application/json" \
+    #      -d '{"kind": "pdf", "filename": "paper.pdf", "size": 73400320, "sha256": "<optional, hex>"}'
+
+    info_dict = request.get_json(silent=True) or {}
+    kind = upload_kinds.get(info_dict.get('kind'))
+    if kind is None:
+        return jsonify({'error': f"kind must be one of {', '.join(upload_kinds)}"}), 400
+    filename = str(info_dict.get('filename') or '')
+    if not kind['accepts'](filename):
+        return jsonify({'error': f"{filename or 'This file'} cannot be uploaded as {info_dict['kind']}"}), 400
+
+    try:
+        session = upload_sessions.create(info_dict['kind'], filename, info_dict.get('size'),
+                                         info_dict.get('sha256'), kind['max_bytes'])
+    except UploadError as e:
+        return upload_error(e)
+
+    return jsonify(session_body(session)), 201, {'Location': f"/uploads/{session['id']}", 'Upload-Offset': '0'}
+
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+
+    # one chunk of at most chunkSize bytes as the raw body, at the offset the upload has reached:
+    # curl -X PUT http://localhost:5500/uploads/<id> -H "Upload-Offset: 0" -H "Upload-Checksum: sha256 <hex>" \
+    #      --data-binary @chunk0
+    # a 409 carries the offset to carry on from, a checksum mismatch leaves the offset where it was
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header required'}), 400
+
+    checksum = None
+    if 'Upload-Checksum' in request.headers:
+        algorithm, _, checksum = request.headers['Upload-Checksum'].strip().partition(' ')
+        if algorithm.lower() != 'sha256' or not checksum:
+            return jsonify({'error': 'Upload-Checksum must be "sha256 <hex digest>"'}), 400
+
+    try:
+        session = upload_sessions.write_chunk(upload_id, offset, request.stream, checksum)
+    except UploadError as e:
+        return upload_error(e)
+
+    return jsonify(session_body(session)), 200, {'Upload-Offset': str(session['offset'])}
+
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+
+    # where to resume from: curl -I http://localhost:5500/uploads/<id>
+
+    try:
+        session = upload_sessions.get(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+
+    return jsonify(session_body(session)), 200, {'Upload-Offset': str(session['offset']), 'Cache-Control': 'no-store'}
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    try:
+        upload_sessions.abort(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    return '', 204
+
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+
+    # curl -X POST http://localhost:5500/uploads/<id>/complete
+    # answers like the single-request endpoint for the kind: /convertpdfToLink for pdf, /upload_image_url for image
+
+    try:
+        session, path, sha256 = upload_sessions.complete(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+
+    try:
+        return upload_kinds[session['kind']]['complete'](session, path, sha256)
+    finally:
+        # whatever the handler did not move away is not needed any more
+        if os.path.exists(path):
+            os.remove(path)
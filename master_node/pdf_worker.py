@@ -0,0 +1,27 @@
+import os
+
+import PyPDF2
+
+
+# What the PDF extractor's worker processes run. Kept out of the app package on purpose: the pool
+# spawns its workers, and a worker imports this module to unpickle extract_range, so anything it
+# imports is imported again in every worker. Importing the app package would bring up the routes,
+# the job queue and the chain clients there.
+
+# a worker handles many ranges of the same document in a row, so it keeps the last reader it opened
+_reader_cache = {}
+
+
+def _reader(path):
+    key = (path, os.stat(path).st_mtime_ns)
+    reader = _reader_cache.get(key)
+    if reader is None:
+        _reader_cache.clear()
+        reader = _reader_cache[key] = PyPDF2.PdfReader(path)
+    return reader
+
+
+def extract_range(path, start, end):
+    """Text of pages [start, end) of the PDF at path, one string per page."""
+    reader = _reader(path)
+    return [reader.pages[page_number].extract_text() or "" for page_number in range(start, end)]
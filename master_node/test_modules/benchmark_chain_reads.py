@@ -0,0 +1,88 @@
+# Compares the thread-pool read path (blockchain_code) with the AsyncWeb3 path (async_blockchain_code)
+# on a collection listing against the configured BASE_NODE_RPC_ENDPOINT. Point it at a collection with
+# ~1,000 NFTs. The chain cache and the indexer are switched off so every listing goes to the node.
+#
+#   python test_modules/benchmark_chain_reads.py --collection-id 3 --rounds 5 --concurrency 8      (from master_node/)
+#   MULTICALL_ENABLED=0 python test_modules/benchmark_chain_reads.py ...   # one eth_call per contract call
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault("CHAIN_CACHE_ENABLED", "0")
+os.environ.setdefault("INDEXER_ENABLED", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import blockchain_code, async_blockchain_code  # noqa: E402
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(name, timings, n_nfts, threads):
+    print(
+        f"{name:>8}: {n_nfts} NFTs/listing | "
+        f"p50 {statistics.median(timings):.3f}s | max {max(timings):.3f}s | "
+        f"threads {threads} | peak RSS so far {peak_rss_mb():.1f} MB"
+    )
+
+
+def run_threaded(collection_id, rounds, concurrency):
+    timings, n_nfts, threads = [], 0, 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as callers:
+        for _ in range(rounds):
+            started = time.monotonic()
+            listings = list(callers.map(blockchain_code.all_nft_of_a_collection, [collection_id] * concurrency))
+            timings.append(time.monotonic() - started)
+            threads = max(threads, threading.active_count())
+            n_nfts = len(listings[0] or [])
+    return timings, n_nfts, threads
+
+
+def run_async(collection_id, rounds, concurrency):
+    async def listing_round():
+        return await asyncio.gather(*[async_blockchain_code.all_nft_of_a_collection(collection_id) for _ in range(concurrency)])
+
+    timings, n_nfts, threads = [], 0, 0
+    for _ in range(rounds):
+        started = time.monotonic()
+        listings = async_blockchain_code.event_loop.run(listing_round())
+        timings.append(time.monotonic() - started)
+        threads = max(threads, threading.active_count())
+        n_nfts = len(listings[0] or [])
+    return timings, n_nfts, threads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection-id", type=int, required=True)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1, help="listings issued at once per round")
+    args = parser.parse_args()
+
+    print(f"endpoint {blockchain_code.BASE_NODE_RPC_ENDPOINT} | multicall {blockchain_code.MULTICALL_ENABLED} | "
+          f"rounds {args.rounds} x {args.concurrency} concurrent listings")
+
+    # warm up both paths (contract ABIs, connection pools) before timing
+    blockchain_code.all_nft_of_a_collection(args.collection_id)
+    async_blockchain_code.sync_reads.all_nft_of_a_collection(args.collection_id)
+
+    timings, n_nfts, threads = run_threaded(args.collection_id, args.rounds, args.concurrency)
+    summarize("threads", timings, n_nfts, threads)
+
+    timings, n_nfts, threads = run_async(args.collection_id, args.rounds, args.concurrency)
+    summarize("asyncio", timings, n_nfts, threads)
+
+    if n_nfts < 1000:
+        print(f"note: collection {args.collection_id} has {n_nfts} NFTs, pick one with ~1,000 for the reference numbers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Compares plain and compressed .data storage: bytes on disk and full-read throughput through
+# BlobStore.open(), the path /data and generate_key read through. Without --files it stores generated
+# text shaped like extracted PDF text; with --files it stores those files (e.g. existing uploads/data/*.data).
+#
+#   python test_modules/benchmark_data_storage.py --documents 20 --size-mb 2      (from master_node/)
+#   python test_modules/benchmark_data_storage.py --files app/uploads/data/*.data
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# straight from app/module: importing the app package would start the whole server
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "module"))
+
+# blob_store imports it as app.module.file_utils; registered under that name it is found without the package
+import file_utils  # noqa: E402
+sys.modules["app.module.file_utils"] = file_utils
+
+from blob_store import BlobStore  # noqa: E402
+
+
+WORDS = ("the model extracted text from page section table figure results analysis data network training "
+         "evaluation dataset parameters performance method approach proposed layer token contract").split()
+
+
+def sample_document(size_mb, seed):
+    rng = random.Random(seed)
+    lines, size = [], 0
+    while size < size_mb * 1024 * 1024:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))) + f" {rng.randint(0, 10**6)}.\n"
+        lines.append(line)
+        size += len(line)
+    return "".join(lines).encode()
+
+
+def measure(label, compressed, documents, rounds):
+    with tempfile.TemporaryDirectory() as root:
+        store = BlobStore(root, compressed=compressed)
+        started = time.perf_counter()
+        names = []
+        for data in documents:
+            with store.writer(".data") as blob:
+                blob.write(data)
+            names.append(blob.name)
+        write_seconds = time.perf_counter() - started
+
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for name in names:
+                with store.open(name) as f:
+                    f.read()
+            timings.append(time.perf_counter() - started)
+
+        usage = store.usage(max_age=0)
+        megabytes = usage["content_bytes"] / (1024 * 1024)
+        seconds = statistics.median(timings)
+        print(f"{label:>10}: {usage['disk_bytes'] / (1024 * 1024):8.2f} MB on disk for {megabytes:.2f} MB "
+              f"(ratio {usage['ratio']}, +{usage['precompressed_bytes'] / (1024 * 1024):.2f} MB .br) | "
+              f"read {megabytes / seconds:8.1f} MB/s | write {megabytes / write_seconds:6.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=2)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.files:
+        documents = [open(path, "rb").read() for path in args.files]
+    else:
+        documents = [sample_document(args.size_mb, seed) for seed in range(args.documents)]
+
+    # the plain store's reads come out of the page cache, as they would on a warm server
+    measure("plain", False, documents, args.rounds)
+    measure("compressed", True, documents, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
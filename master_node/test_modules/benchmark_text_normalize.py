@@ -0,0 +1,93 @@
+# Measures what text normalisation costs per MB of extracted text: the old per-character sanitize_text
+# against TextNormalizer with each unicode form. Without --files it builds sample documents shaped like
+# PDF text (English, accented Latin, CJK, ligatures, stray controls, ragged whitespace); with --files
+# it uses those text files, or the text of those PDFs.
+#
+#   python test_modules/benchmark_text_normalize.py --size-mb 16 --rounds 3      (from master_node/)
+#   python test_modules/benchmark_text_normalize.py --files documents/*.pdf
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# straight from app/module: importing the app package would start the whole server
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "module"))
+
+from text_normalize import TextNormalizer, UNICODE_FORMS  # noqa: E402
+
+
+def legacy_sanitize(text):
+    # what pdf_extract did before TextNormalizer, kept here as the baseline
+    return ''.join(ch  if ord(ch) < 128 else " " for ch in text)
+
+
+SAMPLES = {
+    "english": "The quick brown fox jumps over the lazy dog, page {n} of the report.  \n",
+    "latin": "Café déjà vu: naïve façade, Ærø, Łódź, straße — “quoted” ‘text’ … page {n} \n",
+    "cjk": "这是第{n}页的文本。日本語のテキストです。한국어 텍스트입니다.\n",
+    "pdf_noise": "ﬁnancial ﬂow­​ of\tthe\t\tyear {n}\x0c\x07   \r\n\n\n\n",
+}
+
+
+def sample_document(size_mb, seed=0):
+    rng = random.Random(seed)
+    lines, size, n = [], 0, 0
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        # mostly English, like most of what gets uploaded
+        kind = rng.choices(list(SAMPLES), weights=[70, 15, 5, 10])[0]
+        line = SAMPLES[kind].format(n=n)
+        lines.append(line)
+        size += len(line.encode())
+        n += 1
+    return "".join(lines)
+
+
+def load(path):
+    if path.lower().endswith(".pdf"):
+        import PyPDF2
+        return "".join(page.extract_text() or "" for page in PyPDF2.PdfReader(path).pages)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def measure(name, function, documents, rounds):
+    megabytes = sum(len(text.encode()) for text in documents) / (1024 * 1024)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for text in documents:
+            function(text)
+        timings.append(time.perf_counter() - started)
+    seconds = statistics.median(timings)
+    print(f"{name:>28}: {1000 * seconds / megabytes:8.2f} ms/MB | {megabytes / seconds:8.1f} MB/s | "
+          f"median of {rounds} over {megabytes:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--size-mb", type=float, default=16)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = [load(path) for path in args.files] or [sample_document(args.size_mb)]
+
+    # the "ascii" form with the other passes off has to give exactly the old output
+    ascii_only = TextNormalizer("ascii", strip_control=False, collapse_whitespace=False)
+    assert all(ascii_only(text) == legacy_sanitize(text) for text in documents)
+
+    measure("legacy sanitize_text", legacy_sanitize, documents, args.rounds)
+    for unicode_form in UNICODE_FORMS:
+        measure(f"{unicode_form} only", TextNormalizer(unicode_form, False, False), documents, args.rounds)
+    measure("strip_control only", TextNormalizer("keep", True, False), documents, args.rounds)
+    measure("collapse_whitespace only", TextNormalizer("keep", False, True), documents, args.rounds)
+    for unicode_form in UNICODE_FORMS:
+        measure(f"{unicode_form} + all passes", TextNormalizer(unicode_form), documents, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Runs the chain indexer against an in-process eth-tester chain with the NeuraNFT contracts deployed
+# the same way the truffle migrations do it, then forces a reorg and checks the index rewinds.
+#
+#   pip install "web3[tester]"
+#   python test_modules/chain_indexer_eth_tester.py      (from master_node/)
+
+import json
+import os
+import sys
+import tempfile
+
+from web3 import Web3, EthereumTesterProvider
+
+MODULE_FOLDER   = os.path.join(os.path.dirname(__file__), "..", "app", "module")
+CONTRACT_FOLDER = os.path.join(os.path.dirname(__file__), "..", "app", "contract_data_folder", "contracts")
+
+# import the modules directly so the Flask app (and its Base Sepolia connection) is not started
+sys.path.insert(0, MODULE_FOLDER)
+from multicall import Multicall, MULTICALL3_DEFAULT_ADDRESS  # noqa: E402
+from chain_indexer import ChainIndexer  # noqa: E402
+
+
+DEFAULT_METADATA = ["default.jpg", "None", "None", "", "", "Metadata not available"]
+
+
+def load_contract_json(contract_name):
+    with open(os.path.join(CONTRACT_FOLDER, f"{contract_name}.json")) as f:
+        return json.load(f)
+
+
+def deploy(w3, contract_name, *args):
+    contract_json = load_contract_json(contract_name)
+    factory = w3.eth.contract(abi=contract_json["abi"], bytecode=contract_json["bytecode"])
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+    return w3.eth.contract(address=receipt["contractAddress"], abi=contract_json["abi"])
+
+
+def transact(w3, contract_function, sender):
+    return w3.eth.wait_for_transaction_receipt(contract_function.transact({"from": sender}))
+
+
+def deploy_neuranft(w3):
+    deployer = w3.eth.accounts[0]
+    w3.eth.default_account = deployer
+
+    master = deploy(w3, "MasterAccessControl")
+
+    access = deploy(w3, "NFTAccessControl", master.address)
+    transact(w3, master.functions.grantAccess(access.address, access.address), deployer)
+
+    metadata = deploy(w3, "NFTMetadata", master.address, access.address)
+    transact(w3, master.functions.grantAccess(metadata.address, metadata.address), deployer)
+    transact(w3, access.functions.grantAccess(0, 0, metadata.address, 6), deployer)
+
+    nft = deploy(w3, "NFTContract", master.address, access.address, metadata.address)
+    transact(w3, master.functions.grantAccess(nft.address, nft.address), deployer)
+    transact(w3, master.functions.grantAccess(access.address, nft.address), deployer)
+    transact(w3, master.functions.grantAccess(metadata.address, nft.address), deployer)
+    transact(w3, access.functions.grantAccess(0, 0, nft.address, 6), deployer)
+
+    collection = deploy(w3, "CollectionContract", master.address, nft.address)
+    transact(w3, master.functions.grantAccess(collection.address, collection.address), deployer)
+    transact(w3, master.functions.grantAccess(nft.address, collection.address), deployer)
+
+    return {"collection": collection, "nft": nft, "metadata": metadata, "access": access}
+
+
+def sync_to_head(indexer):
+    while not indexer.sync_once():
+        pass
+
+
+def main():
+    w3 = Web3(EthereumTesterProvider())
+    tester = w3.provider.ethereum_tester
+    owner, user, other_user = w3.eth.accounts[1:4]
+
+    contracts = deploy_neuranft(w3)
+    # eth-tester has no Multicall3, the indexer falls back to one eth_call per read
+    multicall = Multicall(w3, MULTICALL3_DEFAULT_ADDRESS, load_contract_json("Multicall3")["abi"], enabled=False)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "chain_index.db")
+    indexer = ChainIndexer(w3, contracts, multicall, db_path, DEFAULT_METADATA,
+                           start_block=1, confirmations=0, chunk_size=5, poll_interval=0.1)
+
+    transact(w3, contracts["collection"].functions.createCollection("Neural Mint Hub", 4096, "Llama 3.1", "img.png", "desc"), owner)
+    transact(w3, contracts["nft"].functions.createNFT(1, "Cognitive Llama", 6), owner)
+    transact(w3, contracts["nft"].functions.createNFT(1, "Second Llama", 6), owner)
+    transact(w3, contracts["metadata"].functions.createMetadata(1, 1, ("nft.png", "Llama 3.1", "https://x/data/a.data", "", "", "first")), owner)
+    transact(w3, contracts["access"].functions.grantAccess(1, 1, user, 2), owner)
+
+    sync_to_head(indexer)
+
+    collections = indexer.collections()
+    assert [c["name"] for c in collections] == ["Neural Mint Hub"], collections
+    assert indexer.collections(owner=owner)[0]["id"] == 1
+    assert indexer.collection_details(1)["noOfNFTs"] == 2
+
+    nfts = indexer.nfts_of_collection(1)
+    assert [n["name"] for n in nfts] == ["Cognitive Llama", "Second Llama"], nfts
+    assert nfts[0]["data"] == "https://x/data/a.data"
+    assert nfts[1]["description"] == "Metadata not available"
+
+    user_nfts = indexer.nfts_for_user(user)
+    assert [(n["collectionId"], n["id"], n["accessLevel"]) for n in user_nfts] == [(1, 1, 2)], user_nfts
+    print("initial sync ok:", indexer.status())
+
+    # reorg: index a block, then replace it with a different chain of equal height + 1
+    snapshot = tester.take_snapshot()
+    transact(w3, contracts["access"].functions.grantAccess(1, 2, other_user, 3), owner)
+    sync_to_head(indexer)
+    assert len(indexer.nfts_for_user(other_user)) == 1
+
+    tester.revert_to_snapshot(snapshot)
+    tester.mine_blocks(3)
+    sync_to_head(indexer)
+
+    assert indexer.nfts_for_user(other_user) == [], indexer.nfts_for_user(other_user)
+    assert indexer.stats["reorgs"] == 1
+    print("reorg rewind ok:", indexer.status())
+
+
+if __name__ == "__main__":
+    main()